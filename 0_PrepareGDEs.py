@@ -0,0 +1,84 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+#Script to prepare the apply GDEs once (filter by size, union multi-geometries, simplify polygons if selected, add strata) and save them as an asset
+#4_ApplyTableExporter.py, 7_DownloadOutputs.py, and the other stages read this copy if sage.usePreparedGDEs is True
+
+####################################################################################################
+
+import SAGE_Initialize as sage
+from geeViz import taskManagerLib, assetManagerLib
+from geeViz.geeView import *
+
+####################################################################################################
+#Define user parameters:
+
+# Options defined in SAGE_Initialize:
+# Apply GDEs (and the minimum GDE size)
+# Strata to add for the apply tables and downloads
+# Whether and how much to simplify the GDE polygons
+# Prepared GDE folder
+
+####################################################################################################
+#                        End User Parameters
+####################################################################################################
+
+####################################################################################################
+#                     Start Function Calls
+####################################################################################################
+if not ee.data.getInfo(sage.preparedGDEDir):
+  print('Creating ' + sage.preparedGDEDir)
+  ee.data.createAsset({'type': ee.data.ASSET_TYPE_FOLDER}, sage.preparedGDEDir)
+
+#The prepared copy is named by a key of the apply GDE asset version and the settings used to make it
+preparedGDEsId = sage.getPreparedGDEsId()
+
+if ee.data.getInfo(preparedGDEsId):
+  print('Prepared apply GDEs are up to date:', preparedGDEsId)
+
+else:
+  #Report how much the polygons are simplified if selected
+  if sage.simplifyGDEPolygons:
+    sage.reportGDESimplification()
+
+  #Prepare the apply GDEs (the settings used to make them are kept with the asset)
+  preparedGDEs = sage.prepareGDEs()
+
+  outputName = os.path.basename(preparedGDEsId)
+  t = ee.batch.Export.table.toAsset(**{\
+    'collection': preparedGDEs, 
+    'description': outputName,
+    'assetId': preparedGDEsId})
+
+  print('Exporting:', outputName)
+  t.start()
+
+  #Earlier prepared copies are kept (other settings may still use them)
+  others = [i['id'] for i in ee.data.getList({'id': sage.preparedGDEDir}) if i['id'] != preparedGDEsId]
+  if len(others) > 0:
+    print('Other prepared GDE assets that can be deleted if no longer needed:')
+    for i in others: print(i)
+
+  taskManagerLib.trackTasks()
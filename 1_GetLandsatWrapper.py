@@ -168,12 +168,32 @@ correctScale = 250 #Choose a scale to reduce on- 250 generally works well
 # Set up Names for the export
 outputName = 'Landsat'
 
+# Bands (and their order) written to each composite asset when exporting tiles (sage.landsatExportTileSize).
+# These match the composites getImagesLib exports and the band order 3_LandtrendrWrapper.py expects.
+# Reflectance bands are multiplied by 10000 and all bands are stored as 16 bit integers.
+compositeExportBands = ['blue','green','red','nir','swir1','swir2','temp','compositeObsCount','sensor','year','julianDay']
+reflectanceBands = ['blue','green','red','nir','swir1','swir2']
+compositePyramidingPolicy = {'.default': 'mean', 'compositeObsCount': 'mode', 'sensor': 'mode', 'year': 'mode', 'julianDay': 'mode'}
+
 
 ####################################################################################################
 #                        End User Parameters
 ####################################################################################################
 
 
+####################################################################################################
+#                     Define Functions
+####################################################################################################
+#Function to scale and format a composite the same way getImagesLib does before exporting
+def formatCompositeForExport(composite):
+  composite = ee.Image(composite).select(compositeExportBands)
+  otherBands = [b for b in compositeExportBands if b not in reflectanceBands]
+  return composite.select(reflectanceBands).multiply(10000)\
+    .addBands(composite.select(otherBands))\
+    .select(compositeExportBands)\
+    .int16()\
+    .copyProperties(composite, ['system:time_start'])
+
 ####################################################################################################
 #                     Start Function Calls
 ####################################################################################################
@@ -183,42 +203,80 @@ if not ee.data.getInfo(sage.compositeCollection):
   assetManagerLib.updateACL(sage.compositeCollection, all_users_can_read = True)
 
 #Call on master wrapper function to get Landat scenes and composites
-lsAndTs = getImagesLib.getLandsatWrapper(**{
-  'studyArea': sage.studyArea,
-  'startYear': sage.landsatStartYear,
-  'endYear': sage.landsatEndYear,
-  'startJulian': sage.startJulian,
-  'endJulian': sage.endJulian,
-  'timebuffer': timebuffer,
-  'weights': weights,
-  'compositingMethod': compositingMethod,
-  'toaOrSR': toaOrSR,
-  'includeSLCOffL7': includeSLCOffL7,
-  'defringeL5': defringeL5,
-  'applyCloudScore': applyCloudScore,
-  'applyFmaskCloudMask': applyFmaskCloudMask,
-  'applyTDOM': applyTDOM,
-  'applyFmaskCloudShadowMask': applyFmaskCloudShadowMask,
-  'applyFmaskSnowMask': applyFmaskSnowMask,
-  'cloudScoreThresh': cloudScoreThresh,
-  'performCloudScoreOffset': performCloudScoreOffset,
-  'cloudScorePctl': cloudScorePctl,
-  'zScoreThresh': zScoreThresh,
-  'shadowSumThresh': shadowSumThresh,
-  'contractPixels': contractPixels,
-  'dilatePixels': dilatePixels,
-  'correctIllumination': correctIllumination,
-  'correctScale': correctScale,
-  'exportComposites': sage.exportLandsat,
-  'outputName': outputName,
-  'exportPathRoot': sage.compositeCollection,
-  'crs': sage.crs,
-  'transform': sage.transform,
-  'scale': sage.scale,
-  'resampleMethod': resampleMethod,
-  'preComputedCloudScoreOffset': preComputedCloudScoreOffset,
-  'preComputedTDOMIRMean': preComputedTDOMIRMean,
-  'preComputedTDOMIRStdDev': preComputedTDOMIRStdDev})
+#Exports the composites (one asset per year) if exportComposites is True
+def getComposites(startYear, endYear, exportComposites):
+  return getImagesLib.getLandsatWrapper(**{
+    'studyArea': sage.studyArea,
+    'startYear': startYear,
+    'endYear': endYear,
+    'startJulian': sage.startJulian,
+    'endJulian': sage.endJulian,
+    'timebuffer': timebuffer,
+    'weights': weights,
+    'compositingMethod': compositingMethod,
+    'toaOrSR': toaOrSR,
+    'includeSLCOffL7': includeSLCOffL7,
+    'defringeL5': defringeL5,
+    'applyCloudScore': applyCloudScore,
+    'applyFmaskCloudMask': applyFmaskCloudMask,
+    'applyTDOM': applyTDOM,
+    'applyFmaskCloudShadowMask': applyFmaskCloudShadowMask,
+    'applyFmaskSnowMask': applyFmaskSnowMask,
+    'cloudScoreThresh': cloudScoreThresh,
+    'performCloudScoreOffset': performCloudScoreOffset,
+    'cloudScorePctl': cloudScorePctl,
+    'zScoreThresh': zScoreThresh,
+    'shadowSumThresh': shadowSumThresh,
+    'contractPixels': contractPixels,
+    'dilatePixels': dilatePixels,
+    'correctIllumination': correctIllumination,
+    'correctScale': correctScale,
+    'exportComposites': exportComposites,
+    'outputName': outputName,
+    'exportPathRoot': sage.compositeCollection,
+    'crs': sage.crs,
+    'transform': sage.transform,
+    'scale': sage.scale,
+    'resampleMethod': resampleMethod,
+    'preComputedCloudScoreOffset': preComputedCloudScoreOffset,
+    'preComputedTDOMIRMean': preComputedTDOMIRMean,
+    'preComputedTDOMIRStdDev': preComputedTDOMIRStdDev})
+
+#Find which years to export
+#If sage.incrementalUpdate is True, only years missing from the composite collection (or invalidated) are exported
+#If pre-computed cloudScore offsets and TDOM stats are not used, note that exporting only a few years shortens the time series they are computed over
+compositeYears = range(sage.landsatStartYear + timebuffer, sage.landsatEndYear + 1 - timebuffer)
+update = sage.prepIncrementalUpdate(sage.compositeCollection, compositeYears)
+
+#Composites are exported in tiles if a tile size is given or if they are masked to the GDE footprint
+exportTiles = sage.exportLandsat and (sage.landsatExportTileSize != None or sage.useGDEFootprint)
+
+lsAndTs = None
+if sage.exportLandsat and not exportTiles:
+  #Export each run of consecutive years with the wrapper (this is a single run unless updating incrementally)
+  for startYear, endYear in sage.getYearRuns(update['years']):
+    lsAndTs = getComposites(startYear - timebuffer, endYear + timebuffer, True)
+
+#Get composites for all years (without exporting) for tiled exports and viewing
+if (sage.viewLandsat or exportTiles) and (lsAndTs == None or sage.incrementalUpdate):
+  lsAndTs = getComposites(sage.landsatStartYear, sage.landsatEndYear, False)
+
+#Export each year x tile as its own task if selected
+#Tiles already in the collection are skipped when updating incrementally
+#When using the GDE footprint, only tiles that intersect a GDE are exported and pixels outside the footprint are masked
+if exportTiles:
+  tiles = sage.getRasterExportTiles(sage.landsatExportTileSize)
+  footprint = sage.getGDEFootprint() if sage.useGDEFootprint else None
+  exportNameFormat = '{}_{}_{}_{{year}}_{{year}}_{}_{}_Tile_{{tile}}'.format(outputName, toaOrSR, compositingMethod, sage.startJulian, sage.endJulian)
+  sage.exportTiledCollection(**{\
+    'collection': lsAndTs['processedComposites'],
+    'years': compositeYears,
+    'tiles': tiles,
+    'exportPathRoot': sage.compositeCollection,
+    'exportNameFormat': exportNameFormat,
+    'pyramidingPolicyObject': compositePyramidingPolicy,
+    'prepImage': lambda img: sage.maskToGDEFootprint(formatCompositeForExport(img), footprint),
+    'skipAssetIds': update['existingAssetIds']})
 
 ####################################################################################################
 #             Visualize in geeView() if Selected
@@ -168,7 +168,8 @@ if not ee.data.getInfo(sage.daymetCollection):
   ee.data.createAsset({'type': 'ImageCollection'}, sage.daymetCollection)
   assetManagerLib.updateACL(sage.daymetCollection, all_users_can_read = True)
 
-ts = getClimateWrapper(**{\
+#Set up arguments shared by every call to the wrapper
+climateArgs = {\
   'daymetInputCollection': sage.daymetInputCollection,
   'studyArea': sage.studyArea,
   'startYear': sage.daymetStartYear,
@@ -183,7 +184,65 @@ ts = getClimateWrapper(**{\
   'crs': sage.crs,
   'transform': sage.transform,
   'scale': sage.scale,
-  'exportBands': sage.daymetExportBands})
+  'exportBands': sage.daymetExportBands}
+
+#All water years are exported as a single scaled stack if selected
+exportStack = sage.exportDaymet and sage.daymetExportAsStack
+
+#When masking to the GDE footprint, composites are exported in tiles that intersect a GDE instead of by the wrapper
+exportTiles = sage.exportDaymet and sage.useGDEFootprint and not exportStack
+
+#Find which water years to export
+#If sage.incrementalUpdate is True, only years missing from the Daymet collection (or invalidated) are exported
+#Water year composites are labeled with the year they end in, hence the offset of 1
+allYears = range(sage.daymetStartYear, sage.daymetEndYear + 1)
+update = sage.prepIncrementalUpdate(sage.daymetCollection, allYears, 1) if not exportStack else {'years': list(allYears), 'existingAssetIds': set()}
+
+ts = None
+if sage.exportDaymet and not exportTiles and not exportStack:
+  #Export each run of consecutive years (this is a single run unless updating incrementally)
+  for startYear, endYear in sage.getYearRuns(update['years']):
+    ts = getClimateWrapper(**dict(climateArgs, startYear = startYear, endYear = endYear))
+
+if ts == None or (sage.incrementalUpdate and sage.viewDaymet):
+  ts = getClimateWrapper(**dict(climateArgs, exportComposites = False))
+
+#Export each water year x tile, masked to the GDE footprint
+#Water year composites are dated in the year they end, so the export years are offset by 1
+#Every year is passed so years with only some tiles exported (e.g. after a failed task) are filled in. Tiles already in the collection are skipped.
+if exportTiles:
+  tiles = sage.getRasterExportTiles()
+  footprint = sage.getGDEFootprint()
+  exportNameFormat = '{}_{{year}}_{{year}}_{}_{}_Tile_{{tile}}'.format(sage.daymetInputCollection.split('/')[2], startJulian, endJulian)
+  sage.exportTiledCollection(**{\
+    'collection': ts,
+    'years': [yr + 1 for yr in allYears],
+    'tiles': tiles,
+    'exportPathRoot': sage.daymetCollection,
+    'exportNameFormat': exportNameFormat,
+    'prepImage': lambda img: sage.maskToGDEFootprint(img.select(sage.daymetExportBands), footprint),
+    'skipAssetIds': update['existingAssetIds']})
+
+#Export all water years as one image with a band for each band and year, optionally in tiles
+#Any previous stack is replaced
+if exportStack:
+  if not ee.data.getInfo(sage.daymetStackCollection):
+    print('Creating ' + sage.daymetStackCollection)
+    ee.data.createAsset({'type': 'ImageCollection'}, sage.daymetStackCollection)
+    assetManagerLib.updateACL(sage.daymetStackCollection, all_users_can_read = True)
+  for asset in ee.data.listAssets({'parent': sage.daymetStackCollection}).get('assets', []):
+    print('Deleting previous stack:', asset['id'])
+    ee.data.deleteAsset(asset['id'])
+
+  stack = sage.packAnnualStack(ts, [yr + 1 for yr in allYears], [b + '_mean' for b in sage.getDaymetBands()])
+  stack = sage.maskToGDEFootprint(stack)
+  stackName = '{}_Stack_{}_{}_{}_{}'.format(sage.daymetInputCollection.split('/')[2], sage.daymetStartYear + 1, sage.daymetEndYear + 1, startJulian, endJulian)
+
+  if sage.daymetExportTileSize != None or sage.useGDEFootprint:
+    for tileName, tile in sage.getRasterExportTiles(sage.daymetExportTileSize):
+      sage.exportImageToAsset(stack.set('tile', tileName), sage.daymetStackCollection + '/' + stackName + '_Tile_' + tileName, tile)
+  else:
+    sage.exportImageToAsset(stack, sage.daymetStackCollection + '/' + stackName, sage.studyArea)
 
 ####################################################################################################
 #             Visualize in geeView() if Selected
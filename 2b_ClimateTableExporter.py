@@ -0,0 +1,125 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+#Script to summarize daily DAYMET climate data directly to water year means for each apply GDE
+#Alternative to 2_GetClimateWrapper.py that exports a single table instead of annual composite rasters
+#Used when sage.daymetPredictorSource is 'table'
+
+####################################################################################################
+
+import SAGE_Initialize as sage
+from geeViz import taskManagerLib
+import os
+from geeViz.geeView import *
+
+####################################################################################################
+#Define user parameters:
+
+# Options defined in SAGE_Initialize:
+# Start and end year 
+# Study Area
+# Apply GDEs
+# CRS, transform and scale
+# Export table name
+# Which Daymet bands to summarize
+
+#--------The Following Options Are Default DayMet Compositing Methods and Do Not Need to Be Changed-----------
+
+# SAGE does Daymet compositing along the water year (Oct 1 - Oct 1). The water year starting in one year is labeled with the year it ends in.
+startJulian = 274
+endJulian = 273
+
+# Number of tiles to split each GDE summary into. Increase if the export runs out of memory.
+tileScale = 4
+
+####################################################################################################
+#                        End User Parameters
+####################################################################################################
+
+####################################################################################################
+#                     Define Functions
+####################################################################################################
+#Function to get the water year means of the selected Daymet bands as one image with a band for each band and year
+#Band names are {band}_mean_{year}, where year is the year the water year ends in
+def getWaterYearMeans(daymetInputCollection, studyArea, startYear, endYear, bands):
+  c = ee.ImageCollection(daymetInputCollection)\
+           .filterBounds(studyArea.bounds())\
+           .select(bands)\
+           .map(lambda img: img.resample('bicubic'))
+
+  images = []
+  for yr in range(startYear, endYear + 1):
+    startDate = ee.Date.fromYMD(yr,1,1).advance(startJulian-1,'day')
+    endDate = ee.Date.fromYMD(yr+1,1,1).advance(endJulian,'day')
+    images.append(c.filterDate(startDate, endDate).mean().rename(['{}_mean_{}'.format(b, yr+1) for b in bands]))
+
+  return ee.Image.cat(images).float()
+
+####################################################################################################
+#                     Start Function Calls
+####################################################################################################
+bands = sage.getDaymetBands()
+waterYearMeans = getWaterYearMeans(sage.daymetInputCollection, sage.studyArea, sage.daymetStartYear, sage.daymetEndYear, bands)
+
+#Summarize every water year for every apply GDE in one pass
+applyGDEs = sage.getApplyGDEs().select([sage.gdeIdName])
+daymetTable = waterYearMeans.reduceRegions(applyGDEs, ee.Reducer.mean(), sage.scale, sage.crs, sage.transform, tileScale)
+
+outputName = os.path.basename(sage.daymetTablePath)
+t = ee.batch.Export.table.toAsset(**{\
+  'collection': daymetTable,
+  'description': outputName,
+  'assetId': sage.daymetTablePath})
+print('Exporting:', outputName)
+t.start()
+
+#Also export a csv without geometries to fit locally with SAGE_LocalLandTrendr.py
+#The fitted table is then uploaded to sage.daymetFitTablePath for 4_ApplyTableExporter.py
+selectors = [sage.gdeIdName] + ['{}_mean_{}'.format(b, yr + 1) for yr in range(sage.daymetStartYear, sage.daymetEndYear + 1) for b in bands]
+t = ee.batch.Export.table.toDrive(**{\
+  'collection': daymetTable,
+  'description': outputName + '-csv',
+  'folder': sage.daymetTableDriveDir,
+  'selectors': selectors})
+print('Exporting:', outputName + '-csv')
+t.start()
+
+####################################################################################################
+#             Visualize in geeView() if Selected
+####################################################################################################
+if sage.viewDaymet:
+
+  Map.addLayer(waterYearMeans, {}, 'Water Year Means', False)
+  Map.addLayer(applyGDEs, {}, 'Apply GDEs', False)
+
+  #Load the study region
+  Map.addLayer(sage.studyArea, {'strokeColor': '0000FF'}, "Study Area", True)
+  Map.centerObject(sage.studyArea)
+
+  Map.view()
+
+else:
+
+  taskManagerLib.trackTasks()
@@ -51,9 +51,6 @@ import pdb
 #First piece of the name of the exported images
 exportNamePrefix = 'LT_Stack'
 
-#Number to multiply fitted values by to get into 16 bit data space for exported LandTrendr stack assets
-multDict = {'blue':10000,'green':10000,'red':10000,'nir':10000,'swir1':10000,'swir2':10000,'temp':10,'NBR':10000,'NDMI':10000,'NDVI':10000,'SAVI':10000,'EVI':10000,'brightness':10000,'greenness':10000,'wetness':10000,'tcAngleBG':10000,'prcp_mean':100,'tmin_mean':100,'tmax_mean':100,'srad_mean':10,'swe_mean':1, 'vp_mean':10};
-
 #Add change directions for climate bands 
 #Direction should be negative if it goes down when vegetation vigor goes down
 #changeDirDict = getImagesLib.changeDirDict.copy()
@@ -72,61 +69,79 @@ getImagesLib.changeDirDict['srad_mean'] = 1
 #                     Define Functions
 ####################################################################################################
 
+#Function to run LandTrendr for a single index and get its vertex stack (scaled by multDict for export)
+def getLTStack(inputCollection, indexName):
+
+  prepDict = changeDetectionLib.prepTimeSeriesForLandTrendr(inputCollection, indexName, sage.landtrendr_run_params)
+  run_params = prepDict['run_params']
+  countMask = prepDict['countMask']
+
+  # Run LANDTRENDR
+  rawLt = ee.Algorithms.TemporalSegmentation.LandTrendr(**run_params).select([0])
+
+  #Convert to stack format and flip fitted values back
+  ltStack = changeDetectionLib.getLTvertStack(rawLt,run_params)
+  ltStack = ee.Image(changeDetectionLib.LT_VT_vertStack_multBands(ltStack, None, getImagesLib.changeDirDict[indexName]))
+  
+  #Get fitted annual values for visualization
+  ltC = changeDetectionLib.simpleLTFit(ltStack, sage.landtrendrStartYear, sage.landtrendrEndYear, indexName).select(['.*_fitted'])
+  tsJoined = getImagesLib.joinCollections(inputCollection.select([indexName]), ltC)
+
+  # Map.addLayer(prepDict['run_params']['timeSeries'],{},'Prepped-'+indexName,False)
+  # Map.addLayer(rawLt,{},'Raw LT-'+indexName,True)
+  # Map.addLayer(ltStack,{},'vertStack LT-'+indexName,True)
+  Map.addLayer(tsJoined, {'opacity':0}, 'Raw and Fitted '+indexName, False)
+
+  forExport = ee.Image(changeDetectionLib.LT_VT_vertStack_multBands(ltStack, None, sage.multDict[indexName])).int16()
+
+  Map.addLayer(forExport.clip(sage.studyArea), {}, 'For Export '+indexName, False)
+
+  return forExport
+
 def batchLTExport(\
   inputCollection, 
   indexList, 
   exportPathRoot, 
   exportNamePrefix):
 
+  #Split indices into groups that are exported together (sage.landtrendrGroupSize)
+  groups = [indexList[i:i+sage.landtrendrGroupSize] for i in range(0, len(indexList), sage.landtrendrGroupSize)]
 
-  for indexName in indexList:
-
-    prepDict = changeDetectionLib.prepTimeSeriesForLandTrendr(inputCollection, indexName, sage.landtrendr_run_params)
-    run_params = prepDict['run_params']
-    countMask = prepDict['countMask']
-
-    # Run LANDTRENDR
-    rawLt = ee.Algorithms.TemporalSegmentation.LandTrendr(**run_params).select([0])
-
-    #Convert to stack format and flip fitted values back
-    ltStack = changeDetectionLib.getLTvertStack(rawLt,run_params)
-    ltStack = ee.Image(changeDetectionLib.LT_VT_vertStack_multBands(ltStack, None, getImagesLib.changeDirDict[indexName]))
-    
-    #Get fitted annual values for visualization
-    ltC = changeDetectionLib.simpleLTFit(ltStack, sage.landtrendrStartYear, sage.landtrendrEndYear, indexName).select(['.*_fitted'])
-    tsJoined = getImagesLib.joinCollections(joined.select([indexName]), ltC)
+  #Set up proper resampling for each band
+  #Be sure to change if the band names for the exported image change
+  pyrObj = {'yrs_vert_':'mode','fit_vert_':'mean'}
+  possible = [str(i) for i in range(1,sage.landtrendr_run_params['maxSegments']+2)]
 
-    # Map.addLayer(prepDict['run_params']['timeSeries'],{},'Prepped-'+indexName,False)
-    # Map.addLayer(rawLt,{},'Raw LT-'+indexName,True)
-    # Map.addLayer(ltStack,{},'vertStack LT-'+indexName,True)
-    Map.addLayer(tsJoined, {'opacity':0}, 'Raw and Fitted '+indexName, False)
+  for group in groups:
 
-    forExport = ee.Image(changeDetectionLib.LT_VT_vertStack_multBands(ltStack, None, multDict[indexName])).int16()
-
-    Map.addLayer(forExport.clip(sage.studyArea), {}, 'For Export '+indexName, False)
+    #A single index keeps the original band names
+    #Grouped indices are written as bands of one image, prefixed with the index name (e.g. NBR_fit_vert_1)
+    #and the index names are joined with '-' in the asset name (e.g. LT_Stack_NBR-NDVI_1985_2021)
+    if len(group) == 1:
+      forExport = getLTStack(inputCollection, group[0])
+      prefixes = ['']
+    else:
+      forExport = ee.Image.cat([getLTStack(inputCollection, indexName).regexpRename('^', indexName + '_') for indexName in group])
+      prefixes = [indexName + '_' for indexName in group]
 
     #Export stack
-    exportName = '{}_{}_{}_{}'.format(exportNamePrefix, indexName, sage.landtrendrStartYear, sage.landtrendrEndYear) 
+    exportName = '{}_{}_{}_{}'.format(exportNamePrefix, '-'.join(group), sage.landtrendrStartYear, sage.landtrendrEndYear) 
     
     exportPath = exportPathRoot + '/'+ exportName
-    
-    #Set up proper resampling for each band
-    #Be sure to change if the band names for the exported image change
-    pyrObj = {'yrs_vert_':'mode','fit_vert_':'mean'}
-    possible = [str(i) for i in range(1,run_params['maxSegments']+2)]
 
     outObj = {}
-    for p in possible:
-      for key in pyrObj.keys():
+    for prefix in prefixes:
+      for p in possible:
+        for key in pyrObj.keys():
 
-        kt = '{}{}'.format(key,p)
-        outObj[kt]= pyrObj[key]
+          kt = '{}{}{}'.format(prefix,key,p)
+          outObj[kt]= pyrObj[key]
 
     #Export output
     if sage.exportLandtrendrStack:
       getImagesLib.exportToAssetWrapper(**{\
         'imageForExport': forExport,
-        'assetName': exportName,
+        'assetName': exportName[:100],
         'assetPath': exportPath,
         'pyramidingPolicyObject': outObj,
         'roi': sage.studyArea,
@@ -143,18 +158,34 @@ if not ee.data.getInfo(sage.ltCollection):
   ee.data.createAsset({'type': 'ImageCollection'}, sage.ltCollection)
   assetManagerLib.updateACL(sage.ltCollection, all_users_can_read = True)
 
-composites = ee.ImageCollection(sage.compositeCollection)\
-        .filter(ee.Filter.calendarRange(sage.landtrendrStartYear, sage.landtrendrEndYear, 'year'))\
+#Composites and Daymet may have been exported in tiles, so they are read with one mosaic per year
+composites = sage.getAnnualCollection(sage.compositeCollection, sage.landtrendrStartYear, sage.landtrendrEndYear)\
         .map(lambda img: changeDetectionLib.multBands(img,1,[0.0001,0.0001,0.0001,0.0001,0.0001,0.0001,1,1,1,1,1]))\
         .map(getImagesLib.simpleAddIndices)\
         .map(getImagesLib.getTasseledCap)\
         .map(getImagesLib.simpleAddTCAngles)\
         .map(getImagesLib.addSAVIandEVI)
-daymet = ee.ImageCollection(sage.daymetCollection)\
-        .filter(ee.Filter.calendarRange(sage.landtrendrStartYear, sage.landtrendrEndYear,'year'))
+indexList = sage.landtrendrIndexList
+if sage.daymetPredictorSource == 'table':
+  #The Daymet indices are fit locally from the table of per-GDE water-year means (2b_ClimateTableExporter.py and SAGE_LocalLandTrendr.py),
+  #so only the Landsat indices are run here
+  joined = composites
+  indexList = [i for i in indexList if i not in sage.getDaymetIndices()]
+else:
+  if sage.daymetExportAsStack:
+    #All water years were exported as one scaled stack (2_GetClimateWrapper.py)
+    daymet = sage.getAnnualStackCollection(sage.daymetStackCollection, sage.landtrendrStartYear, sage.landtrendrEndYear, [b + '_mean' for b in sage.getDaymetBands()])
+  else:
+    daymet = sage.getAnnualCollection(sage.daymetCollection, sage.landtrendrStartYear, sage.landtrendrEndYear)
+
+  #Join collections
+  joined = ee.ImageCollection(getImagesLib.joinCollections(composites,daymet))
 
-#Join collections
-joined = ee.ImageCollection(getImagesLib.joinCollections(composites,daymet))
+#Only run LandTrendr over pixels within the GDE footprint if selected
+#Masked pixels have no observations, so LandTrendr is not fit there and they are not stored in the exported stacks
+if sage.useGDEFootprint:
+  footprint = sage.getGDEFootprint()
+  joined = joined.map(lambda img: sage.maskToGDEFootprint(img, footprint))
 
 # Map.addTimeLapse(composites,vizParamsFalse,'Composites',False)
 Map.addLayer(joined, {}, 'Composites and Daymet Time Series', False)
@@ -166,7 +197,7 @@ if sage.landtrendrUseMultiCredentials:
   
   if __name__ == '__main__':      
       #Call on multi-threaded exporting to split up indices into even batches to export by each credential
-      sets = sage.new_set_maker(sage.landtrendrIndexList, len(sage.tokens))
+      sets = sage.new_set_maker(indexList, len(sage.tokens))
       for i, indexSet in enumerate(sets):
         sage.initializeFromToken(sage.tokens[i])
         print(ee.String('Token works!').getInfo())
@@ -182,7 +213,7 @@ else:
   ee.Initialize()
   batchLTExport(**{\
     'inputCollection': joined, 
-    'indexList': sage.landtrendrIndexList, 
+    'indexList': indexList, 
     'exportPathRoot': sage.ltCollection, 
     'exportNamePrefix': exportNamePrefix})
 
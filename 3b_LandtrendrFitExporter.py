@@ -0,0 +1,111 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+#Script to store the annual fitted LandTrendr outputs (sage.ltBands) of every index as one image per year
+#4_ApplyTableExporter.py reads these instead of fitting every LandTrendr stack again for each year if sage.useLTFitCollection is True
+
+####################################################################################################
+
+import SAGE_Initialize as sage
+from geeViz import getImagesLib, taskManagerLib, assetManagerLib
+from geeViz.geeView import *
+
+####################################################################################################
+#Define user parameters:
+
+# Options defined in SAGE_Initialize:
+# Apply years
+# Study Area
+# CRS, transform and scale
+# LandTrendr collection and which LandTrendr bands to store
+# Export image collection name
+
+#--------The Following Options Do Not Need to Be Changed-----------
+
+#First piece of the name of the exported images
+exportNamePrefix = 'LT_Fit'
+
+#Fitted values are in the units of the LandTrendr stacks (already multiplied by sage.multDict), so they are stored as 16 bit integers
+#(slopes are also multiplied by sage.ltFitSlopeMult, see sage.packLTFit).
+#Durations are years. Use the mode when aggregating durations and the mean otherwise.
+#Be sure to change if the band names for the exported images change
+pyramidingPolicy = {'.default': 'mean'}
+indexList = sage.landtrendrIndexList
+if sage.daymetPredictorSource == 'table':
+  indexList = [i for i in indexList if i not in sage.getDaymetIndices()]
+for indexName in indexList:
+  pyramidingPolicy['{}_LT_dur'.format(indexName)] = 'mode'
+
+####################################################################################################
+#                        End User Parameters
+####################################################################################################
+
+####################################################################################################
+#                     Start Function Calls
+####################################################################################################
+if not ee.data.getInfo(sage.ltFitCollection):
+  print('Creating ' + sage.ltFitCollection)
+  ee.data.createAsset({'type': 'ImageCollection'}, sage.ltFitCollection)
+  assetManagerLib.updateACL(sage.ltFitCollection, all_users_can_read = True)
+
+#Fit every LandTrendr stack once for all years
+durFitMagSlope = sage.getLT(sage.ltCollection, sage.ltBands)
+
+#Find which years to export
+#If sage.incrementalUpdate is True, only years missing from the fit collection (or invalidated) are exported
+update = sage.prepIncrementalUpdate(sage.ltFitCollection, range(sage.startApplyYear, sage.endApplyYear + 1))
+
+#Export in tiles that intersect a GDE if using the GDE footprint, otherwise over the whole study area
+if sage.useGDEFootprint:
+  footprint = sage.getGDEFootprint()
+  sage.exportTiledCollection(**{\
+    'collection': durFitMagSlope,
+    'years': update['years'],
+    'tiles': sage.getRasterExportTiles(),
+    'exportPathRoot': sage.ltFitCollection,
+    'exportNameFormat': exportNamePrefix + '_{year}_Tile_{tile}',
+    'pyramidingPolicyObject': pyramidingPolicy,
+    'prepImage': lambda img: sage.maskToGDEFootprint(sage.packLTFit(img), footprint),
+    'skipAssetIds': update['existingAssetIds']})
+else:
+  for yr in update['years']:
+    fitYr = ee.Image(durFitMagSlope.filter(ee.Filter.calendarRange(yr,yr,'year')).first())
+    fitYr = sage.packLTFit(fitYr).set('year', yr)
+    sage.exportImageToAsset(fitYr, sage.ltFitCollection + '/{}_{}'.format(exportNamePrefix, yr), sage.studyArea, pyramidingPolicy)
+
+####################################################################################################
+#             Visualize in geeView() if Selected
+####################################################################################################
+if sage.viewLandTrendr:
+  Map.addLayer(durFitMagSlope, {}, 'Fitted LandTrendr Time Series', False)
+
+  #Load the study region
+  Map.addLayer(sage.studyArea, {'strokeColor': '0000FF'}, "Study Area", True)
+  Map.centerObject(sage.studyArea)
+
+  Map.view()
+
+else:
+  taskManagerLib.trackTasks()
@@ -0,0 +1,69 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+#Script to rasterize the apply GDEs once as an image of GDE IDs on the crs and transform used by all SAGE outputs
+#4_ApplyTableExporter.py computes zonal means with a grouped reducer over this image if sage.useGDEZoneImage is True
+
+####################################################################################################
+
+import SAGE_Initialize as sage
+from geeViz import taskManagerLib, assetManagerLib
+from geeViz.geeView import *
+
+####################################################################################################
+#Define user parameters:
+
+# Options defined in SAGE_Initialize:
+# Apply GDEs (and the minimum GDE size)
+# GDE ID Name
+# Study Area
+# CRS, transform and scale
+# Zone image name
+
+#--------The Following Options Do Not Need to Be Changed-----------
+
+#IDs are categories, so aggregate them with a sample of the pixels
+pyramidingPolicy = {'.default': 'sample'}
+
+####################################################################################################
+#                        End User Parameters
+####################################################################################################
+
+####################################################################################################
+#                     Start Function Calls
+####################################################################################################
+#The zone image is named with a key of the current apply GDEs, so it only needs to be exported if they have changed
+gdeZoneImageId = sage.getGDEZoneImageId()
+if ee.data.getInfo(gdeZoneImageId):
+  print('GDE zone image is up to date:', gdeZoneImageId)
+
+else:
+
+  #Rasterize the apply GDEs to their IDs
+  zones = sage.getGDEZoneImage()
+
+  sage.exportImageToAsset(zones, gdeZoneImageId, sage.studyArea, pyramidingPolicy)
+
+  taskManagerLib.trackTasks()
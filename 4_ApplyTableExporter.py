@@ -31,7 +31,7 @@ SOFTWARE.
 import SAGE_Initialize as sage
 from geeViz import getImagesLib, changeDetectionLib, taskManagerLib
 from geeViz.geeView import *
-import pdb
+import pdb, re, os
 ####################################################################################################
 #Define user parameters:
 
@@ -45,86 +45,333 @@ import pdb
 ####################################################################################################
 #                     Define Functions
 ####################################################################################################
-#Function to get an image collection of LandTrendr outputs for all bands to then summarize with iGDE zonal stats (means)
-def getLT(ltCollection, ltBands):
-
-  #Bring in LandTrendr collectino
-  c = ee.ImageCollection(ltCollection)
-
-  #Get the IDs of LandTrendr bands/indices runs
-  ids = c.aggregate_array('system:index').getInfo()
-  outC = None
-
-  #Iterate across each ID and convert LandTrendr stack to a collection
-  for id in ids:
-    startYear = int(id.split('_')[-2])
-    endYear = int(id.split('_')[-1])
-    indexName = id.split('_{}_'.format(startYear))[0].split('Stack_')[1]
-    
-    ltStack = c.filter(ee.Filter.eq('system:index',id)).first()
-    fit = changeDetectionLib.simpleLTFit(ltStack, startYear, endYear, indexName).select(ltBands)
-
-    if outC == None:
-      outC = fit
-    else:
-      outC = ee.ImageCollection(getImagesLib.joinCollections(outC, fit))
-
-  return outC
-
-  # Make sure all our predictors are numbers, not strings
+# Make sure all our predictors are numbers, not strings
+# The type of each predictor (in the first GDE) and the distinct values of the string predictors are found in a single request,
+# then the string values are replaced with their codes in the local predictor codebook (new values are added to it)
 def formatPredictors(applyGDEs):
-  predictors = [i for i in sage.predictors if i in applyGDEs.first().propertyNames().getInfo()]
-  firstFeatureProperties = applyGDEs.first().getInfo()['properties']
-  for predictorName in predictors:
-    if type(firstFeatureProperties[predictorName]) == str:
+  first = ee.Feature(applyGDEs.first())
+  candidates = [i for i in sage.predictors if re.match('^[A-Za-z0-9_]+$', i)]
+  schema = {}
+  for predictorName in candidates:
+    predictorType = ee.Algorithms.ObjectType(first.get(predictorName))
+    schema[predictorName] = {\
+      'type': predictorType,
+      'values': ee.Algorithms.If(predictorType.equals('String'), applyGDEs.aggregate_array(predictorName).distinct(), None)}
+  schema = sage.cachedGetInfo(ee.Dictionary(schema))
+
+  stringValues = {}
+  for predictorName in candidates:
+    if schema[predictorName]['type'] == 'String':
       print('Formatting '+predictorName+' to String')
-      groups = ee.Dictionary(applyGDEs.aggregate_histogram(predictorName))
-      names = ee.List(groups.keys())
-      numbers = ee.List.sequence(1,names.length())
-      applyGDEs = applyGDEs.map(lambda f: f.set(predictorName+'_String', f.get(predictorName)))
-      applyGDEs = applyGDEs.remap(names, numbers, predictorName)
-
-  return applyGDEs
+      stringValues[predictorName] = schema[predictorName]['values']
+
+  if len(stringValues) == 0:
+    return applyGDEs
+  codebook = sage.updatePredictorCodebook(stringValues)
+  print('Predictor codes saved to:', sage.getPredictorCodebookPath())
+  return sage.encodePredictors(applyGDEs, dict((k, codebook[k]) for k in stringValues.keys()))
+
+#Errors that mean an export ran out of memory or time, so it may succeed with a higher tileScale or fewer GDEs
+retryErrors = ['memory', 'timed out', 'too many concurrent aggregations']
+
+#Suffix added to the table name while its shards are exported, until they replace the existing table
+stagingSuffix = '_Staging'
+
+#Function to add the shard each GDE belongs to as 'applyShard'
+#shardBy is 'grid' (the cell of applyTableShardCellSize pixels containing the GDE centroid, named {column}_{row} like the raster export tiles)
+#or the name of a GDE attribute
+def addApplyShard(applyGDEs, shardBy):
+  if shardBy == 'grid':
+    if sage.transform != None:
+      pixelSize, x0, y0 = abs(sage.transform[0]), sage.transform[2], sage.transform[5]
+    else:
+      pixelSize, x0, y0 = sage.scale, 0, 0
+    size = sage.applyTableShardCellSize * pixelSize
+    def setCell(f):
+      xy = ee.List(f.geometry().centroid(100, sage.crs).coordinates())
+      col = ee.Number(xy.get(0)).subtract(x0).divide(size).floor()
+      row = ee.Number(y0).subtract(xy.get(1)).divide(size).floor()
+      return f.set('applyShard', col.format('%d').cat('_').cat(row.format('%d')))
+    return applyGDEs.map(setCell)
+
+  def setAttribute(f):
+    value = ee.Algorithms.If(ee.Algorithms.IsEqual(f.get(shardBy), None), 'None', f.get(shardBy))
+    return f.set('applyShard', ee.Algorithms.String(value))
+  return applyGDEs.map(setAttribute)
+
+#Function to get the sorted IDs of all apply GDEs
+def getApplyGDEIds():
+  return sage.cachedGetInfo(sage.getApplyGDEs().aggregate_array(sage.gdeIdName).distinct().sort(), [sage.applyGDECollection])
+
+#Function to get the shards to split each apply table export into
+#Each shard is a dictionary of its name suffix, the GDE field it is selected by, and the values of that field it covers
+#Consecutive values (IDs, grid cells by row, or sorted attribute values) are grouped until a shard has about shardSize GDEs
+#Returns a single shard of all GDEs if sharding is not selected or not needed
+def getApplyTableShards(shardGDEs, shardBy, shardSize):
+  allGDEs = [{'name': '', 'field': None, 'keys': []}]
+  if shardSize == None:
+    return allGDEs
+
+  #Get the number of GDEs for each value (in a single request)
+  if shardBy == 'id':
+    field = sage.gdeIdName
+    counts = [[i, 1] for i in getApplyGDEIds()]
+  else:
+    field = 'applyShard'
+    counts = sage.cachedGetInfo(shardGDEs.aggregate_histogram(field), [sage.applyGDECollection])
+    if shardBy == 'grid':
+      counts = sorted(counts.items(), key = lambda kv: [int(i) for i in reversed(kv[0].split('_'))])
+    else:
+      counts = sorted(counts.items())
+
+  #Group consecutive values into shards (a value is never split across shards)
+  groups = [[]]
+  total = 0
+  for key, n in counts:
+    if total + n > shardSize and len(groups[-1]) > 0:
+      groups.append([])
+      total = 0
+    groups[-1].append(key)
+    total += n
+  if len(groups) < 2:
+    return allGDEs
+
+  print('Splitting apply tables into {} shards of up to about {} GDEs by {}'.format(len(groups), shardSize, shardBy))
+  return [{'name': '_Shard_{}'.format(i + 1), 'field': field, 'keys': keys} for i, keys in enumerate(groups)]
+
+#Function to get the filter that selects the GDEs of a shard
+def getShardFilter(shard):
+  if shard['field'] == sage.gdeIdName:
+    return ee.Filter.And(ee.Filter.gte(sage.gdeIdName, shard['keys'][0]), ee.Filter.lte(sage.gdeIdName, shard['keys'][-1]))
+  return ee.Filter.inList(shard['field'], shard['keys'])
+
+#Function to split a shard into two halves
+#A table of all GDEs is split by GDE ID. Returns an empty list if the shard only covers a single value.
+def splitShard(shard):
+  if shard['field'] == None:
+    field, keys, names = sage.gdeIdName, getApplyGDEIds(), ['_Shard_1', '_Shard_2']
+  else:
+    field, keys, names = shard['field'], shard['keys'], [shard['name'] + '_1', shard['name'] + '_2']
+  if len(keys) < 2:
+    return []
+  half = len(keys) // 2
+  return [{'name': names[0], 'field': field, 'keys': keys[:half]}, {'name': names[1], 'field': field, 'keys': keys[half:]}]
+
+#Function to start the export of one shard of an apply table
+#Shards are exported to a staging name ({name}_Staging{shard}) and only replace the existing table once every shard has completed (see replaceApplyTables)
+#job is a dictionary of the table name, the function to make the table from the apply GDEs and a tileScale,
+#the apply GDEs, the shard, the index of the tileScale in applyTableTileScales to use, and the credential (index in tokens) it is started with
+def startApplyTableExport(job):
+  shard = job['shard']
+  shardGDEs = job['applyGDEs'] if shard['field'] == None else job['applyGDEs'].filter(getShardFilter(shard))
+  tileScale = sage.applyTableTileScales[job['attempt']]
+
+  #Export table
+  outputName = job['name'] + shard['name']
+  t = ee.batch.Export.table.toAsset(**{\
+    'collection': job['getTable'](shardGDEs, tileScale), 
+    'description': outputName,
+    'assetId': job['applyTableDir'] + '/' + job['name'] + stagingSuffix + shard['name']})
+
+  print('Exporting:', outputName, '(tileScale: {})'.format(tileScale))
+  t.start()
+  job['task'] = t
+  return job
+
+#Function to wait for the apply table exports to finish
+#The tasks of each credential are tracked with taskManagerLib.trackTasks, then the status of each export is checked
+#Exports that fail for lack of memory or time are started again with the next tileScale in applyTableTileScales,
+#and once the last tileScale has failed, their shard is split in two and each half starts over
+#Returns the completed and failed jobs
+def trackApplyTableExports(jobs):
+  pending = jobs
+  completed = []
+  failed = []
+  while len(pending) > 0:
+    stillPending = []
+    for token in sorted(set([job['token'] for job in pending]), key = str):
+      if token != None:
+        sage.initializeFromToken(sage.tokens[token])
+      taskManagerLib.trackTasks()
+
+      for job in [job for job in pending if job['token'] == token]:
+        status = job['task'].status()
+        outputName = job['name'] + job['shard']['name']
+        if status['state'] in ['UNSUBMITTED', 'READY', 'RUNNING']:
+          stillPending.append(job)
+          continue
+        if status['state'] == 'COMPLETED':
+          print('Completed:', outputName)
+          completed.append(job)
+          continue
+
+        error = str(status.get('error_message', status['state']))
+        print('Failed:', outputName, error)
+        if not any(e in error.lower() for e in retryErrors):
+          failed.append(dict(job, error = error))
+        elif job['attempt'] + 1 < len(sage.applyTableTileScales):
+          stillPending.append(startApplyTableExport(dict(job, attempt = job['attempt'] + 1)))
+        else:
+          halves = splitShard(job['shard'])
+          if len(halves) == 0:
+            failed.append(dict(job, error = error))
+          for half in halves:
+            stillPending.append(startApplyTableExport(dict(job, shard = half, attempt = 0)))
+
+    pending = stillPending
+
+  for job in failed:
+    print('Could not export:', job['name'] + job['shard']['name'], job['error'])
+  return completed, failed
+
+#Function to replace the existing apply tables with the staged exports
+#A table is only replaced once all of its shards have completed: the existing table (and any shards of it from earlier runs) is deleted
+#and the staged shards are renamed to it. If any shard failed, the staged shards are deleted and the existing table is kept.
+def replaceApplyTables(tableNames, existingIds, completed, failed):
+  failedNames = set([job['name'] for job in failed])
+  for name in tableNames:
+    stagedIds = [sage.applyTableDir + '/' + name + stagingSuffix + job['shard']['name'] for job in completed if job['name'] == name]
+    if name in failedNames:
+      print('Keeping the existing {} table, since not all of its shards exported'.format(name))
+      for assetId in stagedIds:
+        ee.data.deleteAsset(assetId)
+      continue
+    if len(stagedIds) == 0:
+      continue
+
+    pattern = re.compile('^{}(_Shard_[0-9_]+)?$'.format(re.escape(name)))
+    for assetId in [i for i in existingIds if pattern.match(os.path.basename(i))]:
+      print('Deleting:', assetId)
+      ee.data.deleteAsset(assetId)
+    for assetId in stagedIds:
+      print('Renaming:', assetId)
+      ee.data.renameAsset(assetId, assetId.replace(name + stagingSuffix, name, 1))
 
 #Function to export model apply tables (tables to predict model across) for each year
-def exportApplyTables(years, durFitMagSlope, applyGDEs, applyTableDir, applyTableName):
+#Returns the started exports for trackApplyTableExports
+def exportApplyTables(years, durFitMagSlope, applyGDEs, applyTableDir, applyTableName, shards, token = None):
+  #Band names are needed to name the grouped means if using the GDE zone image
+  if sage.useGDEZoneImage:
+    bandNames = sage.cachedGetInfo(ee.Image(durFitMagSlope.first()).bandNames())
+
   #Iterate across each year to export a table of all iGDEs with zonal mean of LandTrendr outputs
+  jobs = []
   for yr in years:
     print(yr)
     
     #Get LandTrendr output for that year
     durFitMagSlopeYr = ee.Image(durFitMagSlope.filter(ee.Filter.calendarRange(yr,yr,'year')).first())
-   
-    #Compute zonal means
-    igdesYr = durFitMagSlopeYr.reduceRegions(applyGDEs, ee.Reducer.mean(), sage.scale, sage.crs, sage.transform, 4)
-
-    #Set zone field
-    igdesYr = igdesYr.map(lambda f: f.set('year',yr))
 
-    #Export table
-    yrEnding = '_{}'.format(yr)
-    outputName = applyTableName + yrEnding
-    t = ee.batch.Export.table.toAsset(**{\
-      'collection': igdesYr, 
-      'description': outputName,
-      'assetId': applyTableDir + '/' + outputName})
-
-    print('Exporting:',outputName)
-    t.start()
+    #Function to compute zonal means and set zone field
+    def getTable(gdes, tileScale, durFitMagSlopeYr = durFitMagSlopeYr, yr = yr):
+      if sage.useGDEZoneImage:
+        igdesYr = sage.reduceZones(durFitMagSlopeYr, gdes, bandNames, tileScale)
+      else:
+        igdesYr = durFitMagSlopeYr.reduceRegions(gdes, ee.Reducer.mean(), sage.scale, sage.crs, sage.transform, tileScale)
+      igdesYr = igdesYr.map(lambda f: f.set('year',yr))
+      #Add the Daymet outputs fit locally from the table of water-year means if selected
+      if sage.daymetPredictorSource == 'table':
+        igdesYr = sage.addDaymetFits(igdesYr)
+      return igdesYr
+
+    #Export each shard of the table
+    for shard in shards:
+      jobs.append(startApplyTableExport({\
+        'name': '{}_{}'.format(applyTableName, yr),
+        'getTable': getTable,
+        'applyGDEs': applyGDEs,
+        'applyTableDir': applyTableDir,
+        'shard': shard,
+        'attempt': 0,
+        'token': token}))
+  return jobs
+
+#Function to export a single long model apply table (a feature for each GDE and year) for all years
+#The LandTrendr outputs of every year are stacked into one image ({band}_{year}) so the apply GDEs are prepared and reduced once,
+#then each GDE is unpivoted to one feature per year with the same fields as the annual apply tables
+#Returns the started exports for trackApplyTableExports
+def exportLongApplyTable(years, durFitMagSlope, applyGDEs, applyTableDir, applyTableLongName, shards, token = None):
+  years = list(years)
+
+  #Stack the LandTrendr output of every year
+  bandNames = sage.cachedGetInfo(ee.Image(durFitMagSlope.first()).bandNames())
+  durFitMagSlopeStack = ee.Image.cat([ee.Image(durFitMagSlope.filter(ee.Filter.calendarRange(yr,yr,'year')).first()).regexpRename('$', '_{}'.format(yr)) for yr in years])
+  yearBandNames = ['{}_{}'.format(bn, yr) for yr in years for bn in bandNames]
+
+  #Function to unpivot a GDE to a feature for each year
+  def unpivot(f):
+    return ee.FeatureCollection([\
+      ee.Feature(f.select(['{}_{}'.format(bn, yr) for bn in bandNames], bandNames).copyProperties(f, None, yearBandNames)).set('year', yr)\
+      for yr in years])
+
+  #Function to compute zonal means of every year at once and convert to one feature per GDE and year
+  def getTable(gdes, tileScale):
+    if sage.useGDEZoneImage:
+      igdes = sage.reduceZones(durFitMagSlopeStack, gdes, yearBandNames, tileScale)
+    else:
+      igdes = durFitMagSlopeStack.reduceRegions(gdes, ee.Reducer.mean(), sage.scale, sage.crs, sage.transform, tileScale)
+    igdes = igdes.map(unpivot).flatten()
+    #Add the Daymet outputs fit locally from the table of water-year means if selected
+    if sage.daymetPredictorSource == 'table':
+      igdes = sage.addDaymetFits(igdes)
+    return igdes
+
+  #Export each shard of the table
+  jobs = []
+  for shard in shards:
+    jobs.append(startApplyTableExport({\
+      'name': applyTableLongName,
+      'getTable': getTable,
+      'applyGDEs': applyGDEs,
+      'applyTableDir': applyTableDir,
+      'shard': shard,
+      'attempt': 0,
+      'token': token}))
+  return jobs
 
 
 ####################################################################################################
 #                   Prep
 ####################################################################################################
 #Bring in apply gdes (all igdes)
-applyGDEs = ee.FeatureCollection(sage.applyGDECollection)
-# Only include GDEs greater than a minimum size.
-applyGDEs = applyGDEs.filter(ee.Filter.gte(sage.gdeSizeAttribute, sage.minGDESize))
-# Union multi-geometries
-applyGDEs = applyGDEs.map(lambda f: ee.Feature(f).dissolve(100))
+shardGDEs = None
+if sage.usePreparedGDEs:
+
+  #Read the GDEs prepared by 0_PrepareGDEs.py (already filtered, dissolved, and with strata)
+  applyGDEs = sage.getPreparedGDEs()
+
+  #Leave out the strata that are only added for the downloads
+  applyStrataNames = [n for strat in sage.vectorStrataToAdd + sage.rasterStrataToAdd for n in strat['gdeAttributes']]
+  exportStrataNames = [n for strat in sage.exportVectorStrataToAdd + sage.exportRasterStrataToAdd for n in strat['gdeAttributes'] if n not in applyStrataNames]
+  if len(exportStrataNames) > 0:
+    applyGDEs = applyGDEs.map(lambda f: f.select(f.propertyNames().removeAll(exportStrataNames)))
 
-# Add strata (static predictor layers) to applyGDEs
-applyGDEs = sage.addStrata(applyGDEs, sage.vectorStrataToAdd, sage.rasterStrataToAdd)
+  # If the apply tables are sharded by grid cell, find the cell of each GDE
+  if sage.applyTableShardSize != None and sage.applyTableShardBy == 'grid':
+    applyGDEs = addApplyShard(applyGDEs, 'grid')
+    shardGDEs = applyGDEs
+
+else:
+
+  applyGDEs = ee.FeatureCollection(sage.applyGDECollection)
+  # Only include GDEs greater than a minimum size.
+  applyGDEs = applyGDEs.filter(ee.Filter.gte(sage.gdeSizeAttribute, sage.minGDESize))
+
+  # If the apply tables are sharded by grid cell, find the cell of each GDE (before the expensive steps below, so the shards are counted quickly)
+  if sage.applyTableShardSize != None and sage.applyTableShardBy == 'grid':
+    applyGDEs = addApplyShard(applyGDEs, 'grid')
+    shardGDEs = applyGDEs
+
+  # Union multi-geometries
+  applyGDEs = applyGDEs.map(lambda f: ee.Feature(f).dissolve(100))
+
+  # Add strata (static predictor layers) to applyGDEs
+  applyGDEs = sage.addStrata(applyGDEs, sage.vectorStrataToAdd, sage.rasterStrataToAdd)
+
+# If the apply tables are sharded by a GDE attribute, copy it before it is formatted below
+if sage.applyTableShardSize != None and sage.applyTableShardBy not in ['id', 'grid']:
+  applyGDEs = addApplyShard(applyGDEs, sage.applyTableShardBy)
+  shardGDEs = applyGDEs
 
 # Make sure we aren't using strings in our predictor variables as this will make the model fail.
 applyGDEs = formatPredictors(applyGDEs)
@@ -134,35 +381,75 @@ applyGDEs = formatPredictors(applyGDEs)
 ####################################################################################################
 
 #Get fitted LT collection
-durFitMagSlope = getLT(sage.ltCollection, sage.ltBands)
+#Read the annual fits stored by 3b_LandtrendrFitExporter.py if selected, otherwise fit the LandTrendr stacks on the fly
+if sage.useLTFitCollection:
+  durFitMagSlope = sage.getLTFitCollection(sage.startApplyYear, sage.endApplyYear)
+else:
+  durFitMagSlope = sage.getLT(sage.ltCollection, sage.ltBands)
 
 ####################################################################################################
 #                   Export
 ####################################################################################################
+years = range(sage.startApplyYear, sage.endApplyYear+1)
 
-if sage.applyTablesUseMultiCredentials:
+#The zone image has to be exported for the current apply GDEs first
+if sage.useGDEZoneImage and not ee.data.getInfo(sage.getGDEZoneImageId()):
+  raise Exception('No GDE zone image found for the current apply GDEs ({}). Run 3c_GDEZoneImageExporter.py first.'.format(sage.getGDEZoneImageId()))
 
-  sets = sage.new_set_maker(range(sage.startApplyYear, sage.endApplyYear+1), len(sage.tokens))
-  for i, years in enumerate(sets):
+#Find any existing apply tables (and their shards) that are exported again
+#They are replaced after the new exports complete, so shards of earlier runs are not read along with the new ones and a failed run keeps them
+if sage.applyTableFormat == 'long':
+  tableNames = [sage.applyTableLongName]
+else:
+  tableNames = ['{}_{}'.format(sage.applyTableName, yr) for yr in years]
+existingIds = sage.findApplyTableIds(tableNames)
+
+#Delete any staged shards left by an earlier run that did not finish
+for assetId in sage.findApplyTableIds([n + stagingSuffix for n in tableNames]):
+  print('Deleting:', assetId)
+  ee.data.deleteAsset(assetId)
+
+#Get the shards to split each table into
+shards = getApplyTableShards(shardGDEs, sage.applyTableShardBy, sage.applyTableShardSize)
+
+#Export a single long table, or a table for each year
+#With multiple credentials, the shards of the long table or the years are split across the credentials
+jobs = []
+if sage.applyTablesUseMultiCredentials:
+  
+  if sage.applyTableFormat == 'long':
+    sets = sage.new_set_maker(shards, len(sage.tokens))
+  else:
+    sets = sage.new_set_maker(years, len(sage.tokens))
+  for i, s in enumerate(sets):
     sage.initializeFromToken(sage.tokens[i])
     print(ee.String('Token works!').getInfo())
-    print(years)
-    exportApplyTables(**{\
-      'years': years, 
-      'durFitMagSlope': durFitMagSlope, 
-      'applyGDEs': applyGDEs, 
-      'applyTableDir': sage.applyTableDir,
-      'applyTableName': sage.applyTableName})
-    sage.shortTrackTasks()
+    print(s)
+    if sage.applyTableFormat == 'long':
+      jobs.extend(exportLongApplyTable(years, durFitMagSlope, applyGDEs, sage.applyTableDir, sage.applyTableLongName, s, i))
+    else:
+      jobs.extend(exportApplyTables(s, durFitMagSlope, applyGDEs, sage.applyTableDir, sage.applyTableName, shards, i))
 
-else:
+elif sage.applyTableFormat == 'long':
 
-    exportApplyTables(**{\
-      'years': range(sage.startApplyYear, sage.endApplyYear+1), 
-      'durFitMagSlope': durFitMagSlope, 
-      'applyGDEs': applyGDEs, 
-      'applyTableDir': sage.applyTableDir,
-      'applyTableName': sage.applyTableName})
+  jobs = exportLongApplyTable(**{\
+    'years': years, 
+    'durFitMagSlope': durFitMagSlope, 
+    'applyGDEs': applyGDEs, 
+    'applyTableDir': sage.applyTableDir,
+    'applyTableLongName': sage.applyTableLongName,
+    'shards': shards})
 
-taskManagerLib.trackTasks()
+else:
 
+  jobs = exportApplyTables(**{\
+    'years': years, 
+    'durFitMagSlope': durFitMagSlope, 
+    'applyGDEs': applyGDEs, 
+    'applyTableDir': sage.applyTableDir,
+    'applyTableName': sage.applyTableName,
+    'shards': shards})
+
+#Wait for the exports, retrying any that run out of memory, then replace the existing tables
+completed, failed = trackApplyTableExports(jobs)
+replaceApplyTables(tableNames, existingIds, completed, failed)
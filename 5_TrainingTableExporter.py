@@ -51,8 +51,8 @@ from geeViz.geeView import *
 # (This can also be done in the playground using the "Share" function).
 if sage.viewTrainingTable:
 
-  for applyYear in range(sage.startApplyYear, sage.endApplyYear+1):
-    assetManagerLib.updateACL(sage.applyTableDir + '/' + sage.applyTableName + '_' + str(applyYear), all_users_can_read = True)
+  for applyTableId in sage.getApplyTableIds(range(sage.startApplyYear, sage.endApplyYear+1)):
+    assetManagerLib.updateACL(applyTableId, all_users_can_read = True)
   assetManagerLib.updateACL(sage.trainingGDECollection, all_users_can_read = True)
   assetManagerLib.updateACL(sage.applyGDECollection, all_users_can_read = True)
 
@@ -79,41 +79,34 @@ trainingGDEs = trainingGDEs.map(lambda f: f.set('unique_id', f.getNumber(sage.gd
 # formatted training GDE tables.
 
 years = range(sage.startTrainingYear, sage.endTrainingYear+1)
-outTraining = []
-for yr in years:
-  print(yr)
-  #Set up fields to select from training features
-  #Will only need the DGW for that year and id
-  #Will pull geometry and all other fields from that year's apply table
-  yearDGWField = sage.annualDGWField + str(yr)
-  fromFields = [yearDGWField, sage.gdeIdName, sage.wellIdName]
-  toFields = ['dgw', sage.gdeIdName, sage.wellIdName]
-
-  # get training GDEs for this year
-  igdesYr = trainingGDEs.select(fromFields, toFields)
- 
-  igdesYr = igdesYr.map(lambda f: f.set('dgw',ee.Number(f.get('dgw')).float()))
-
-  # Filter out any null DGW values
-  igdesYr = igdesYr.filter(ee.Filter.neq('dgw', sage.dgwNullValue))
-  
-  # Filter out max and min DGW values
-  igdesYr = igdesYr.filter(ee.Filter.lte('dgw', sage.maxDGW))
-  igdesYr = igdesYr.filter(ee.Filter.gte('dgw', sage.minDGW))
-  
-  
-  #Bring in apply training table to join to to get geometry and all other fields
-  yrEnding = '_{}'.format(yr)
-  applyTrainingTableYr = sage.applyTableDir + '/' + sage.applyTableName + yrEnding
-  applyTrainingTableYr = ee.FeatureCollection(applyTrainingTableYr)
-
-  # Join the apply Tables with the training GDEs. This will only retain the training GDEs
-  igdesYr = sage.joinFeatureCollectionsReverse(igdesYr, applyTrainingTableYr, sage.gdeIdName)
-
-  outTraining.append(igdesYr)
-  
-#Combine all years into a single collection
-outTraining = ee.FeatureCollection(outTraining).flatten()
+
+#Unpivot the annual DGW fields of each training GDE / well into one row per year (gde, well, year, dgw)
+#Will only need the DGW and ids
+#Will pull geometry and all other fields from the apply table
+def unpivot(f):
+  def getYear(yr):
+    yearDGWField = ee.String(sage.annualDGWField).cat(ee.Number(yr).int().format())
+    row = f.select([yearDGWField, sage.gdeIdName, sage.wellIdName], ['dgw', sage.gdeIdName, sage.wellIdName])
+    return ee.Feature(row).setGeometry(None).set('year', yr)
+  return ee.FeatureCollection(ee.List(list(years)).map(getYear))
+
+trainingRows = trainingGDEs.map(unpivot).flatten()
+
+# Filter out any null DGW values
+trainingRows = trainingRows.filter(ee.Filter.notNull(['dgw']))
+trainingRows = trainingRows.map(lambda f: f.set('dgw',ee.Number(f.get('dgw')).float()))
+trainingRows = trainingRows.filter(ee.Filter.neq('dgw', sage.dgwNullValue))
+
+# Filter out max and min DGW values
+trainingRows = trainingRows.filter(ee.Filter.lte('dgw', sage.maxDGW))
+trainingRows = trainingRows.filter(ee.Filter.gte('dgw', sage.minDGW))
+
+#Bring in the apply tables of all training years as a single long collection to join to to get geometry and all other fields
+#(the apply tables of both formats have a year field)
+applyTrainingTable = sage.getApplyTable(years)
+
+# Join the apply tables with the training rows on GDE ID and year in one join. This will only retain the training GDEs
+outTraining = sage.joinFeatureCollectionsReverse(trainingRows, applyTrainingTable, [sage.gdeIdName, 'year'])
 
 Map.addLayer(outTraining, {'strokeColor':'F0F'}, 'Training Features', False) #,'layerType':'geeVectorImage'
 
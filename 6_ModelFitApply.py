@@ -28,10 +28,10 @@ SOFTWARE.
 ####################################################################################################
 
 import SAGE_Initialize as sage
+import SAGE_ModelRegistry, SAGE_Sweep
 from geeViz import getImagesLib, changeDetectionLib, taskManagerLib, assetManagerLib
 from geeViz.geeView import *
 import pdb
-import matplotlib.pyplot as plt
 
 ####################################################################################################
 #Define user parameters:
@@ -56,9 +56,9 @@ runNumber = 1
 ####################################################################################################
 
 #Function to fit RF model
-def fitRFModel(trainingTable, predictorFields, runName):
+def fitRFModel(trainingTable, predictorFields, runName, rfParams):
   #Fit model
-  rf = ee.Classifier.smileRandomForest(**sage.randomForestParameters)
+  rf = ee.Classifier.smileRandomForest(**rfParams)
   rf = rf.setOutputMode('REGRESSION')
   trainingTable = trainingTable.filter(ee.Filter.notNull(predictorFields))
   trained = rf.train(trainingTable, 'dgw', predictorFields)
@@ -68,39 +68,35 @@ def fitRFModel(trainingTable, predictorFields, runName):
 def getRFModelInfo(rfModel, outputInfo):
 
   modelInfo = rfModel.explain().getInfo()
+
+  #Keep the codes of string predictors with the model
+  modelInfo['predictorCodebook'] = sage.loadPredictorCodebook()
   
   o = open(outputInfo,'w')
   o.write(json.dumps(modelInfo))
   o.close()
-  with open(outputInfo) as f:
-    modelInfo = json.load(f)
-  print('Model info:',modelInfo)
-  importance = modelInfo['importance']
-  oob = round(modelInfo['outOfBagErrorEstimate'],2)
-  #This line taken from: https://stackoverflow.com/questions/613183/how-do-i-sort-a-dictionary-by-value
-  importance = {k: v for k, v in sorted(importance.items(), key=lambda item: item[1])}
-
-  fig = plt.figure()
-  plt.bar(importance.keys(), importance.values())
-  plt.xticks(rotation = 60, fontsize = 10,ha = 'right')
-  plt.title('Variable Importance | OOB Error: {}'.format(oob))
-  fig.savefig(os.path.splitext(outputInfo)[0] + '_importance.png')
-  #plt.show()
-  plt.close()
+  print('Model info:',{k: v for k, v in modelInfo.items() if k != 'trees'})
+
+  SAGE_ModelRegistry.saveImportancePlot(modelInfo, os.path.splitext(outputInfo)[0] + '_importance.png')
+  return modelInfo
 
 #Function to apply a fitted model across a set of years and corresponding apply tables and export predicted values
-def applyRFModel(rfModel, years, predictorTable, predictorFields, runName):
+def applyRFModel(rfModel, modelInfo, years, predictorTable, predictorFields, runName):
 
   #Set up predicted output table name
   outputPredTablePath = '{}/{}'.format(sage.predTableDir, '{}_{}_'.format(sage.predTableNameStart, runName))
   print(outputPredTablePath)
 
+  #Get model info
+  outOfBagErrorEstimate = modelInfo['outOfBagErrorEstimate']
+  varImp = ee.Dictionary(modelInfo['importance']).toArray()
+
   #Iterate across each year and apply model and export predictions
   for yr in years:
     print('Modeling:',yr)
 
     #Bring in apply table
-    applyTrainingTableYr = ee.FeatureCollection('{}/{}_{}'.format(sage.applyTableDir, sage.applyTableName, yr))
+    applyTrainingTableYr = sage.getApplyTable(yr)
 
     #Bring in obs from the training table for that year and join it when available so actual and predicted can be compared
     trainingYr = trainingTable.filter(ee.Filter.eq('year',yr))
@@ -111,11 +107,6 @@ def applyRFModel(rfModel, years, predictorTable, predictorFields, runName):
 
     #Filter out null values
     applyTrainingTableYr = applyTrainingTableYr.filter(ee.Filter.notNull(predictorFields))
-    
-    #Get model info
-    modelInfo = ee.Dictionary(rfModel.explain())
-    outOfBagErrorEstimate = modelInfo.get('outOfBagErrorEstimate')
-    varImp = ee.Dictionary(modelInfo.get('importance')).toArray()
 
     #Apply model
     dgwPredicted = applyTrainingTableYr\
@@ -124,7 +115,7 @@ def applyRFModel(rfModel, years, predictorTable, predictorFields, runName):
         'predictor_classes':predictorFields,
         'runName':runName,
         'runNumber':runNumber,
-        'nTrees': sage.nTrees,
+        'nTrees': modelInfo.get('numberOfTrees', sage.randomForestParameters['numberOfTrees']),
         'rfModel':rfModel,
         'outOfBagErrorEstimate':outOfBagErrorEstimate,
         'varImp':varImp\
@@ -150,18 +141,65 @@ trainingTable = ee.FeatureCollection(sage.trainingTablePath)
 #                         Run Model
 ####################################################################################################
 
+#Runs to fit and apply ([name, predictor selectors, random forest parameters])
+runs = [run + [sage.randomForestParameters] for run in sage.modelRuns]
+
+#If selected, compare every predictor set and parameter combination and only fit and apply the best one
+if sage.sweepModels:
+  if sage.sweepMode == 'local' and sage.sweepLocalTrainingTable == None:
+    raise Exception('sweepMode = \'local\' needs sweepLocalTrainingTable (the training table downloaded as csv or parquet)')
+  configs = SAGE_Sweep.getSweepConfigs(sage.sweepPredictorSets, sage.sweepRFParameters, sage.randomForestParameters)
+  print('Evaluating {} model configurations ({})'.format(len(configs), sage.sweepMode))
+
+  if sage.sweepMode == 'local':
+    import SAGE_LocalTables, SAGE_CrossValidation
+    localTrainingTable = SAGE_LocalTables.readTables(sage.sweepLocalTrainingTable)
+    folds = None
+    if sage.sweepMetric == 'cv':
+      folds = SAGE_CrossValidation.getFolds(localTrainingTable, sage.cvBlockBy, sage.cvFolds, sage.randomForestParameters.get('seed', 0), sage.cvYearRanges, sage.getCVFoldDir())
+    errors = SAGE_Sweep.evaluateLocal(localTrainingTable, configs, sage.sweepMetric, folds, sage.sweepWorkers)
+    metric = sage.sweepMetric
+  else:
+    if sage.sweepMetric != 'oob':
+      print('Cross-validation is only done with sweepMode = \'local\'. Ranking by out of bag error.')
+    errors = SAGE_Sweep.evaluateServer(trainingTable, configs, sage.sweepTablePath)
+    metric = 'oob'
+
+  ranked = SAGE_Sweep.rankConfigs(configs, errors)
+  SAGE_Sweep.reportRanking(ranked, metric, os.path.join(sage.outputLocalRFModelInfoDir, 'modelSweep-{}.json'.format(sage.runname)))
+  if ranked[0]['error'] == None:
+    raise Exception('Every model configuration in the sweep failed')
+  runs = [[ranked[0]['name'], ranked[0]['selectors'], ranked[0]['rfParams']]]
+
 #Function calls
 #Iterate across each run and fit, summarize, and apply model
-for run in sage.modelRuns:
+for run in runs:
 
   #Get predictor field namesss
-  predictorFields = ee.Feature(trainingTable.select(run[1]).first()).propertyNames().remove('system:index').getInfo()
+  predictorFields = sage.cachedGetInfo(ee.Feature(trainingTable.select(run[1]).first()).propertyNames().remove('system:index'), [sage.trainingTablePath])
   
-  #Fit model
-  rfModel  = fitRFModel(trainingTable, predictorFields, run[0])
+  outputInfo = os.path.join(sage.outputLocalRFModelInfoDir, 'dgwRFModelInfo-{}.json'.format(run[0]))
 
-  #Get model info
-  getRFModelInfo(rfModel, os.path.join(sage.outputLocalRFModelInfoDir, 'dgwRFModelInfo-{}.json'.format(run[0])))
+  #Reuse the model from the registry if it was already trained with the same training table, predictors, and parameters
+  modelInfo = None
+  if sage.useModelRegistry:
+    modelSettings = SAGE_ModelRegistry.getModelSettings(sage.trainingTablePath, predictorFields, run[2])
+    modelKey = SAGE_ModelRegistry.getModelKey(modelSettings)
+    modelInfo = SAGE_ModelRegistry.loadModelInfo(sage.getModelRegistryDir(), modelKey)
+
+  if modelInfo != None:
+    print('Using registered model:', modelKey)
+    rfModel = SAGE_ModelRegistry.getClassifier(modelInfo)
+    SAGE_ModelRegistry.exportModelInfo(sage.getModelRegistryDir(), modelKey, outputInfo)
+
+  else:
+    #Fit model
+    rfModel  = fitRFModel(trainingTable, predictorFields, run[0], run[2])
+
+    #Get model info
+    modelInfo = getRFModelInfo(rfModel, outputInfo)
+    if sage.useModelRegistry:
+      SAGE_ModelRegistry.saveModel(sage.getModelRegistryDir(), modelKey, modelInfo, modelSettings)
 
   #Apply and export model
   if sage.modelApplyUseMultiCredentials:
@@ -171,12 +209,12 @@ for run in sage.modelRuns:
       sage.initializeFromToken(sage.tokens[i])
       print(ee.String('Token works!').getInfo())
       print(years)
-      applyRFModel(rfModel, years, trainingTable, predictorFields, sage.runname)
+      applyRFModel(rfModel, modelInfo, years, trainingTable, predictorFields, sage.runname)
       sage.shortTrackTasks()
 
   else:
 
-    applyRFModel(rfModel, range(sage.startApplyYear, sage.endApplyYear+1), trainingTable, predictorFields, sage.runname)
+    applyRFModel(rfModel, modelInfo, range(sage.startApplyYear, sage.endApplyYear+1), trainingTable, predictorFields, sage.runname)
 
 
 taskManagerLib.trackTasks()
@@ -51,19 +51,33 @@ tables = [i for i in tables if os.path.basename(i).find(sage.predTableNameStart)
 #Set up a dummy location to simplify geometry with to save space
 dummyLocation = ee.Geometry.Point([-111,45])
 
+#Bring in the export strata of the GDEs prepared by 0_PrepareGDEs.py if selected
+if sage.usePreparedGDEs and sage.preparedGDEsExist():
+  strataNames = [n for strat in sage.exportVectorStrataToAdd + sage.exportRasterStrataToAdd for n in strat['gdeAttributes']]
+  preparedStrata = sage.getPreparedGDEs().select([sage.gdeIdName] + strataNames, None, False)
+
+#Bring in the codes given to string predictors by 4_ApplyTableExporter.py to label them in the output
+predictorCodebook = sage.loadPredictorCodebook()
+
 #Export each table
 for table in tables:
 
   collection = ee.FeatureCollection(table)
 
-  collection = sage.addStrata(collection, sage.exportVectorStrataToAdd, sage.exportRasterStrataToAdd )
+  collection = sage.decodePredictors(collection, predictorCodebook)
+
+  #Join the export strata from the prepared GDEs by ID if selected, otherwise add them with spatial joins
+  if sage.usePreparedGDEs and sage.preparedGDEsExist():
+    collection = sage.joinFeatureCollectionsReverse(preparedStrata, collection, sage.gdeIdName)
+  else:
+    collection = sage.addStrata(collection, sage.exportVectorStrataToAdd, sage.exportRasterStrataToAdd )
 
   description = os.path.basename(table)
   print('Exporting: ', description)
 
   if sage.removeGeometry:
 
-    propertyNames = collection.first().propertyNames().getInfo()
+    propertyNames = sage.cachedGetInfo(collection.first().propertyNames())
     t = ee.batch.Export.table.toDrive(**{\
       'collection': collection, 
       'description': description, 
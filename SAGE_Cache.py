@@ -0,0 +1,165 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library for a persistent (on disk) cache of deterministic .getInfo() results
+#Entries are keyed by a hash of the serialized expression plus the update times of the assets it reads,
+#so a result is reused until one of its input assets changes, the entry expires (TTL),
+#or it is evicted to keep the cache under its maximum size (least recently used first)
+####################################################################################################
+#Module imports
+import hashlib, json, os, re, time
+import ee
+
+####################################################################################################
+#Strings in an expression that look like asset ids (e.g. projects/x/assets/y, TIGER/2016/States)
+assetIdPattern = re.compile(r'^[A-Za-z0-9_\-]+(/[A-Za-z0-9_\-\.]+)+$')
+
+#Update times of assets and folder listings already looked up during this run
+_assetVersions = {}
+_listedFolders = {}
+
+#Size in bytes of each cache directory, found when it is first evicted during this run and updated as entries are written
+_cacheSizes = {}
+
+stats = {'hits': 0, 'misses': 0}
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to find asset ids referenced by an expression
+def findAssetIds(serialized):
+	out = []
+	def walk(v):
+		if isinstance(v, dict):
+			for i in v.values(): walk(i)
+		elif isinstance(v, list):
+			for i in v: walk(i)
+		elif isinstance(v, str) and assetIdPattern.match(v) and v not in out:
+			out.append(v)
+	walk(json.loads(serialized))
+	return out
+
+#Function to list the assets in a folder once per run, so sibling assets (e.g. the annual tables) cost one request
+def _listFolder(folder):
+	if folder not in _listedFolders:
+		try:
+			assets = ee.data.listAssets({'parent': folder}).get('assets', [])
+			_listedFolders[folder] = dict((a.get('id', a.get('name')), a) for a in assets)
+		except Exception:
+			_listedFolders[folder] = {}
+	return _listedFolders[folder]
+
+#Function to get a version string for an asset
+#Collections and folders use their item count and latest item update time, since adding images does not always touch the parent
+def getAssetVersion(assetId):
+	if assetId in _assetVersions:
+		return _assetVersions[assetId]
+	try:
+		asset = _listFolder(os.path.dirname(assetId)).get(assetId)
+		if asset == None or 'updateTime' not in asset:
+			asset = ee.data.getAsset(assetId)
+		version = asset.get('updateTime', '')
+		if asset.get('type') in ['IMAGE_COLLECTION', 'FOLDER']:
+			children = ee.data.listAssets({'parent': assetId}).get('assets', [])
+			version = '{}|{}|{}'.format(version, len(children), max([c.get('updateTime', '') for c in children] + ['']))
+	except Exception:
+		#Not an asset (or not readable); only the expression is used in the key
+		version = None
+	_assetVersions[assetId] = version
+	return version
+
+#Function to build the cache key for an expression
+def cacheKey(obj, assetIds = None):
+	serialized = ee.serializer.toJSON(obj)
+	if assetIds == None:
+		assetIds = findAssetIds(serialized)
+	versions = [[i, getAssetVersion(i)] for i in sorted(assetIds)]
+	return hashlib.sha256((serialized + json.dumps(versions)).encode('utf-8')).hexdigest()
+
+#Function to read a cache entry (None if missing, unreadable, or older than ttlHours)
+def readEntry(path, ttlHours = None):
+	try:
+		entry = json.load(open(path))
+	except (IOError, OSError, ValueError):
+		return None
+	if 'value' not in entry or (ttlHours != None and time.time() - entry.get('created', 0) > ttlHours * 3600):
+		return None
+	return entry
+
+#Function to delete expired entries and evict least recently used entries until the cache is under maxMB
+#The modification time of an entry is its last use
+#Returns the size of the cache in bytes after eviction
+def evict(cacheDir, ttlHours = None, maxMB = None):
+	if not os.path.exists(cacheDir):
+		return 0
+	entries = []
+	for name in os.listdir(cacheDir):
+		path = os.path.join(cacheDir, name)
+		if not name.endswith('.json'):
+			continue
+		if ttlHours != None and readEntry(path, ttlHours) == None:
+			os.remove(path)
+			continue
+		entries.append([os.path.getmtime(path), os.path.getsize(path), path])
+	if maxMB != None:
+		total = sum(e[1] for e in entries)
+		for lastUsed, size, path in sorted(entries):
+			if total <= maxMB * 1024 * 1024:
+				break
+			os.remove(path)
+			total -= size
+	return sum(e[1] for e in entries if os.path.exists(e[2]))
+
+#Function to get the value of an ee object, reusing a cached value when the expression and the assets it reads are unchanged
+#assetIds: assets whose update times are part of the key. If None, they are found in the expression.
+#Use [] for expressions over static public datasets to only rely on the TTL.
+#The cache is evicted once per run (on first use) and again only when a write takes it over maxMB
+def getInfo(obj, cacheDir, assetIds = None, ttlHours = None, maxMB = None):
+	if cacheDir not in _cacheSizes:
+		_cacheSizes[cacheDir] = evict(cacheDir, ttlHours, maxMB)
+
+	key = cacheKey(obj, assetIds)
+	path = os.path.join(cacheDir, key + '.json')
+	entry = readEntry(path, ttlHours) if os.path.exists(path) else None
+	if entry != None:
+		os.utime(path, None)
+		stats['hits'] += 1
+		return entry['value']
+
+	stats['misses'] += 1
+	value = obj.getInfo()
+	if not os.path.exists(cacheDir):
+		os.makedirs(cacheDir)
+	#Write to a temp file first so an interrupted run never leaves a partial entry
+	tempPath = path + '.tmp'
+	o = open(tempPath, 'w')
+	o.write(json.dumps({'value': value, 'created': time.time()}))
+	o.close()
+	os.replace(tempPath, path)
+	_cacheSizes[cacheDir] += os.path.getsize(path)
+	#Evict down to 90% of maxMB so the next writes do not each have to evict again
+	if maxMB != None and _cacheSizes[cacheDir] > maxMB * 1024 * 1024:
+		_cacheSizes[cacheDir] = evict(cacheDir, None, maxMB * 0.9)
+	return value
@@ -0,0 +1,195 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to cross-validate the random forest model with folds blocked in space or time
+#Training rows of the same well, GDE, or year are strongly related, so the out of bag error (where related rows
+#fall on both sides of each bag) is optimistic. Here every row with the same block value (e.g. STN_ID, POLYGON_ID,
+#HUC08, Hydroregion_Number, or a range of years) is kept in the same fold, folds are fit in parallel on local cores
+#with scikit-learn (SAGE_LocalRF.py), and RMSE, MAE, and R² are reported for each fold and each region
+#
+#The fold of each block value is saved to a json file and reused, so different predictor sets and parameters
+#are compared on the same folds
+####################################################################################################
+#Module imports
+import argparse, hashlib, json, os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+####################################################################################################
+#Field of the response in the training table
+responseField = 'dgw'
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to get the key of each block value in the saved fold assignment
+#Whole numbers are written without a decimal, so IDs read as floats (e.g. 18020001.0 in a column with missing values) match the integer IDs
+def getBlockKeys(values):
+	return pd.Series(values).astype(str).str.replace(r'^(-?\d+)\.0+$', r'\1', regex = True)
+
+#Function to assign block values that are not in a saved assignment ({key: fold}) to folds
+#Year blocks use yearRanges ([[start, end], ...], one fold each) if given. Otherwise years get the fold of the saved range of years
+#they fall in (or the nearest one), and with nothing saved the years are split into nFolds runs of consecutive years
+#Other blocks are shuffled with seed and each is given to the fold with the fewest rows so far (counting the rows of saved values), largest first
+def assignFolds(table, blockBy, nFolds = 5, seed = 0, yearRanges = None, assignment = {}):
+	keys = getBlockKeys(table[blockBy].values)
+	assigned = keys.isin(assignment.keys()).values
+	if blockBy == 'year':
+		years = sorted(table[blockBy][~assigned].unique())
+		if yearRanges != None:
+			ranges = [[start, end, fold] for fold, (start, end) in enumerate(yearRanges)]
+		elif len(assignment) > 0:
+			savedYears = {}
+			for key, fold in assignment.items():
+				savedYears.setdefault(fold, []).append(float(key))
+			ranges = sorted([min(y), max(y), fold] for fold, y in savedYears.items())
+		else:
+			ranges = [[r[0], r[-1], fold] for fold, r in enumerate(np.array_split(years, nFolds)) if len(r) > 0]
+		out = {}
+		for yr, key in zip(years, getBlockKeys(years)):
+			inside = [fold for start, end, fold in ranges if start <= yr <= end]
+			if len(inside) > 0:
+				out[key] = inside[0]
+			elif yearRanges == None:
+				out[key] = min(ranges, key = lambda r: min(abs(yr - r[0]), abs(yr - r[1])))[2]
+		return out
+	counts = keys[~assigned].value_counts()
+	values = counts.index.values
+	order = np.random.default_rng(seed).permutation(len(values))
+	order = sorted(order, key = lambda i: -counts.values[i])
+	sizes = np.bincount(keys[assigned].map(assignment).astype(int).values, minlength = nFolds).astype(float)
+	out = {}
+	for i in order:
+		fold = int(np.argmin(sizes))
+		out[values[i]] = fold
+		sizes[fold] += counts.values[i]
+	return out
+
+#Function to get the path of the saved fold assignment for a blocking
+def getFoldPath(foldDir, blockBy, nFolds, seed = 0, yearRanges = None):
+	key = hashlib.sha256(json.dumps([blockBy, nFolds, seed, yearRanges]).encode('utf-8')).hexdigest()[:8]
+	return os.path.join(foldDir, 'cvFolds-{}-{}.json'.format(blockBy, key))
+
+#Function to get the fold of every row of a table, reusing the saved fold assignment if there is one
+#Block values that are not in the saved assignment (e.g. new wells) are added to it
+def getFolds(table, blockBy, nFolds = 5, seed = 0, yearRanges = None, foldDir = None):
+	path = getFoldPath(foldDir, blockBy, nFolds, seed, yearRanges) if foldDir != None else None
+	assignment = {}
+	if path != None and os.path.exists(path):
+		saved = json.load(open(path))['folds']
+		assignment = dict(zip(getBlockKeys(list(saved.keys())), saved.values()))
+	keys = getBlockKeys(table[blockBy].values)
+	missing = ~keys.isin(assignment.keys())
+	if missing.any():
+		newAssignment = assignFolds(table, blockBy, nFolds, seed, yearRanges, assignment)
+		if len(assignment) > 0 and len(newAssignment) > 0:
+			print('Adding {} new {} values to the saved folds'.format(len(newAssignment), blockBy))
+		assignment.update(newAssignment)
+		if path != None:
+			if not os.path.exists(foldDir):
+				os.makedirs(foldDir)
+			o = open(path, 'w')
+			o.write(json.dumps({'blockBy': blockBy, 'nFolds': nFolds, 'seed': seed, 'yearRanges': yearRanges, 'folds': assignment}))
+			o.close()
+	#Rows outside of every year range are left out (-1)
+	return keys.map(assignment).fillna(-1).astype(int).values
+
+#Function to get RMSE, MAE, and R² of predictions
+def getMetrics(observed, predicted):
+	observed = np.asarray(observed, dtype = float)
+	predicted = np.asarray(predicted, dtype = float)
+	errors = predicted - observed
+	total = np.sum((observed - observed.mean())**2) if len(observed) > 0 else 0
+	return {\
+		'n': int(len(observed)),
+		'rmse': float(np.sqrt(np.mean(errors**2))) if len(observed) > 0 else None,
+		'mae': float(np.mean(np.abs(errors))) if len(observed) > 0 else None,
+		'r2': float(1 - np.sum(errors**2) / total) if total > 0 else None}
+
+#Function to fit a model without one fold and predict that fold
+def _predictFold(table, predictorFields, rfParams, folds, fold):
+	import SAGE_LocalRF
+	test = folds == fold
+	model = SAGE_LocalRF.fitForest(table[~test & (folds >= 0)], predictorFields, rfParams, 1)
+	return model.predict(table[test][predictorFields].values.astype(np.float32))
+
+#Function to get out of fold predictions for every row of a table
+#Folds are fit at the same time, one per core (rows without a fold are not predicted)
+def crossValidate(table, predictorFields, rfParams, folds, workers = None):
+	keep = table[predictorFields + [responseField]].notnull().all(axis = 1).values
+	table = table[keep]
+	folds = np.asarray(folds)[keep]
+	foldIds = sorted(set(folds[folds >= 0]))
+	with ThreadPoolExecutor(max_workers = workers or os.cpu_count()) as pool:
+		foldPredictions = list(pool.map(lambda fold: _predictFold(table, predictorFields, rfParams, folds, fold), foldIds))
+	predicted = np.full(len(table), np.nan)
+	for fold, values in zip(foldIds, foldPredictions):
+		predicted[folds == fold] = values
+	out = table.copy()
+	out['fold'] = folds
+	out['cv_predicted'] = predicted
+	return out[out['fold'] >= 0]
+
+#Function to summarize out of fold predictions overall, by fold, and by region
+def summarize(predictions, regionField = None):
+	rows = [dict(getMetrics(predictions[responseField], predictions['cv_predicted']), group = 'all', value = 'all')]
+	groupFields = ['fold'] + ([regionField] if regionField != None and regionField in predictions.columns else [])
+	for field in groupFields:
+		for value, group in predictions.groupby(field):
+			rows.append(dict(getMetrics(group[responseField], group['cv_predicted']), group = field, value = value))
+	return pd.DataFrame(rows, columns = ['group', 'value', 'n', 'rmse', 'mae', 'r2'])
+
+####################################################################################################
+#Cross-validate the model runs in SAGE_Initialize from the command line, e.g.
+#python SAGE_CrossValidation.py Training_Table.csv --blockBy HUC08
+if __name__ == '__main__':
+	import SAGE_LocalRF
+	from SAGE_LocalTables import readTables, readSettings
+	sage = readSettings()
+	foldDir = sage['cvFoldDir'] or os.path.join(sage['outputLocalRFModelInfoDir'], 'CV-Folds')
+	parser = argparse.ArgumentParser(description = 'Cross-validate the random forest model with folds blocked by well, GDE, region, or years')
+	parser.add_argument('trainingTable', help = 'Training table csv or parquet (e.g. from SAGE_LocalTables.py)')
+	parser.add_argument('--blockBy', default = sage['cvBlockBy'], help = 'Field to block folds by (e.g. STN_ID, POLYGON_ID, HUC08, Hydroregion_Number, or year)')
+	parser.add_argument('--folds', type = int, default = sage['cvFolds'], help = 'Number of folds')
+	parser.add_argument('--yearRanges', nargs = '*', help = 'start-end year ranges, one fold each, when blocking by year (e.g. 1985-1996 1997-2008 2009-2021)')
+	parser.add_argument('--regionField', default = sage['cvRegionField'], help = 'Field to report errors by')
+	parser.add_argument('--runs', nargs = '*', help = 'Names of the modelRuns in SAGE_Initialize to cross-validate (default: all)')
+	parser.add_argument('--workers', type = int, help = 'Number of folds to fit at once (default: all cores)')
+	args = parser.parse_args()
+
+	yearRanges = [[int(y) for y in r.split('-')] for r in args.yearRanges] if args.yearRanges else sage['cvYearRanges']
+	table = readTables(args.trainingTable)
+	folds = getFolds(table, args.blockBy, args.folds, sage['randomForestParameters'].get('seed', 0), yearRanges, foldDir)
+	for runName, selectors in sage['modelRuns']:
+		if args.runs and runName not in args.runs:
+			continue
+		predictorFields = SAGE_LocalRF.selectPredictors(table.columns, selectors)
+		print('Cross-validating {} blocked by {} ({} predictors)'.format(runName, args.blockBy, len(predictorFields)))
+		summary = summarize(crossValidate(table, predictorFields, sage['randomForestParameters'], folds, args.workers), args.regionField)
+		print(summary.round(4).to_string(index = False))
+		outputCSV = os.path.join(sage['outputLocalRFModelInfoDir'], 'dgwRFCrossValidation-{}-{}.csv'.format(runName, args.blockBy))
+		summary.to_csv(outputCSV, index = False)
+		print('Wrote cross-validation summary to:', outputCSV)
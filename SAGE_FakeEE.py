@@ -0,0 +1,767 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Local stand-in for the Earth Engine (ee) and geeViz packages
+#Lets the SAGE scripts run offline (no GEE account or network) so client-side costs can be measured:
+#every ee call builds a recorded expression graph node, .getInfo() and ee.data calls are answered from fixtures,
+#and export tasks are recorded along with the size and serialization time of their expression graphs.
+
+#Usage (from the SAGE folder):
+#  python SAGE_FakeEE.py 3 4 5 6 7
+#  python SAGE_FakeEE.py 4 --fixtures myFixtures.json --json bench.json
+#Fixture files are json with any of these keys:
+#  {"rules": [{"call": "aggregate_array", "asset": "LandTrendr-Collection", "value": [...]}, ...],
+#   "tables": {"Apply_Table": {"POLYGON_ID": 1, ...}, ...},
+#   "assets": {"projects/.../asset": {"type": "TABLE"}, ...},
+#   "assetLists": {"projects/.../folder": ["projects/.../folder/asset", ...]},
+#   "taskErrors": {"Apply_Table_1985": ["User memory limit exceeded.", ...]}}
+#Each export started with a description in taskErrors fails with the next of its errors (once they run out, exports complete)
+#Rules are checked first (matched on the last call of the expression and, optionally, an asset id
+#string referenced anywhere in the expression), then the built-in defaults below.
+
+#Note: geeViz functions that are not emulated are recorded as single graph nodes, so graph sizes
+#are lower bounds of what is sent to GEE. Use the numbers to compare changes, not as absolutes.
+####################################################################################################
+#Module imports
+import argparse, collections, glob, inspect, json, os, runpy, sys, tempfile, time, traceback, types
+
+sys.setrecursionlimit(20000)
+
+####################################################################################################
+#							Expression graph
+####################################################################################################
+#Every ee object is a Node: a function name plus its arguments (the object a method is called on is the first argument)
+class Node(object):
+	def __init__(self, func, args = (), kwargs = None):
+		self.func = func
+		self.args = tuple(_prepArg(a) for a in args)
+		self.kwargs = dict((k, _prepArg(v)) for k, v in (kwargs or {}).items())
+
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		return lambda *args, **kwargs: Node(name, (self,) + args, kwargs)
+
+	def __iter__(self):
+		raise TypeError('ee objects are not iterable on the client ({})'.format(self.func))
+
+	def __repr__(self):
+		return '<ee {}>'.format(self.func)
+
+	def getInfo(self):
+		return ee.data.computeValue(self)
+
+#Callable ee namespaces (ee.Image, ee.Filter.eq, ee.Algorithms.TemporalSegmentation.LandTrendr, ...)
+class Namespace(object):
+	def __init__(self, name):
+		self._name = name
+
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		ns = Namespace(self._name + '.' + name)
+		setattr(self, name, ns)
+		return ns
+
+	def __call__(self, *args, **kwargs):
+		#Casting an existing object (e.g. ee.Image(img)) does not add a node, as in the ee package
+		if len(args) == 1 and len(kwargs) == 0 and isinstance(args[0], Node) and self._name[0].isupper() and '.' not in self._name:
+			return args[0]
+		return Node(self._name, args, kwargs)
+
+#Python functions passed to map, iterate, etc. are called with placeholder variables, like the ee package does
+_functionDepth = [0]
+def _prepArg(a):
+	if isinstance(a, (Node, Namespace)) or not callable(a) or isinstance(a, type):
+		if isinstance(a, (list, tuple)):
+			return [_prepArg(i) for i in a]
+		if isinstance(a, dict):
+			return dict((k, _prepArg(v)) for k, v in a.items())
+		return a
+	try:
+		params = inspect.signature(a).parameters.values()
+		nArgs = len([p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) and p.default is p.empty])
+	except (TypeError, ValueError):
+		nArgs = 1
+	nArgs = max(nArgs, 1)
+	_functionDepth[0] += 1
+	try:
+		variables = [Node('Variable', ('_MAPPING_VAR_{}_{}'.format(_functionDepth[0], i),)) for i in range(nArgs)]
+		body = a(*variables)
+	finally:
+		_functionDepth[0] -= 1
+	return Node('Function', (body,) + tuple(variables))
+
+#Function to serialize a graph the way the ee client does (shared sub-expressions are only encoded once)
+def serialize(obj):
+	values = collections.OrderedDict()
+	keys = {}
+	memo = {}
+	def encode(v):
+		if isinstance(v, Node):
+			if id(v) in memo:
+				return memo[id(v)]
+			encoded = {'f': v.func, 'a': [encode(a) for a in v.args], 'k': dict((k, encode(kv)) for k, kv in sorted(v.kwargs.items()))}
+			key = json.dumps(encoded, sort_keys = True, default = str)
+			if key not in keys:
+				keys[key] = str(len(values))
+				values[keys[key]] = encoded
+			memo[id(v)] = {'ref': keys[key]}
+			return memo[id(v)]
+		if isinstance(v, (list, tuple)):
+			return [encode(i) for i in v]
+		if isinstance(v, dict):
+			return dict((str(k), encode(kv)) for k, kv in v.items())
+		if isinstance(v, Namespace):
+			return {'ns': v._name}
+		return v
+	result = encode(obj)
+	return json.dumps({'values': values, 'result': result}, default = str)
+
+#Function to get the size of an expression graph: unique nodes, total (unshared) nodes, depth, serialized bytes and seconds
+def measureGraph(obj):
+	start = time.time()
+	serialized = serialize(obj)
+	seconds = time.time() - start
+	unique = set()
+	treeMemo = {}
+	def walk(v):
+		if isinstance(v, Node):
+			if id(v) in treeMemo:
+				return treeMemo[id(v)]
+			unique.add(id(v))
+			children = [walk(a) for a in list(v.args) + list(v.kwargs.values())]
+			out = (1 + sum(c[0] for c in children), 1 + max([c[1] for c in children] + [0]))
+		elif isinstance(v, (list, tuple)):
+			children = [walk(i) for i in v]
+			out = (sum(c[0] for c in children), max([c[1] for c in children] + [0]))
+		elif isinstance(v, dict):
+			children = [walk(i) for i in v.values()]
+			out = (sum(c[0] for c in children), max([c[1] for c in children] + [0]))
+		else:
+			return (0, 0)
+		if isinstance(v, Node):
+			treeMemo[id(v)] = out
+		return out
+	treeNodes, depth = walk(obj)
+	return {'uniqueNodes': len(unique), 'treeNodes': treeNodes, 'depth': depth, 'bytes': len(serialized), 'serializeSeconds': seconds}
+
+#Function to list every string constant in a graph (used to match fixtures to the assets an expression reads)
+def graphStrings(obj):
+	out = []
+	seen = set()
+	def walk(v):
+		if isinstance(v, Node):
+			if id(v) in seen:
+				return
+			seen.add(id(v))
+			for a in list(v.args) + list(v.kwargs.values()):
+				walk(a)
+		elif isinstance(v, (list, tuple)):
+			for i in v: walk(i)
+		elif isinstance(v, dict):
+			for i in v.values(): walk(i)
+		elif isinstance(v, str):
+			out.append(v)
+	walk(obj)
+	return out
+
+####################################################################################################
+#							Recorder and fixtures
+####################################################################################################
+recorder = {'getInfo': [], 'data': [], 'exports': [], 'assets': []}
+fixtures = {'rules': [], 'tables': collections.OrderedDict(), 'assets': {}, 'assetLists': {}, 'taskErrors': {}}
+
+def resetRecorder():
+	for k in recorder.keys():
+		recorder[k] = []
+
+#Function to load a fixture json file (its entries take precedence over the defaults)
+def loadFixtures(path):
+	f = json.load(open(path))
+	fixtures['rules'] = f.get('rules', []) + fixtures['rules']
+	tables = collections.OrderedDict(f.get('tables', {}))
+	tables.update(fixtures['tables'])
+	fixtures['tables'] = tables
+	fixtures['assets'].update(f.get('assets', {}))
+	fixtures['assetLists'].update(f.get('assetLists', {}))
+	fixtures['taskErrors'].update(dict((k, list(v)) for k, v in f.get('taskErrors', {}).items()))
+
+#SAGE settings are read lazily so the defaults follow whatever SAGE_Initialize is configured with
+def _sage():
+	return sys.modules.get('SAGE_Initialize')
+
+#Default first-feature properties for the tables each stage reads
+def _defaultTables():
+	sage = _sage()
+	gde = collections.OrderedDict([('POLYGON_ID', 101), ('STN_ID', 2001), ('Shape_Area', 25000.0), ('Macrogroup', 'Riparian'),
+		('Depth_Str', 'Shallow: perf.'), ('Well_Depth', 20.0)])
+	if sage == None:
+		return collections.OrderedDict([('', gde)])
+	for strat in sage.vectorStrataToAdd + sage.rasterStrataToAdd:
+		for name in strat['gdeAttributes']:
+			gde[name] = '18020104' if name == 'HUC08' else 1
+	training = collections.OrderedDict(gde)
+	for yr in range(sage.startTrainingYear, sage.endTrainingYear + 1):
+		training[sage.annualDGWField + str(yr)] = 3.5
+	apply = collections.OrderedDict(gde)
+	for indexName in sage.landtrendrIndexList:
+		for bn in sage.ltBands:
+			apply['{}_LT_{}'.format(indexName, bn.split('_')[-1])] = 0.5
+	apply['year'] = sage.startApplyYear
+	trainingTable = collections.OrderedDict(apply)
+	trainingTable['dgw'] = 3.5
+	pred = collections.OrderedDict(trainingTable)
+	pred.update([('modeled_DGW', 3.2), ('matchesN', 1), ('matchesReduced', 3.5)])
+	return collections.OrderedDict([\
+		(sage.predTableNameStart, pred),
+		(sage.trainingTableName, trainingTable),
+		(sage.applyTableName, apply),
+		(sage.trainingGDECollection, training),
+		('', gde)])
+
+def _defaultRules():
+	sage = _sage()
+	rules = [\
+		{'call': 'aggregate_histogram', 'asset': 'TIGER/2016/States', 'value': {'California': 1}},
+		{'call': 'explain', 'value': {'importance': {'NDVI_LT_fitted': 10.0, 'HUC08': 5.0}, 'numberOfTrees': 90, 'outOfBagErrorEstimate': 1.5, 'trees': []}}]
+	if sage != None:
+		ltIds = ['LT_Stack_{}_{}_{}'.format(i, sage.landtrendrStartYear, sage.landtrendrEndYear) for i in sage.landtrendrIndexList]
+		rules.append({'call': 'aggregate_array', 'asset': sage.ltCollection, 'value': ltIds})
+	return rules
+
+def _matchRule(rule, node, strings):
+	if rule['call'] != node.func:
+		return False
+	return rule.get('asset') == None or any(rule['asset'] in s for s in strings)
+
+#Function to answer a getInfo() from fixtures
+def evaluate(node):
+	#Client-side containers of ee objects (e.g. ee.Dictionary({...}))
+	if isinstance(node, dict):
+		return dict((k, evaluate(v)) for k, v in node.items())
+	if isinstance(node, list):
+		return [evaluate(v) for v in node]
+	if not isinstance(node, Node):
+		return node
+	strings = graphStrings(node)
+	for rule in fixtures['rules'] + _defaultRules():
+		if _matchRule(rule, node, strings):
+			return rule['value']
+
+	if not isinstance(node, Node):
+		return node
+	func = node.func
+	args = node.args
+	#Casts of client-side values
+	if func in ['String', 'Number', 'List', 'Dictionary'] and len(args) > 0 and not isinstance(args[0], Node):
+		if isinstance(args[0], dict):
+			return dict((k, evaluate(v)) for k, v in args[0].items())
+		if isinstance(args[0], list):
+			return [evaluate(v) for v in args[0]]
+		return args[0]
+	if func == 'first':
+		tables = collections.OrderedDict(fixtures['tables'])
+		for k, v in _defaultTables().items():
+			tables.setdefault(k, v)
+		properties = collections.OrderedDict()
+		for k, v in tables.items():
+			if any(k in s for s in strings):
+				properties = collections.OrderedDict(v)
+				break
+		#Apply any property selections made on the collection
+		parent = args[0]
+		while isinstance(parent, Node) and len(parent.args) > 0:
+			if parent.func == 'select' and len(parent.args) > 1 and isinstance(parent.args[1], (list, str)):
+				import re
+				selectors = parent.args[1] if isinstance(parent.args[1], list) else [parent.args[1]]
+				properties = collections.OrderedDict((k, v) for k, v in properties.items() if any(re.match('^' + s + '$', k) for s in selectors))
+				break
+			parent = parent.args[0]
+		return {'type': 'Feature', 'geometry': None, 'properties': properties}
+	if func == 'get' and len(args) == 2:
+		parent = evaluate(args[0])
+		if isinstance(parent, dict):
+			return parent.get('properties', parent).get(args[1])
+	if func == 'Algorithms.ObjectType':
+		value = evaluate(args[0])
+		return {str: 'String', bool: 'Boolean', int: 'Integer', float: 'Float', list: 'List', dict: 'Dictionary'}.get(type(value), 'Object')
+	if func == 'Algorithms.If':
+		return evaluate(args[1]) if evaluate(args[0]) else evaluate(args[2] if len(args) > 2 else None)
+	if func == 'equals' and len(args) == 2:
+		return evaluate(args[0]) == evaluate(args[1])
+	if func == 'propertyNames':
+		parent = evaluate(args[0])
+		if isinstance(parent, dict) and 'properties' in parent:
+			return list(parent['properties'].keys()) + ['system:index']
+		return []
+	if func in ['remove', 'removeAll']:
+		parent = evaluate(args[0])
+		toRemove = args[1] if func == 'removeAll' else [args[1]]
+		return [i for i in parent if i not in toRemove]
+	if func == 'aggregate_array':
+		#Collections built on the client from a list of features (e.g. export tiles) answer from those features
+		features = _literalFeatures(args[0])
+		if features != None:
+			return [f[args[1]] for f in features if args[1] in f]
+	if func == 'coordinates':
+		#Bounds of California in EPSG:5070
+		return [[[-2360000.0, 1240000.0], [-1630000.0, 1240000.0], [-1630000.0, 2460000.0], [-2360000.0, 2460000.0], [-2360000.0, 1240000.0]]]
+	if func in ['size', 'length', 'aggregate_count', 'aggregate_sum']:
+		return 0
+	if func in ['bandNames', 'aggregate_array', 'keys', 'distinct', 'toList']:
+		return []
+	if func in ['aggregate_histogram', 'toDictionary']:
+		return {}
+	if func == 'format':
+		return ''
+	return None
+
+#Function to get the properties of the features of a collection made from a client-side list of ee.Features
+def _literalFeatures(node):
+	while isinstance(node, Node) and node.func in ['filterBounds', 'filter', 'sort', 'limit', 'distinct']:
+		node = node.args[0]
+	if isinstance(node, Node) and node.func == 'FeatureCollection' and len(node.args) > 0 and isinstance(node.args[0], list):
+		return [f.args[1] if isinstance(f, Node) and len(f.args) > 1 and isinstance(f.args[1], dict) else {} for f in node.args[0]]
+	return None
+
+####################################################################################################
+#							Fake ee.data and ee.batch
+####################################################################################################
+def _callSite():
+	for frame in reversed(traceback.extract_stack()[:-2]):
+		if os.path.abspath(frame.filename) != os.path.abspath(__file__) and 'SAGE_Profiler' not in frame.filename:
+			return '{}:{}'.format(os.path.basename(frame.filename), frame.lineno)
+	return 'unknown'
+
+def _computeValue(obj):
+	stats = measureGraph(obj)
+	stats['callSite'] = _callSite()
+	stats['call'] = obj.func if isinstance(obj, Node) else type(obj).__name__
+	recorder['getInfo'].append(stats)
+	return evaluate(obj)
+
+def _dataCall(name, default):
+	def call(*args, **kwargs):
+		recorder['data'].append({'call': name, 'args': [str(a) for a in args], 'callSite': _callSite()})
+		return default(*args, **kwargs) if callable(default) else default
+	return call
+
+def _getAssetInfo(path, *args):
+	return fixtures['assets'].get(path, {'id': path, 'name': path, 'type': 'FOLDER', 'updateTime': '2022-01-01T00:00:00Z'})
+
+def _getList(params):
+	path = params['id']
+	ids = fixtures['assetLists'].get(path)
+	sage = _sage()
+	if ids == None and sage != None and path == sage.predTableDir:
+		ids = ['{}/{}_{}_{}'.format(path, sage.predTableNameStart, sage.runname, yr) for yr in range(sage.startApplyYear, sage.endApplyYear + 1)]
+	if ids == None and sage != None and path == sage.applyTableDir:
+		ids = ['{}/{}_{}'.format(path, sage.applyTableName, yr) for yr in range(sage.startApplyYear, sage.endApplyYear + 1)] + ['{}/{}'.format(path, sage.applyTableLongName)]
+	return [{'id': i, 'type': 'TABLE'} for i in (ids or [])]
+
+def _listAssets(params):
+	return {'assets': [dict(i, name = i['id'], updateTime = '2022-01-01T00:00:00Z') for i in _getList({'id': params.get('parent')})]}
+
+def _assetCall(name):
+	def call(*args, **kwargs):
+		recorder['assets'].append({'call': name, 'args': [str(a) for a in args], 'callSite': _callSite()})
+	return call
+
+#Export tasks record the expression graph they would send when started
+class Task(object):
+	def __init__(self, kind, obj, config):
+		self.kind = kind
+		self.obj = obj
+		self.config = config
+		self.id = 'FAKE_TASK_{}'.format(len(recorder['exports']))
+		self.error = None
+
+	def start(self):
+		stats = measureGraph(self.obj)
+		stats.update({'kind': self.kind, 'description': self.config.get('description'),
+			'destination': self.config.get('assetId', self.config.get('folder')), 'callSite': _callSite()})
+		recorder['exports'].append(stats)
+		errors = fixtures['taskErrors'].get(self.config.get('description'), [])
+		if len(errors) > 0:
+			self.error = errors.pop(0)
+
+	def status(self):
+		if self.error != None:
+			return {'state': 'FAILED', 'id': self.id, 'error_message': self.error}
+		return {'state': 'COMPLETED', 'id': self.id}
+
+def _exporter(kind, objKey):
+	def export(*args, **kwargs):
+		obj = args[0] if len(args) > 0 else kwargs.get(objKey)
+		config = dict(kwargs)
+		if len(args) > 1:
+			config['description'] = args[1]
+		return Task(kind, obj, config)
+	return export
+
+####################################################################################################
+#							Fake geeViz functions
+####################################################################################################
+class FakeLib(types.ModuleType):
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		func = lambda *args, **kwargs: Node('{}.{}'.format(self.__name__.split('.')[-1], name), args, kwargs)
+		setattr(self, name, func)
+		return func
+
+def _recordExport(kind, obj, description, destination):
+	Task(kind, obj, {'description': description, 'assetId': destination}).start()
+
+#geeViz.getImagesLib.joinCollections, written against the stand-in so nested joins show up in graph sizes
+def _joinCollections(c1, c2, maskAnyNullValues = True, joinProperty = 'system:time_start', joinPropertySecondary = None):
+	if joinPropertySecondary == None:
+		joinPropertySecondary = joinProperty
+	joined = ee.ImageCollection(ee.Join.inner().apply(c1, c2, ee.Filter.equals(joinProperty, None, joinPropertySecondary)))
+	joined = ee.ImageCollection(joined.map(lambda element: ee.Image.cat([element.get('primary'), element.get('secondary')])))
+	if maskAnyNullValues:
+		joined = joined.map(lambda img: img.mask(img.mask().reduce(ee.Reducer.min())))
+	return joined
+
+#Approximation of geeViz.changeDetectionLib.simpleLTFit (annual interpolation of a vertex stack)
+def _simpleLTFit(ltStack, startYear, endYear, indexName = 'bn', arrayMode = True, maxSegs = 6):
+	def fitYear(yr):
+		yrs = ltStack.select('yrs_.*')
+		fit = ltStack.select('fit_.*')
+		segment = yrs.lte(yr).And(yrs.gte(yr))
+		fitted = fit.multiply(segment).reduce(ee.Reducer.max())
+		out = ee.Image.cat([fitted, fitted.subtract(fit.reduce(ee.Reducer.min())), segment.reduce(ee.Reducer.sum()), fitted, fitted])
+		return out.rename(['{}_LT_{}'.format(indexName, b) for b in ['fitted', 'mag', 'dur', 'slope', 'diff']])\
+			.set('system:time_start', ee.Date.fromYMD(yr, 6, 1).millis())
+	return ee.ImageCollection(ee.List.sequence(startYear, endYear).map(fitYear))
+
+def _prepTimeSeriesForLandTrendr(ts, indexName, run_params, *args, **kwargs):
+	run_params = dict(run_params)
+	run_params['timeSeries'] = Node('changeDetectionLib.prepTimeSeriesForLandTrendr', (ts, indexName))
+	return {'run_params': run_params, 'countMask': Node('changeDetectionLib.countMask', (ts,))}
+
+def _exportToAssetWrapper(imageForExport, assetName, assetPath, pyramidingPolicyObject = None, roi = None, scale = None, crs = None, transform = None, *args, **kwargs):
+	_recordExport('image.toAsset', imageForExport, assetName, assetPath)
+
+def _exportCollection(exportPathRoot, outputName, studyArea, crs, transform, scale, collection, startYear, endYear, *args, **kwargs):
+	for yr in range(startYear, endYear + 1):
+		image = collection.filter(ee.Filter.calendarRange(yr, yr, 'year')).first()
+		_recordExport('image.toAsset', image, '{}_{}'.format(outputName, yr), '{}/{}_{}'.format(exportPathRoot, outputName, yr))
+
+def _getLandsatWrapper(**kwargs):
+	composites = Node('getImagesLib.getLandsatWrapper', (), kwargs)
+	if kwargs.get('exportComposites'):
+		for yr in range(kwargs['startYear'], kwargs['endYear'] + 1):
+			name = '{}_{}_{}'.format(kwargs.get('outputName'), yr, yr)
+			_recordExport('image.toAsset', composites.filter(ee.Filter.calendarRange(yr, yr, 'year')).first(), name, kwargs.get('exportPathRoot') + '/' + name)
+	return {'processedScenes': Node('processedScenes', (composites,)), 'processedComposites': composites}
+
+class _Map(object):
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		return lambda *args, **kwargs: None
+
+####################################################################################################
+#							Install
+####################################################################################################
+ee = None
+
+#Function to install the stand-in ee, geeViz, and (if missing) google.oauth2 modules into sys.modules
+def install():
+	global ee
+	if ee != None:
+		return ee
+	ee = types.ModuleType('ee')
+	ee.__file__ = os.path.abspath(__file__)
+	ee.ComputedObject = Node
+	ee.EEException = type('EEException', (Exception,), {})
+	for name in ['Image', 'ImageCollection', 'Feature', 'FeatureCollection', 'Filter', 'Reducer', 'Join', 'List', 'Dictionary',
+		'Number', 'String', 'Array', 'Date', 'DateRange', 'Geometry', 'Algorithms', 'Classifier', 'Kernel', 'Terrain', 'Projection', 'ErrorMargin']:
+		setattr(ee, name, Namespace(name))
+	ee.Initialize = lambda *args, **kwargs: None
+	ee.Authenticate = lambda *args, **kwargs: None
+
+	ee.serializer = types.ModuleType('ee.serializer')
+	ee.serializer.toJSON = lambda obj, *args, **kwargs: serialize(obj)
+
+	tokenDir = os.path.join(tempfile.gettempdir(), 'sage-fake-earthengine')
+	ee.oauth = types.ModuleType('ee.oauth')
+	ee.oauth.get_credentials_path = lambda: os.path.join(tokenDir, 'credentials')
+	ee.oauth.TOKEN_URI = ee.oauth.CLIENT_ID = ee.oauth.CLIENT_SECRET = ''
+	ee.oauth.SCOPES = []
+
+	ee.data = types.ModuleType('ee.data')
+	ee.data.ASSET_TYPE_FOLDER = 'FOLDER'
+	ee.data.ASSET_TYPE_IMAGE_COLL = 'IMAGE_COLLECTION'
+	ee.data.computeValue = _computeValue
+	ee.data.getInfo = _dataCall('getInfo', _getAssetInfo)
+	ee.data.getAsset = _dataCall('getAsset', _getAssetInfo)
+	ee.data.getList = _dataCall('getList', _getList)
+	ee.data.listAssets = _dataCall('listAssets', _listAssets)
+	ee.data.getTaskList = _dataCall('getTaskList', lambda *args: [])
+	ee.data.getTaskStatus = _dataCall('getTaskStatus', lambda ids: [{'id': i, 'state': 'COMPLETED'} for i in (ids if isinstance(ids, list) else [ids])])
+	for name in ['createAsset', 'deleteAsset', 'copyAsset', 'renameAsset', 'setAssetAcl', 'setAssetProperties', 'updateAsset']:
+		setattr(ee.data, name, _assetCall(name))
+
+	ee.batch = types.ModuleType('ee.batch')
+	ee.batch.Export = types.SimpleNamespace(\
+		table = types.SimpleNamespace(toAsset = _exporter('table.toAsset', 'collection'), toDrive = _exporter('table.toDrive', 'collection')),
+		image = types.SimpleNamespace(toAsset = _exporter('image.toAsset', 'image'), toDrive = _exporter('image.toDrive', 'image')))
+	ee.batch.Task = Task
+	for name in ['serializer', 'oauth', 'data', 'batch']:
+		sys.modules['ee.' + name] = getattr(ee, name)
+	sys.modules['ee'] = ee
+
+	#geeViz
+	geeViz = types.ModuleType('geeViz')
+	geeViz.__path__ = []
+	getImagesLib = FakeLib('geeViz.getImagesLib')
+	getImagesLib.changeDirDict = collections.defaultdict(lambda: 1)
+	getImagesLib.formatArgs = lambda args: dict(args)
+	getImagesLib.joinCollections = _joinCollections
+	getImagesLib.exportToAssetWrapper = _exportToAssetWrapper
+	getImagesLib.exportCollection = _exportCollection
+	getImagesLib.getLandsatWrapper = _getLandsatWrapper
+	getImagesLib.getPrecomputedCloudScoreOffsets = lambda *args: {'landsat': Node('cloudScoreOffset'), 'sentinel2': Node('cloudScoreOffset')}
+	getImagesLib.getPrecomputedTDOMStats = lambda *args: {'landsat': {'mean': Node('tdomMean'), 'stdDev': Node('tdomStdDev')}}
+	changeDetectionLib = FakeLib('geeViz.changeDetectionLib')
+	changeDetectionLib.simpleLTFit = _simpleLTFit
+	changeDetectionLib.prepTimeSeriesForLandTrendr = _prepTimeSeriesForLandTrendr
+	taskManagerLib = FakeLib('geeViz.taskManagerLib')
+	taskManagerLib.trackTasks = lambda *args, **kwargs: None
+	assetManagerLib = FakeLib('geeViz.assetManagerLib')
+	assetManagerLib.updateACL = _assetCall('updateACL')
+	geeView = types.ModuleType('geeViz.geeView')
+	geeView.Map = _Map()
+	geeView.ee, geeView.os, geeView.json, geeView.sys, geeView.time, geeView.glob = ee, os, json, sys, time, glob
+	geeView.__all__ = ['Map', 'ee', 'os', 'json', 'sys', 'time', 'glob']
+	for name, module in [('getImagesLib', getImagesLib), ('changeDetectionLib', changeDetectionLib), ('taskManagerLib', taskManagerLib),
+		('assetManagerLib', assetManagerLib), ('geeView', geeView)]:
+		setattr(geeViz, name, module)
+		sys.modules['geeViz.' + name] = module
+	sys.modules['geeViz'] = geeViz
+
+	#google.oauth2 is only used to initialize from stored tokens
+	try:
+		import google.oauth2.credentials
+	except ImportError:
+		google = types.ModuleType('google')
+		google.__path__ = []
+		oauth2 = types.ModuleType('google.oauth2')
+		oauth2.__path__ = []
+		credentials = types.ModuleType('google.oauth2.credentials')
+		credentials.Credentials = lambda *args, **kwargs: None
+		google.oauth2, oauth2.credentials = oauth2, credentials
+		sys.modules.update({'google': google, 'google.oauth2': oauth2, 'google.oauth2.credentials': credentials})
+	return ee
+
+####################################################################################################
+#							Benchmark runner
+####################################################################################################
+#Function to run one SAGE stage script against the stand-in and summarize what it sent to GEE
+#Local output folders in SAGE_Initialize are redirected to a temporary folder
+def runStage(stage, overrides = {}):
+	install()
+	import SAGE_Profiler
+	scripts = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '{}_*.py'.format(stage))))
+	if len(scripts) == 0:
+		raise Exception('No script found for stage {}'.format(stage))
+	resetRecorder()
+	del SAGE_Profiler.records[:]
+	sys.modules.pop('SAGE_Initialize', None)
+	start = time.time()
+	error = None
+	try:
+		import SAGE_Initialize as sage
+		for k, v in overrides.items():
+			setattr(sage, k, v)
+		runpy.run_path(scripts[0], run_name = '__main__')
+	except Exception as e:
+		error = '{}: {}'.format(type(e).__name__, e)
+		traceback.print_exc()
+	exports = recorder['exports']
+	out = {\
+		'stage': os.path.basename(scripts[0]),
+		'seconds': time.time() - start,
+		'error': error,
+		'getInfoCalls': len(recorder['getInfo']),
+		'dataCalls': len(recorder['data']),
+		'assetWrites': len(recorder['assets']),
+		'exports': len(exports),
+		'exportUniqueNodes': sum(e['uniqueNodes'] for e in exports),
+		'exportTreeNodes': sum(e['treeNodes'] for e in exports),
+		'maxExportDepth': max([e['depth'] for e in exports] + [0]),
+		'exportBytes': sum(e['bytes'] for e in exports),
+		'serializeSeconds': sum(e['serializeSeconds'] for e in exports) + sum(g['serializeSeconds'] for g in recorder['getInfo']),
+		'roundTrips': SAGE_Profiler.summarize(),
+		'exportDetails': exports}
+	return out
+
+def printBenchmark(results):
+	print()
+	print('#'*100)
+	print('Offline SAGE benchmark (stand-in ee backend)')
+	print('#'*100)
+	print('{:<30} {:>8} {:>8} {:>7} {:>8} {:>10} {:>12} {:>6} {:>12} {:>8}'.format(\
+		'stage','wall_s','getInfo','ee.data','exports','uniq_nodes','tree_nodes','depth','bytes','ser_s'))
+	for r in results:
+		print('{:<30} {:>8.2f} {:>8} {:>7} {:>8} {:>10} {:>12} {:>6} {:>12} {:>8.3f}{}'.format(\
+			r['stage'], r['seconds'], r['getInfoCalls'], r['dataCalls'], r['exports'], r['exportUniqueNodes'],
+			r['exportTreeNodes'], r['maxExportDepth'], r['exportBytes'], r['serializeSeconds'],
+			'  FAILED: ' + r['error'] if r['error'] else ''))
+	print()
+	for r in results:
+		if len(r['roundTrips']) > 0:
+			print('Round trips in', r['stage'])
+			for s in r['roundTrips']:
+				print('  {:>4}x {} [{}]'.format(s['count'], s['callSite'], s['call']))
+	print()
+
+####################################################################################################
+#							Zone image check
+####################################################################################################
+#Function to check locally that apply tables computed from the GDE zone image (sage.useGDEZoneImage) match the polygon means
+#Random GDE rectangles (some overlapping, and one smaller than a pixel) are laid over a smooth multi-band image with masked areas.
+#Polygon means (reduceRegions) weight each unmasked pixel by the fraction of it the GDE covers.
+#The zone means follow reduceZones: the zone image has the first GDE ID at each pixel center, the sums of the values and masks of each band
+#are grouped by ID, each band is averaged over its own unmasked pixels, and GDEs missing from the zone image use the polygon means
+#The band 'b1' is masked over the whole first GDE and 'b2' over part of the second, so masked bands must not drop the other bands
+#Returns the ids of GDEs that are missing or whose bands differ from the polygon means (a mean of one table and null in the other)
+#and the largest absolute difference of a mean, which comes from edge pixels and pixels shared by overlapping GDEs
+def checkZoneMeans(nGDEs = 40, size = 200, nBands = 3, overlap = True, seed = 0, gdeIdName = 'POLYGON_ID'):
+	import numpy as np
+	rng = np.random.RandomState(seed)
+	bandNames = ['b{}'.format(i) for i in range(nBands)]
+
+	#The image has an extra column of pixels on the right for the GDE smaller than a pixel
+	width = size + 2
+	ys, xs = np.mgrid[0:size, 0:width] + 0.5
+	image = np.array([np.sin(xs / size * (3 + b)) + np.cos(ys / size * (2 + b)) + rng.normal(0, 0.05, xs.shape) for b in range(nBands)])
+	valid = np.ones(image.shape, dtype = bool)
+
+	#GDEs as rectangles within the cells of a grid (spilling into the next cell if overlap is True)
+	cells = int(np.ceil(np.sqrt(nGDEs)))
+	cellSize = size / float(cells)
+	rectangles = collections.OrderedDict()
+	for i in range(nGDEs):
+		row, col = divmod(i, cells)
+		x0, y0 = col * cellSize + rng.uniform(0, cellSize / 3), row * cellSize + rng.uniform(0, cellSize / 3)
+		x1, y1 = (col + 1) * cellSize - rng.uniform(0, cellSize / 3), (row + 1) * cellSize - rng.uniform(0, cellSize / 3)
+		if overlap and i % 3 == 0:
+			x1 += cellSize / 2
+		rectangles[1000 + 7 * i] = [x0, y0, x1, y1]
+	rectangles[1000 + 7 * nGDEs] = [size + 0.55, 0.55, size + 0.95, 0.95]
+
+	#Mask b1 over the whole first GDE and b2 over the left half of the second
+	gdeIds = list(rectangles.keys())
+	x0, y0, x1, y1 = rectangles[gdeIds[0]]
+	valid[1, int(y0):int(np.ceil(y1)), int(x0):int(np.ceil(x1))] = False
+	x0, y0, x1, y1 = rectangles[gdeIds[1]]
+	valid[2 % nBands, :, int(x0):int((x0 + x1) / 2)] = False
+
+	#Fraction of each pixel covered by each GDE and whether the GDE contains its center
+	gdes = collections.OrderedDict()
+	for gdeId, (x0, y0, x1, y1) in rectangles.items():
+		coverX = np.clip(np.minimum(x1, np.arange(width) + 1) - np.maximum(x0, np.arange(width)), 0, 1)
+		coverY = np.clip(np.minimum(y1, np.arange(size) + 1) - np.maximum(y0, np.arange(size)), 0, 1)
+		gdes[gdeId] = {\
+			'cover': np.outer(coverY, coverX),
+			'inside': (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1),
+			'properties': {gdeIdName: gdeId, 'Macrogroup': gdeId % 4}}
+
+	#Polygon means (image.reduceRegions(gdes, ee.Reducer.mean())), null where a band is masked over the whole GDE
+	def polygonMeans(gde):
+		means = {}
+		for b, bandName in enumerate(bandNames):
+			weight = gde['cover'] * valid[b]
+			means[bandName] = (weight * image[b]).sum() / weight.sum() if weight.sum() > 0 else None
+		return dict(gde['properties'], **means)
+	polygonTable = dict((gdeId, polygonMeans(gde)) for gdeId, gde in gdes.items())
+
+	#Zone image (reduceToImage with ee.Reducer.first(), 0 is masked)
+	zone = np.zeros((size, width), dtype = np.int64)
+	for gdeId, gde in gdes.items():
+		zone[gde['inside'] & (zone == 0)] = gdeId
+
+	#Grouped sums of the masked values and the masks (ee.Reducer.sum().repeat(2 * nBands).group(2 * nBands, gdeIdName))
+	inZone = zone.ravel() > 0
+	ids, groupIndex = np.unique(zone.ravel()[inZone], return_inverse = True)
+	sums = [np.bincount(groupIndex, np.where(valid[b], image[b], 0).ravel()[inZone], len(ids)) for b in range(nBands)]
+	weights = [np.bincount(groupIndex, valid[b].ravel()[inZone].astype(float), len(ids)) for b in range(nBands)]
+	groups = [{gdeIdName: int(gdeId), 'sum': [s[i] for s in sums] + [w[i] for w in weights]} for i, gdeId in enumerate(ids)]
+
+	#Groups to features of means joined to the GDE properties by ID, then the polygon means of GDEs missing from the zone image
+	zoneTable = {}
+	for group in groups:
+		means = dict((bandName, group['sum'][b] / group['sum'][b + nBands] if group['sum'][b + nBands] > 0 else None) for b, bandName in enumerate(bandNames))
+		means[gdeIdName] = group[gdeIdName]
+		zoneTable[group[gdeIdName]] = dict(gdes[group[gdeIdName]]['properties'], **means)
+	for gdeId in gdes.keys():
+		if gdeId not in zoneTable:
+			zoneTable[gdeId] = polygonMeans(gdes[gdeId])
+
+	#Compare the tables
+	different = sorted(set(polygonTable.keys()) ^ set(zoneTable.keys()))
+	maxDifference = 0.0
+	for gdeId in set(polygonTable.keys()) & set(zoneTable.keys()):
+		if [polygonTable[gdeId][b] is None for b in bandNames] != [zoneTable[gdeId][b] is None for b in bandNames]:
+			different.append(gdeId)
+			continue
+		differences = [abs(polygonTable[gdeId][b] - zoneTable[gdeId][b]) for b in bandNames if polygonTable[gdeId][b] is not None]
+		maxDifference = max([maxDifference] + differences)
+	print('Zone image check: {} GDEs, {} missing or with different masked bands, largest difference from the area-weighted polygon means {:.2e}'.format(len(gdes), len(different), maxDifference))
+	return sorted(different), maxDifference
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Run SAGE stage scripts offline against a stand-in ee backend')
+	parser.add_argument('stages', nargs = '*', default = ['3', '4', '5', '6', '7'], help = 'Stage numbers to run (default: 3 4 5 6 7)')
+	parser.add_argument('--fixtures', help = 'Json file of fixture answers for getInfo and ee.data calls')
+	parser.add_argument('--json', help = 'Write full results (including per-export graph sizes) to this json file')
+	parser.add_argument('--cache', action = 'store_true', help = 'Use the local getInfo cache (off by default so fixture changes always apply)')
+	parser.add_argument('--check-zones', action = 'store_true', help = 'Check that zonal means from the GDE zone image match the polygon means (requires numpy)')
+	args = parser.parse_args()
+	if args.check_zones:
+		different, maxDifference = checkZoneMeans()
+		if len(different) > 0:
+			sys.exit('Zone image means differ from the polygon means for GDEs: {}'.format(different))
+	if not args.cache:
+		os.environ['SAGE_GETINFO_CACHE'] = '0'
+
+	install()
+	import SAGE_Profiler
+	SAGE_Profiler.enable(report = False)
+	if args.fixtures:
+		loadFixtures(args.fixtures)
+	outDir = tempfile.mkdtemp(prefix = 'sage-bench-')
+	overrides = {'outputLocalRFModelInfoDir': outDir, 'table_dir': outDir, 'summary_table_dir': outDir}
+
+	results = [runStage(stage, overrides) for stage in args.stages]
+	printBenchmark(results)
+	if args.json:
+		o = open(args.json, 'w')
+		o.write(json.dumps(results, indent = 1, default = str))
+		o.close()
@@ -0,0 +1,289 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to store a fitted random forest as flat arrays and predict large tables with it
+#All nodes of all trees are kept in contiguous numpy arrays (feature, threshold, left, right, value),
+#and a batch of rows is sent down every tree at once, one level at a time, with vectorized gathers
+#
+#Forests can be made from:
+#	The trees of rfModel.explain() from 6_ModelFitApply.py (saved in the dgwRFModelInfo json files), in the same
+#	text format ee.Classifier.decisionTreeEnsemble reads
+#	A scikit-learn forest from SAGE_LocalRF.py
+#and saved to a folder of .npy files that can be memory-mapped instead of read into memory
+####################################################################################################
+#Module imports
+import argparse, json, os, re, sys
+import numpy as np
+
+####################################################################################################
+#Arrays that make up a forest
+arrayNames = ['feature', 'threshold', 'left', 'right', 'value', 'missingLeft', 'roots']
+
+#Number of rows to predict at a time (memory use grows with chunkSize x number of trees)
+defaultChunkSize = 50000
+
+#Line of a tree in the explain() text format, e.g. "  2) NDVI_LT_fitted<=0.45 40 12.3 4.5" (terminal nodes end with *)
+treeLinePattern = re.compile(r'^\s*(\d+)\)\s+(\S+)\s+(\d+)\s+(\S+)\s+(\S+)(\s+\*)?\s*$')
+splitPattern = re.compile(r'^(.+?)(<=|>)(.+)$')
+
+####################################################################################################
+#							Functions
+####################################################################################################
+class Forest:
+	#Nodes of all trees are numbered together, breadth first within each tree, so the right child of a node is always left + 1
+	#Rows go left if value <= threshold (or if the value is missing and missingLeft is set), and right otherwise.
+	#Leaves have feature -1, an infinite threshold, missingLeft set, and left and right pointing to themselves,
+	#so rows that reach a leaf stay there while the rest of the batch moves down.
+	def __init__(self, predictorFields, feature, threshold, left, right, value, roots, missingLeft):
+		self.predictorFields = list(predictorFields)
+		self.feature = feature
+		self.threshold = threshold
+		self.left = left
+		self.right = right
+		self.value = value
+		self.roots = roots
+		self.missingLeft = missingLeft
+
+	def __repr__(self):
+		return 'Forest({} trees, {} nodes, {} predictors)'.format(len(self.roots), len(self.feature), len(self.predictorFields))
+
+	#Function to get the leaf of each row in each tree (rows x trees)
+	#Values are compared as 32 bit floats, as in GEE and scikit-learn
+	#Rows are sent down one tree at a time, levelsPerCheck levels between removing the rows that have reached a leaf
+	def apply(self, X, chunkSize = defaultChunkSize, levelsPerCheck = 4):
+		X = np.asarray(X, dtype = np.float32)
+		out = np.empty((len(X), len(self.roots)), dtype = np.int64)
+		for start in range(0, len(X), chunkSize):
+			x = X[start:start + chunkSize]
+			nRows = len(x)
+			#Values are gathered from a feature-major copy (feature * nRows + row)
+			#Leaves gather feature -1 (the last feature), which their infinite threshold ignores
+			values = np.ascontiguousarray(x.T).ravel()
+			for t, root in enumerate(self.roots):
+				nodes = np.full(nRows, root, dtype = np.int64)
+				active = np.arange(nRows)
+				n = nodes.copy()
+				while len(active) > 0:
+					for level in range(levelsPerCheck):
+						v = values[self.feature[n] * nRows + active]
+						goRight = ~((v <= self.threshold[n]) | (np.isnan(v) & self.missingLeft[n]))
+						n = self.left[n] + goRight
+					nodes[active] = n
+					keep = self.feature[n] >= 0
+					active = active[keep]
+					n = n[keep]
+				out[start:start + nRows, t] = nodes
+		return out
+
+	#Function to predict the mean of the trees for each row
+	def predict(self, X, chunkSize = defaultChunkSize):
+		X = np.asarray(X, dtype = np.float32)
+		out = np.empty(len(X))
+		for start in range(0, len(X), chunkSize):
+			out[start:start + chunkSize] = self.value[self.apply(X[start:start + chunkSize], chunkSize)].mean(axis = 1)
+		return out
+
+	#Function to save the forest to a folder of .npy files (and the predictor names to a json file)
+	def save(self, folder):
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+		for name in arrayNames:
+			np.save(os.path.join(folder, name + '.npy'), np.asarray(getattr(self, name)))
+		o = open(os.path.join(folder, 'forest.json'), 'w')
+		o.write(json.dumps({'predictorFields': self.predictorFields}))
+		o.close()
+
+	#Function to write the trees in the explain() text format, to use the forest in GEE with ee.Classifier.decisionTreeEnsemble
+	def toEETrees(self):
+		trees = []
+		for root in self.roots:
+			lines = ['n= 0', 'node), split, n, deviance, yval', '      * denotes terminal node', '']
+			stack = [(int(root), 1, 'root', 0)]
+			while len(stack) > 0:
+				node, nodeId, split, depth = stack.pop()
+				leaf = self.feature[node] < 0
+				lines.append('{}{}) {} 0 0 {}{}'.format('  ' * depth, nodeId, split, repr(float(self.value[node])), ' *' if leaf else ''))
+				if not leaf:
+					name = self.predictorFields[self.feature[node]]
+					threshold = repr(float(self.threshold[node]))
+					stack.append((int(self.right[node]), nodeId * 2 + 1, '{}>{}'.format(name, threshold), depth + 1))
+					stack.append((int(self.left[node]), nodeId * 2, '{}<={}'.format(name, threshold), depth + 1))
+			trees.append('\n'.join(lines) + '\n')
+		return trees
+
+#Function to read a forest saved with Forest.save
+#If mmap is True, the arrays are memory-mapped so only the nodes that are used are read from disk
+def load(folder, mmap = True):
+	info = json.load(open(os.path.join(folder, 'forest.json')))
+	arrays = dict((name, np.load(os.path.join(folder, name + '.npy'), mmap_mode = 'r' if mmap else None)) for name in arrayNames)
+	return Forest(info['predictorFields'], arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+		arrays['value'], arrays['roots'], arrays['missingLeft'])
+
+#Function to build a forest from lists of nodes ([feature, threshold, left, right, value, missingLeft] per tree,
+#with indices within the tree and children of -1 for leaves), laid out breadth first
+def _fromTrees(predictorFields, trees):
+	columns = [[] for name in arrayNames]
+	feature, threshold, left, right, value, missingLeft, roots = columns
+	for tree in trees:
+		treeFeature, treeThreshold, treeLeft, treeRight, treeValue, treeMissingLeft = tree
+		base = len(feature)
+		roots.append(base)
+		order = [0]
+		position = {0: 0}
+		for node in order:
+			if treeLeft[node] >= 0:
+				for child in [int(treeLeft[node]), int(treeRight[node])]:
+					position[child] = len(order)
+					order.append(child)
+		for node in order:
+			if treeLeft[node] >= 0:
+				feature.append(treeFeature[node])
+				threshold.append(treeThreshold[node])
+				left.append(base + position[int(treeLeft[node])])
+				missingLeft.append(treeMissingLeft[node])
+			else:
+				feature.append(-1)
+				threshold.append(np.inf)
+				left.append(base + position[node])
+				missingLeft.append(True)
+			right.append(left[-1] + int(treeLeft[node] >= 0))
+			value.append(treeValue[node])
+	return Forest(predictorFields, np.array(feature, dtype = np.int64), np.array(threshold, dtype = np.float64),
+		np.array(left, dtype = np.int64), np.array(right, dtype = np.int64), np.array(value, dtype = np.float64),
+		np.array(roots, dtype = np.int64), np.array(missingLeft, dtype = bool))
+
+#Function to parse one tree in the explain() text format
+#Node n has children 2n (<=) and 2n + 1 (>)
+def parseEETree(tree, predictorIndex):
+	nodes = {}
+	for line in tree.split('\n'):
+		m = treeLinePattern.match(line)
+		if m == None:
+			continue
+		nodeId, split, value = int(m.group(1)), m.group(2), float(m.group(5))
+		nodes[nodeId] = {'split': split, 'value': value}
+	ids = sorted(nodes.keys())
+	index = dict((nodeId, i) for i, nodeId in enumerate(ids))
+	feature, threshold, left, right, value = [], [], [], [], []
+	for nodeId in ids:
+		leftId, rightId = nodeId * 2, nodeId * 2 + 1
+		value.append(nodes[nodeId]['value'])
+		if leftId in nodes and rightId in nodes:
+			name, sign, t = splitPattern.match(nodes[leftId]['split']).groups()
+			if name not in predictorIndex:
+				predictorIndex[name] = len(predictorIndex)
+			feature.append(predictorIndex[name])
+			threshold.append(float(t))
+			left.append(index[leftId])
+			right.append(index[rightId])
+		else:
+			feature.append(-1)
+			threshold.append(np.nan)
+			left.append(-1)
+			right.append(-1)
+	return [feature, threshold, left, right, value, [False] * len(ids)]
+
+#Function to make a forest from the trees of rfModel.explain() (e.g. the 'trees' of a dgwRFModelInfo json file)
+#predictorFields gives the column order of the rows to predict (default: in the order predictors first appear in the trees)
+def fromEETrees(trees, predictorFields = None):
+	predictorIndex = dict((p, i) for i, p in enumerate(predictorFields or []))
+	parsed = [parseEETree(tree, predictorIndex) for tree in trees]
+	if predictorFields == None:
+		predictorFields = sorted(predictorIndex.keys(), key = lambda p: predictorIndex[p])
+	elif len(predictorIndex) > len(predictorFields):
+		raise Exception('Trees use predictors that are not in predictorFields: {}'.format(sorted(set(predictorIndex) - set(predictorFields))))
+	return _fromTrees(predictorFields, parsed)
+
+#Function to make a forest from a fitted scikit-learn forest (e.g. from SAGE_LocalRF.fitForest)
+def fromSklearn(model, predictorFields = None):
+	if predictorFields == None:
+		predictorFields = model.predictorFields
+	trees = []
+	for estimator in model.estimators_:
+		t = estimator.tree_
+		missingLeft = getattr(t, 'missing_go_to_left', np.zeros(t.node_count, dtype = bool))
+		trees.append([t.feature, t.threshold, t.children_left, t.children_right, t.value[:, 0, 0], np.asarray(missingLeft, dtype = bool)])
+	return _fromTrees(predictorFields, trees)
+
+#Function to check that forests imported from scikit-learn (and written back out as explain() trees) predict the same as the scikit-learn model
+#A small forest is fit to random rows with some missing values and every version predicts new random rows (requires scikit-learn)
+#Returns the largest absolute difference from the scikit-learn predictions
+def checkSklearn(nRows = 2000, nPredictors = 6, nTrees = 20, seed = 0):
+	from sklearn.ensemble import RandomForestRegressor
+	rng = np.random.RandomState(seed)
+	predictorFields = ['p{}'.format(i) for i in range(nPredictors)]
+	def getRows():
+		X = rng.normal(size = (nRows, nPredictors)).astype(np.float32)
+		X[rng.uniform(size = X.shape) < 0.05] = np.nan
+		return X
+	X = getRows()
+	y = 2 * np.nan_to_num(X[:, 0]) + np.sin(np.nan_to_num(X[:, 1])) + rng.normal(0, 0.1, nRows)
+	model = RandomForestRegressor(n_estimators = nTrees, random_state = seed).fit(X, y)
+	model.predictorFields = predictorFields
+
+	X = getRows()
+	expected = model.predict(X)
+	forest = fromSklearn(model)
+	differences = {'sklearn': np.abs(forest.predict(X) - expected).max()}
+	#explain() trees have no missing value branches, so they are checked on complete rows
+	complete = ~np.isnan(X).any(axis = 1)
+	eeForest = fromEETrees(forest.toEETrees(), predictorFields)
+	differences['explain()'] = np.abs(eeForest.predict(X[complete]) - expected[complete]).max()
+	for name, difference in differences.items():
+		print('Forest imported from {}: largest difference from the scikit-learn predictions {:.2e}'.format(name, difference))
+	return max(differences.values())
+
+####################################################################################################
+#Compile the trees of a model info json file from 6_ModelFitApply.py and predict a table from the command line, e.g.
+#python SAGE_Forest.py dgwRFModelInfo-sage-test.json --save sage-test-forest --predict "Apply_Table_*.csv" --output Predictions.csv
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Compile the trees of a GEE random forest to arrays and predict tables with them')
+	parser.add_argument('model', nargs = '?', help = 'Model info json with the explain() trees, or a folder saved with --save')
+	parser.add_argument('--save', help = 'Folder to save the compiled forest to')
+	parser.add_argument('--predict', nargs = '*', help = 'csv or parquet tables (glob patterns are expanded) to predict')
+	parser.add_argument('--output', help = 'Output csv or parquet table of predictions')
+	parser.add_argument('--predictionField', default = 'modeled_DGW', help = 'Field to write predictions to')
+	parser.add_argument('--check-sklearn', action = 'store_true', help = 'Check that forests imported from scikit-learn predict the same as scikit-learn (requires scikit-learn)')
+	args = parser.parse_args()
+	if args.check_sklearn:
+		if checkSklearn() > 1e-9:
+			sys.exit('Forests imported from scikit-learn do not predict the same as scikit-learn')
+		if args.model == None:
+			sys.exit(0)
+
+	if os.path.isdir(args.model):
+		forest = load(args.model)
+	else:
+		forest = fromEETrees(json.load(open(args.model))['trees'])
+	print(forest)
+	if args.save:
+		forest.save(args.save)
+		print('Saved forest to:', args.save)
+	if args.predict:
+		from SAGE_LocalTables import readTables, writeTable
+		table = readTables(args.predict).dropna(subset = forest.predictorFields)
+		table[args.predictionField] = forest.predict(table[forest.predictorFields].values)
+		writeTable(table, args.output)
+		print('Wrote {} predictions to {}'.format(len(table), args.output))
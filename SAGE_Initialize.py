@@ -26,9 +26,10 @@ SOFTWARE.
 #Library containing globals for entire SAGE monitoring processing framework
 ####################################################################################################
 #Module imports
-import threading, time, glob, json, pdb, ee, os
-from datetime import datetime, timedelta
+import threading, time, glob, json, math, pdb, re, ee, os, hashlib
+from datetime import datetime, timedelta, timezone
 from google.oauth2.credentials import Credentials
+import SAGE_Profiler, SAGE_Cache
 ee.Initialize()
 
 ####################################################################################################
@@ -71,6 +72,10 @@ endTrainingYear = 2021 # Last year of training data
 startApplyYear = 1985 # First year to predict depth to groundwater (must have Landsat available, so minimum year = 1985)
 endApplyYear = 2021 # Last year to predict depth to groundwater (latest full summer season)
 
+# Maximum number of export tasks that SAGE will keep ready or running at once when submitting many small (e.g. tiled) exports.
+# New exports wait until there is room in the queue.
+maxConcurrentExports = 20
+
 
 #-------------------------------------------------
 #				Global: Paths and Naming
@@ -115,10 +120,47 @@ outputPredDriveDir = 'RF-Pred-'+runname
 # Local Folder where to save Model Information
 outputLocalRFModelInfoDir = '/Users/leahcampbell/home/contour/tnc/gdepulse/sage_methods'
 
+# Name of the json file (in outputLocalRFModelInfoDir) of the integer codes given to string predictors (e.g. Macrogroup) by 4_ApplyTableExporter.py
+# Codes are kept across runs so a value always gets the same code, and are used to label the downloaded prediction tables
+predictorCodebookName = 'predictorCodebook.json'
+
+# Option to keep trained models in a local registry and reuse them in 6_ModelFitApply.py
+# Models are keyed by the version of the training table, the predictor fields, and randomForestParameters,
+# so a model run is only trained (and explained) again when one of those changes
+useModelRegistry = True
+modelRegistryDir = None # Default (None) is a Model-Registry folder in outputLocalRFModelInfoDir
+
 
 #-------------------------------------------------
 #				Predictor Layer Options
 #-------------------------------------------------
+#--------------------Incremental Updates (1_GetLandsatWrapper.py and 2_GetClimateWrapper.py)------------------------
+# Option to only export the years that are not already in compositeCollection and daymetCollection (e.g. when a new summer
+# becomes available), instead of re-exporting every year from landsatStartYear to landsatEndYear.
+# Exported assets keep the same names and metadata, so 3_LandtrendrWrapper.py picks them up as usual.
+incrementalUpdate = False
+
+# Years to export again even if they already exist (e.g. after a change in the source data). Their existing assets are deleted first.
+# Use the Landsat/LandTrendr year (the Daymet water year ending in that year is also re-exported).
+invalidatedYears = []
+
+#--------------------GDE Footprint (1_GetLandsatWrapper.py, 2_GetClimateWrapper.py, and 3_LandtrendrWrapper.py)------------------------
+# Only pixels under the apply GDEs are ever summarized (4_ApplyTableExporter.py), so there is the option to mask every raster export
+# to a buffered footprint of the GDEs instead of exporting wall-to-wall over the study area.
+# Landsat and Daymet composites are then exported in tiles and only the tiles that intersect a GDE are exported.
+# LandTrendr is only run over pixels within the footprint.
+useGDEFootprint = False
+
+# Distance (m) to buffer the GDEs by when building the footprint. Should be at least a couple pixels so every pixel a GDE touches is kept.
+gdeFootprintBuffer = 90
+
+# Where to save the footprint. It is built and exported once (the first time it is needed) and read from here afterwards.
+# Delete this asset if the apply GDEs, minGDESize, or gdeFootprintBuffer change.
+gdeFootprintAsset = rasterDataRoot + '/GDE-Footprint'
+
+# Tile size (pixels) to use for Landsat and Daymet exports when using the footprint (landsatExportTileSize is used for Landsat if it is set)
+gdeFootprintTileSize = 1024
+
 #--------------------Landsat Composites (1_GetLandsatWrapper.py)------------------------
 
 # Update the startJulian and endJulian variables to indicate your seasonal 
@@ -140,6 +182,11 @@ landsatEndYear = max(endApplyYear, endTrainingYear)
 exportLandsat = True # Export Landsat composites to asset.
 viewLandsat = False # Can visualize Landsat composites in geeView()
 
+# Option to split the study area into square tiles (aligned to the transform above) and export each year x tile as its own task.
+# Smaller exports run faster and a failed tile can be re-run on its own. Tiles are mosaicked back together when the collection is read.
+# Specify the tile size in pixels (e.g. 4096), or None to export each year over the whole study area.
+landsatExportTileSize = None
+
 # There are additional options listed in getLandsatWrapper.py
 # You should not need to change them unless you would like to change the details of the
 # compositing methods.
@@ -159,6 +206,34 @@ viewDaymet = False # Can visualize Daymet composites in geeView()
 # Which fields to export
 daymetExportBands = ['prcp.*','srad.*','swe.*','tmax.*','tmin.*','vp.*']
 
+# Option to export all water years as a single image (one band per band and year, e.g. prcp_mean_2004) instead of one image per year.
+# Values are multiplied by multDict (below) and stored as 16 bit integers. This is a single task (or one per tile) instead of one per year.
+# 3_LandtrendrWrapper.py reads the stack back as the same annual collection. Incremental updates re-export the whole stack.
+daymetExportAsStack = False
+
+# Where to save the Daymet stack (a collection holding the stack, or its tiles)
+daymetStackCollection = rasterDataRoot + '/DAYMET-Stack-Collection'
+
+# Tile size (pixels) to split the Daymet stack export into, or None for a single export
+daymetExportTileSize = None
+
+# Where the Daymet predictors come from:
+# 'raster': export water-year composites on the transform above with 2_GetClimateWrapper.py (default)
+# 'table': reduce the daily Daymet data directly to water-year means for each apply GDE in a single table export with 2b_ClimateTableExporter.py
+#   (no climate rasters are exported). The Drive copy of that table is fit locally with SAGE_LocalLandTrendr.py (see README) and
+#   the fitted table is uploaded to daymetFitTablePath. 3_LandtrendrWrapper.py then only runs LandTrendr on the Landsat indices, and
+#   4_ApplyTableExporter.py joins the *_mean fitted, magnitude, and difference predictors of each GDE and year from the fitted table.
+daymetPredictorSource = 'raster'
+
+# Where to save the table of per-GDE water-year means if daymetPredictorSource is 'table'
+daymetTablePath = tableRoot + '/Daymet-Table'
+
+# Google Drive folder to also export the table of water-year means to as a csv (to fit with SAGE_LocalLandTrendr.py)
+daymetTableDriveDir = 'SAGE-Daymet-'+runname
+
+# Where the uploaded table of fitted Daymet outputs (one row per GDE and year) is
+daymetFitTablePath = tableRoot + '/Daymet-LT-Table'
+
 
 #--------------------LandTrendr (3_LandtrendrWrapper.py)------------------------
 #Specify years to run LandTrendr over
@@ -176,6 +251,15 @@ viewLandTrendr = False
 # Credentials to use are defined above as the "tokens" variable
 landtrendrUseMultiCredentials = False
 
+# Number of indices to run LandTrendr for together and export as bands of a single image.
+# With 1, each index is its own export (as before). Larger groups only build the Landsat and Daymet time series once per group,
+# at the cost of larger (longer running) exports. 3-7 generally works well.
+landtrendrGroupSize = 1
+
+#Number to multiply values by to get into 16 bit data space for exported LandTrendr stack and Daymet stack assets
+#Day length (dayl, seconds) is up to ~55000 in the study area, so it is stored in tens of seconds
+multDict = {'blue':10000,'green':10000,'red':10000,'nir':10000,'swir1':10000,'swir2':10000,'temp':10,'NBR':10000,'NDMI':10000,'NDVI':10000,'SAVI':10000,'EVI':10000,'brightness':10000,'greenness':10000,'wetness':10000,'tcAngleBG':10000,'prcp_mean':100,'tmin_mean':100,'tmax_mean':100,'srad_mean':10,'swe_mean':1, 'vp_mean':10, 'dayl_mean':0.1};
+
 #Which bands/indices (Landsat and Daymet) to run LandTrendr across
 landtrendrIndexList = ['blue','green','red','nir','swir1','swir2','temp','NBR','NDMI','NDVI','SAVI','EVI','brightness','greenness','wetness','tcAngleBG','tmin_mean','tmax_mean','prcp_mean','srad_mean','vp_mean']
 
@@ -222,6 +306,22 @@ elif filterWellTypeByAttributeOrValue == 'value':
 minGDESize = 900 # Minimum size of GDE polygon (m2)
 gdeSizeAttribute = 'Shape_Area' # Name of the area (m2) attribute in the GDE polygons
 
+# Option to read the apply GDEs from a prepared copy made by 0_PrepareGDEs.py (filtered by size, multi-geometries dissolved,
+# and the strata of the apply tables and downloads added) instead of repeating those steps inside every export
+# Each prepared copy is named by a key of the apply GDE asset version and the settings used to make it, so run 0_PrepareGDEs.py again
+# whenever either changes. Until the current copy exists, the GDEs are prepared on the fly as before.
+usePreparedGDEs = False
+preparedGDEDir = tableRoot + '/Prepared-GDEs' # Where to save the prepared apply GDEs
+
+# Option to simplify the apply GDE polygons when they are prepared, since 30 m pixels cannot make use of vertices much closer together than a pixel
+# Fewer vertices make the spatial joins, exports, and downloads of the GDEs smaller and faster
+# The tolerance is gdeSimplifyPixels times the pixel size of the transform above (15 m for 0.5 of a 30 m pixel)
+# If the area of a GDE would change by more than gdeSimplifyMaxAreaChange (a fraction of its area), it is simplified with a smaller tolerance
+# SAGE_Simplify.py does the same locally to GDE files (e.g. before uploading them)
+simplifyGDEPolygons = False
+gdeSimplifyPixels = 0.5
+gdeSimplifyMaxAreaChange = 0.01
+
 # In Training GDEs, GDE ID Attribute Name and Well ID Attribute Name - will combine to create specific GDE/Well combination identifiers
 gdeIdName = 'POLYGON_ID'
 wellIdName = 'STN_ID'
@@ -235,10 +335,60 @@ annualDGWField = 'Depth'
 # Credentials to use are defined above as the "tokens" variable
 applyTablesUseMultiCredentials = False
 
+# Format of the apply tables
+# 'annual' exports one table per year (Apply_Table_{year}), preparing the apply GDEs again in every export
+# 'long' prepares the apply GDEs once (dissolve, strata, predictor formatting) and reduces a single image with a band for each
+# LandTrendr output and year in one pass, then exports one long table with a feature for each GDE and year (Apply_Table_Long_{startApplyYear}_{endApplyYear})
+# Both formats are read the same way by 5_TrainingTableExporter.py and 6_ModelFitApply.py (see getApplyTable)
+applyTableFormat = 'annual'
+applyTableLongName = '{}_Long_{}_{}'.format(applyTableName, startApplyYear, endApplyYear)
+
+# Target number of GDEs in each apply table export (both formats)
+# If the apply GDEs do not fit in a single export, each table is split into shards of about this many GDEs ({table name}_Shard_{n}),
+# which 5_TrainingTableExporter.py and 6_ModelFitApply.py read back as one table
+# Set to None to export each table whole
+applyTableShardSize = None
+
+# How to group the apply GDEs into shards (only used if applyTableShardSize is set)
+# 'id' uses ranges of consecutive GDE IDs
+# 'grid' uses square cells of applyTableShardCellSize pixels on the crs and transform above (each GDE goes to the cell containing its centroid)
+# Any other value is the name of a GDE attribute (e.g. 'HUC08' from the strata below) whose values are kept together in a shard
+# With 'grid' or an attribute, the apply tables get an extra 'applyShard' field with the cell or attribute value of each GDE
+applyTableShardBy = 'id'
+applyTableShardCellSize = 1024
+
+# tileScales to try when an apply table export fails for lack of memory (or times out)
+# A failed export is submitted again with the next tileScale. Once the last has failed, its shard is split in two and each half starts over.
+applyTableTileScales = [4, 8, 16]
+
+# Option to compute the apply tables from an image of GDE IDs instead of the GDE polygons
+# 3c_GDEZoneImageExporter.py rasterizes the apply GDEs once onto the crs and transform above (each pixel gets the ID of the GDE containing its center),
+# then zonal means are computed with a single grouped mean reducer over that image instead of rasterizing every GDE polygon in each reduceRegions call
+# Each pixel only counts toward one GDE and is not weighted by how much of it the GDE covers, so means of overlapping GDEs (and at GDE edges)
+# differ slightly from reduceRegions. GDEs that do not contain the center of any pixel (e.g. GDEs smaller than a pixel) get their means from reduceRegions.
+# Run 3c_GDEZoneImageExporter.py before 4_ApplyTableExporter.py. The zone image name ends with a key of the apply GDE asset version
+# and settings (as the prepared GDEs do), so it is exported again whenever the apply GDEs change
+useGDEZoneImage = False
+gdeZoneImage = rasterDataRoot + '/GDE-Zone-Image'
+
+# Maximum number of bands to reduce over the zone image at once
+# Long apply tables stack every year, so their bands are split into several reductions of at most this many bands
+gdeZoneImageBandLimit = 100
+
 # Choose which bands from LandTrendr to summarize when making training tables. If you are unsure which bands you will want to include in the model, err on the side of too many.
 # Options are '.*_fitted','.*_mag','.*_diff','.*_dur','.*_slope'
 ltBands = ['.*_fitted','.*_mag','.*_diff']
 
+# Option to store the annual LandTrendr fits (ltBands) of every index as one image per year with 3b_LandtrendrFitExporter.py,
+# so the apply tables read stored pixels instead of fitting every LandTrendr stack again for each year.
+# Run 3b_LandtrendrFitExporter.py after 3_LandtrendrWrapper.py (and again whenever the LandTrendr stacks or ltBands change).
+useLTFitCollection = False
+ltFitCollection = rasterDataRoot + '/LandTrendr-Fit-Collection' # Where to save the annual LandTrendr fits
+
+# The fits are stored as 16 bit integers in the units of the LandTrendr stacks (already multiplied by multDict)
+# Slopes are often fractions of those units, so they are also multiplied by ltFitSlopeMult (values beyond the 16 bit range are clamped)
+ltFitSlopeMult = 10
+
 # Here you can list any additional predictor layers/ strata that you want to add to your GDEs.
 # Any layer should be uploaded to GEE.
 # These layers are separated by format (raster vs. vector) below.
@@ -306,6 +456,36 @@ randomForestParameters = {
 	'seed': 0, # The randomization seed.
 }
 
+# Option to sweep several predictor sets and random forest parameters and apply only the best configuration
+# If True, 6_ModelFitApply.py evaluates every combination of sweepPredictorSets (same format as modelRuns) and
+# sweepRFParameters (lists of values that replace those in randomForestParameters), ranks them by sweepMetric,
+# and applies only the best one instead of every entry of modelRuns
+sweepModels = False
+sweepPredictorSets = modelRuns
+sweepRFParameters = {'variablesPerSplit': [None, 4], 'minLeafPopulation': [1, 5]}
+
+# 'server' trains every configuration in GEE at once and exports their out of bag errors to one table (sweepTablePath)
+# 'local' fits them on local cores with scikit-learn (SAGE_LocalRF.py) from a csv or parquet download of the training table (sweepLocalTrainingTable)
+sweepMode = 'server'
+sweepTablePath = trainingTableDir + '/Model_Sweep_' + runname
+sweepLocalTrainingTable = None
+sweepWorkers = None # Number of configurations to fit at once locally (None uses all cores)
+
+# Error to rank configurations by: 'oob' (out of bag error) or 'cv' (RMSE of the cross-validation below, local only)
+sweepMetric = 'oob'
+
+# Cross-validation (SAGE_CrossValidation.py, and sweepMetric = 'cv')
+# Training rows with the same value of cvBlockBy are kept in the same fold so related observations are never on both sides of a split
+# Options include wellIdName ('STN_ID'), gdeIdName ('POLYGON_ID'), 'HUC08', 'Hydroregion_Number', or 'year'
+# When blocking by year, cvYearRanges gives the years of each fold (e.g. [[1985,1996],[1997,2008],[2009,2021]]).
+# If None, the years are split into cvFolds runs of consecutive years.
+# The fold of each value is saved in cvFoldDir and reused, so different runs are compared on the same folds
+cvBlockBy = wellIdName
+cvFolds = 5
+cvYearRanges = None
+cvRegionField = 'Hydroregion_Number' # Field to report errors by in addition to each fold
+cvFoldDir = None # Default (None) is a CV-Folds folder in outputLocalRFModelInfoDir
+
 
 #--------------------Download to Outputs to Google Drive (7_DownloadOutputs.py)------------------------
 
@@ -345,6 +525,26 @@ keep_columns = ['POLYGON_ID','matchesN','matchesReduced','Hydroregion_Number','G
 # Which columns to keep from the OLS output
 column_names = ['POLYGON_ID','matchesN','matchesReduced','Hydroregion_Number','Groundwater_Basin_ID','N','StartYear','EndYear','Years','Preds','Training_DGW','OLS_Intercept','OLS_Slope','OLS_Pvalue','OLS_SigDir']
 
+#-------------------------------------------------
+#				Diagnostics
+#-------------------------------------------------
+# Whether to trace every blocking GEE round trip (.getInfo(), asset and task listings) made by a script
+# and print a ranked report of the slowest call sites when the script exits.
+# This can also be turned on without editing this file by setting the SAGE_PROFILE environment variable to 1
+profileEECalls = False
+
+# Optional path to a json file to save the raw call records to (None to skip)
+profileOutputJSON = None
+
+# Whether to keep a local cache of deterministic getInfo results (property names, asset listings, etc.)
+# Cached values are reused until an asset they read is updated, they are older than getInfoCacheTTLHours,
+# or they are evicted to keep the cache under getInfoCacheMaxMB
+# Setting the SAGE_GETINFO_CACHE environment variable to 0 turns the cache off without editing this file
+useGetInfoCache = True
+getInfoCacheDir = os.path.join(os.path.expanduser('~'), '.sage-cache', 'getInfo')
+getInfoCacheTTLHours = 24 * 7
+getInfoCacheMaxMB = 50
+
 #************ Should not need to modify below this line *************************
 
 
@@ -393,12 +593,12 @@ def innerOuterJoin(primary,secondary,matchFieldName,propertyName,reducer):
 	joined = primary.map(lambda f:wrapper(f))
 	return joined;
 
+#fieldName can be a list of fields (e.g. [gdeIdName, 'year']) that all have to match
 def joinFeatureCollectionsReverse(primary,secondary,fieldName):
 	#Use an equals filter to specify how the collections match.
-	f = ee.Filter.equals(\
-    leftField=fieldName,\
-    rightField=fieldName\
-  	)
+	fieldNames = fieldName if isinstance(fieldName, list) else [fieldName]
+	filters = [ee.Filter.equals(leftField=n, rightField=n) for n in fieldNames]
+	f = filters[0] if len(filters) == 1 else ee.Filter.And(*filters)
   
 	#Define the join.
 	innerJoin = ee.Join.inner('primary', 'secondary')
@@ -415,6 +615,13 @@ def joinFeatureCollectionsReverse(primary,secondary,fieldName):
 
 
 
+#Function to get the value of a deterministic ee object, using the local getInfo cache if selected
+#assetIds are the assets the value depends on (found in the expression if None, [] to only use the TTL)
+def cachedGetInfo(obj, assetIds = None):
+	if not useGetInfoCache or os.environ.get('SAGE_GETINFO_CACHE') == '0':
+		return obj.getInfo()
+	return SAGE_Cache.getInfo(obj, getInfoCacheDir, assetIds, getInfoCacheTTLHours, getInfoCacheMaxMB)
+
 #Function to initialize from specified token
 #Does not un-initialize any existing initializations, but will point to this set of credentials    
 def initializeFromToken(token_path_name):
@@ -469,7 +676,7 @@ def addStrata(applyGDEs, vectorStrataToAdd, rasterStrataToAdd):
     # Load image
     image = ee.Image(strat['assetName']).select(strat['assetAttributes'])
     # Get original attributes:
-    origNames = applyGDEs.first().propertyNames().getInfo()
+    origNames = cachedGetInfo(applyGDEs.first().propertyNames())
     # Reduce to GDE collection
     applyGDEs = image.reduceRegions(**{\
       'collection': applyGDEs,
@@ -510,12 +717,550 @@ def shortTrackTasks(credential_path = None):
 	print()
 	time.sleep(2)
 
+#Function to wait until there is room for another export task
+#Tasks submitted since the last check are counted locally so the task list is only requested when the limit may be reached
+_activeTasks = [None]
+def limitTasks(limit):
+	if _activeTasks[0] != None and _activeTasks[0] < limit:
+		_activeTasks[0] += 1
+		return
+	while True:
+		tasks = ee.data.getTaskList()
+		_activeTasks[0] = len([t for t in tasks if t['state'] in ['READY', 'RUNNING']])
+		if _activeTasks[0] < limit:
+			_activeTasks[0] += 1
+			return
+		print(_activeTasks[0], 'tasks ready or running. Waiting to submit more', time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
+		time.sleep(60)
+
+#Function to split a region into square tiles aligned to the crs and transform (or scale) above
+#Returns a list of [tileName, ee.Geometry] for the tiles that intersect the region
+#If features are given (e.g. the apply GDEs), only tiles that also intersect one of them are returned
+#tileSize is in pixels
+def getExportTiles(region, tileSize, features = None):
+	if transform != None:
+		pixelSize, x0, y0 = abs(transform[0]), transform[2], transform[5]
+	else:
+		pixelSize, x0, y0 = scale, 0, 0
+	size = tileSize * pixelSize
+
+	#Get the bounds of the region in the output projection
+	bounds = cachedGetInfo(ee.Geometry(region).transform(crs, 1).bounds(1, crs).coordinates())[0]
+	xs = [c[0] for c in bounds]
+	ys = [c[1] for c in bounds]
+
+	#Build the grid of tiles over the bounds (rows count down from the top of the transform)
+	tiles = {}
+	for col in range(int(math.floor((min(xs) - x0) / size)), int(math.ceil((max(xs) - x0) / size))):
+		for row in range(int(math.floor((y0 - max(ys)) / size)), int(math.ceil((y0 - min(ys)) / size))):
+			tileName = '{}_{}'.format(col, row)
+			tiles[tileName] = ee.Geometry.Rectangle([x0 + col * size, y0 - (row + 1) * size, x0 + (col + 1) * size, y0 - row * size], crs, False)
+
+	#Only keep the tiles that intersect the region (in a single request)
+	tileFeatures = ee.FeatureCollection([ee.Feature(geometry, {'tile': tileName}) for tileName, geometry in tiles.items()]).filterBounds(region)
+	if features != None:
+		tileFeatures = ee.Join.simple().apply(tileFeatures, ee.FeatureCollection(features).filterBounds(region),\
+			ee.Filter.intersects(leftField = '.geo', rightField = '.geo', maxError = 10))
+	keep = cachedGetInfo(tileFeatures.aggregate_array('tile'))
+	print('Exporting {} tiles of {} x {} pixels'.format(len(keep), tileSize, tileSize))
+	return [[tileName, tiles[tileName]] for tileName in sorted(keep)]
+
+#Function to get the apply GDEs that are summarized by the apply tables (filtered by size)
+#The prepared copy is used if selected and it exists
+def getApplyGDEs():
+	if usePreparedGDEs and preparedGDEsExist():
+		return ee.FeatureCollection(getPreparedGDEsId())
+	return ee.FeatureCollection(applyGDECollection).filter(ee.Filter.gte(gdeSizeAttribute, minGDESize))
+
+#Function to prepare the apply GDEs: filter by size, union multi-geometries, and add the strata of the apply tables and downloads
+#The settings they were prepared with are set as 'sage_settings'
+def prepareGDEs():
+	gdes = ee.FeatureCollection(applyGDECollection).filter(ee.Filter.gte(gdeSizeAttribute, minGDESize))
+	gdes = gdes.map(lambda f: ee.Feature(f).dissolve(100))
+	if simplifyGDEPolygons:
+		gdes = simplifyGDEs(gdes)
+	gdes = addStrata(gdes, vectorStrataToAdd, rasterStrataToAdd)
+	gdes = addStrata(gdes, exportVectorStrataToAdd, exportRasterStrataToAdd)
+	getPreparedGDEsId()
+	return gdes.set('sage_settings', json.dumps(_preparedGDEs['settings'], sort_keys = True))
+
+#Function to get the tolerance (meters) GDE polygons are simplified with
+def getGDESimplifyTolerance():
+	pixelSize = abs(transform[0]) if transform != None else scale
+	return pixelSize * gdeSimplifyPixels
+
+#Function to count the vertices of a geometry
+def countVertices(geometry):
+	return ee.List(ee.Geometry(geometry).coordinates()).flatten().length().divide(2)
+
+#Function to simplify GDE polygons in the crs above
+#If the area of a GDE changes by more than maxAreaChange (fraction), the tolerance is halved for that GDE
+#(up to halvings times, after which it keeps its original polygon)
+def simplifyGDEs(gdes, tolerance = None, maxAreaChange = None, halvings = 3):
+	if tolerance == None:
+		tolerance = getGDESimplifyTolerance()
+	if maxAreaChange == None:
+		maxAreaChange = gdeSimplifyMaxAreaChange
+	def simplify(f):
+		f = ee.Feature(f)
+		geometry = f.geometry()
+		area = geometry.area(1, crs)
+		#Start from the original polygon and use the largest tolerance that keeps the area
+		out = geometry
+		for i in reversed(range(halvings + 1)):
+			simplified = geometry.simplify(tolerance / 2.0 ** i, crs)
+			areaChange = simplified.area(1, crs).divide(area).subtract(1).abs()
+			out = ee.Algorithms.If(areaChange.lte(maxAreaChange), simplified, out)
+		return f.setGeometry(ee.Geometry(out))
+	return gdes.map(simplify)
+
+#Function to report how much simplifyGDEs reduces the vertices (and approximate GeoJSON size) of the dissolved apply GDEs
+#Measured on the first sampleSize GDEs in a single request
+def reportGDESimplification(sampleSize = 1000):
+	#Approximate GeoJSON characters per vertex (two coordinates and separators)
+	bytesPerVertex = 40
+	sample = ee.FeatureCollection(applyGDECollection).filter(ee.Filter.gte(gdeSizeAttribute, minGDESize)).limit(sampleSize)
+	sample = sample.map(lambda f: ee.Feature(f).dissolve(100))
+	def count(f):
+		return f.set({'vertices': countVertices(f.geometry()), 'area': f.geometry().area(1, crs)})
+	before = sample.map(count)
+	after = simplifyGDEs(sample).map(count)
+	stats = cachedGetInfo(ee.Dictionary({\
+		'gdes': before.size(),
+		'verticesBefore': before.aggregate_sum('vertices'),
+		'verticesAfter': after.aggregate_sum('vertices'),
+		'areaBefore': before.aggregate_sum('area'),
+		'areaAfter': after.aggregate_sum('area')}), [applyGDECollection])
+	reduction = 1 - stats['verticesAfter'] / float(stats['verticesBefore']) if stats['verticesBefore'] > 0 else 0
+	areaChange = stats['areaAfter'] / float(stats['areaBefore']) - 1 if stats['areaBefore'] > 0 else 0
+	print('Simplifying {} sample GDEs with a tolerance of {} m: {} -> {} vertices ({:.1%} fewer), about {:.1f} -> {:.1f} MB of GeoJSON, total area change {:.3%}'.format(\
+		stats['gdes'], getGDESimplifyTolerance(), stats['verticesBefore'], stats['verticesAfter'], reduction,
+		stats['verticesBefore'] * bytesPerVertex / 1e6, stats['verticesAfter'] * bytesPerVertex / 1e6,
+		areaChange))
+	return stats
+
+#Function to get the asset id of the prepared apply GDEs for the current apply GDE asset version and settings
+_preparedGDEs = {}
+def getPreparedGDEsId():
+	if 'id' not in _preparedGDEs:
+		strata = vectorStrataToAdd + rasterStrataToAdd + exportVectorStrataToAdd + exportRasterStrataToAdd
+		settings = {\
+			'applyGDECollection': [applyGDECollection, SAGE_Cache.getAssetVersion(applyGDECollection)],
+			'filter': [gdeSizeAttribute, minGDESize],
+			'dissolveMaxError': 100,
+			'simplify': [getGDESimplifyTolerance(), gdeSimplifyMaxAreaChange] if simplifyGDEPolygons else None,
+			'strata': [[strat, SAGE_Cache.getAssetVersion(strat['assetName'])] for strat in strata],
+			'studyArea': studyArea if isinstance(studyArea, str) else ee.serializer.toJSON(studyArea),
+			'crs': [crs, transform, scale]}
+		key = hashlib.sha256(json.dumps(settings, sort_keys = True).encode('utf-8')).hexdigest()[:12]
+		_preparedGDEs['settings'] = settings
+		_preparedGDEs['id'] = '{}/Apply_GDEs_{}'.format(preparedGDEDir, key)
+	return _preparedGDEs['id']
+
+#Function to check (once per run) if the prepared apply GDEs for the current settings have been exported
+def preparedGDEsExist():
+	if 'exists' not in _preparedGDEs:
+		_preparedGDEs['exists'] = bool(ee.data.getInfo(getPreparedGDEsId()))
+		if not _preparedGDEs['exists']:
+			print('Prepared apply GDEs not found ({}). Preparing them on the fly. Run 0_PrepareGDEs.py to export them.'.format(getPreparedGDEsId()))
+	return _preparedGDEs['exists']
+
+#Function to get the prepared apply GDEs (prepared on the fly if they have not been exported)
+def getPreparedGDEs():
+	if preparedGDEsExist():
+		return ee.FeatureCollection(getPreparedGDEsId())
+	return prepareGDEs()
+
+#Function to get the asset id of the GDE zone image for the current apply GDEs
+#The key is the one of the prepared GDEs if they are used, otherwise of the apply GDE asset version and size filter
+def getGDEZoneImageId():
+	if usePreparedGDEs and preparedGDEsExist():
+		key = getPreparedGDEsId().split('_')[-1]
+	else:
+		settings = [applyGDECollection, SAGE_Cache.getAssetVersion(applyGDECollection), gdeSizeAttribute, minGDESize, crs, transform, scale]
+		key = hashlib.sha256(json.dumps(settings, sort_keys = True).encode('utf-8')).hexdigest()[:12]
+	return '{}_{}'.format(gdeZoneImage, key)
+
+#Function to rasterize GDEs (the apply GDEs by default) to an image of their IDs ('zone') for reduceZones
+#Each pixel gets the ID of a GDE containing its center and pixels outside the GDEs are masked
+def getGDEZoneImage(gdes = None):
+	if gdes == None:
+		gdes = getApplyGDEs()
+	return gdes.filter(ee.Filter.notNull([gdeIdName])).reduceToImage([gdeIdName], ee.Reducer.first()).int32().rename(['zone'])
+
+#Function to get the zonal means of image bands for each GDE with grouped sum reducers over the GDE zone image
+#Returns the GDEs with the mean of each band set as properties, like image.select(bandNames).reduceRegions(gdes, ee.Reducer.mean(), ...)
+#Each band is averaged over its own unmasked pixels (the sum of its values and of its mask are reduced), so a masked band does not mask the others
+#Bands are reduced gdeZoneImageBandLimit at a time
+#GDEs without any pixels in the zone image (e.g. smaller than a pixel) get their means from reduceRegions instead
+def reduceZones(image, gdes, bandNames, tileScale = 4, zones = None):
+	if zones == None:
+		zones = ee.Image(getGDEZoneImageId())
+	zones = zones.select(['zone'])
+	region = gdes.geometry(100).bounds(100)
+
+	zoneGDEs = gdes
+	for start in range(0, len(bandNames), gdeZoneImageBandLimit):
+		chunk = bandNames[start:start + gdeZoneImageBandLimit]
+		n = len(chunk)
+		values = ee.Image(image).select(chunk)
+		weights = values.mask()
+		stats = values.unmask(0).multiply(weights).addBands(weights.regexpRename('$', '_weight')).addBands(zones).reduceRegion(**{\
+			'reducer': ee.Reducer.sum().repeat(2 * n).group(2 * n, gdeIdName),
+			'geometry': region,
+			'scale': scale,
+			'crs': crs,
+			'crsTransform': transform,
+			'maxPixels': 1e13,
+			'tileScale': tileScale})
+
+		#Convert each group to a feature of means (null where a band is masked over the whole GDE) and join them to the GDEs by ID
+		def groupToFeature(group, chunk = chunk, n = n):
+			group = ee.Dictionary(group)
+			sums = ee.List(group.get('sum'))
+			def getMean(i):
+				weight = ee.Number(sums.get(ee.Number(i).add(n)))
+				return ee.Algorithms.If(weight.gt(0), ee.Number(sums.get(i)).divide(weight), None)
+			return ee.Feature(None, ee.Dictionary.fromLists(chunk, ee.List.sequence(0, n - 1).map(getMean))).set(gdeIdName, group.get(gdeIdName))
+		means = ee.FeatureCollection(ee.List(stats.get('groups')).map(groupToFeature))
+		zoneGDEs = joinFeatureCollectionsReverse(means, zoneGDEs, gdeIdName)
+
+	#Use reduceRegions for GDEs that are not in the zone image
+	missing = ee.Join.inverted().apply(gdes, zoneGDEs, ee.Filter.equals(leftField = gdeIdName, rightField = gdeIdName))
+	missing = ee.Image(image).select(bandNames).reduceRegions(missing, ee.Reducer.mean(), scale, crs, transform, tileScale)
+	return zoneGDEs.merge(missing)
+
+#Function to get the folder of the local model registry
+#Found when it is used, so changes to outputLocalRFModelInfoDir after import are followed
+def getModelRegistryDir():
+	if modelRegistryDir != None:
+		return modelRegistryDir
+	return os.path.join(outputLocalRFModelInfoDir, 'Model-Registry')
+
+#Function to get the folder the cross-validation folds are saved in
+def getCVFoldDir():
+	if cvFoldDir != None:
+		return cvFoldDir
+	return os.path.join(outputLocalRFModelInfoDir, 'CV-Folds')
+
+#Function to get the path of the local predictor codebook
+def getPredictorCodebookPath():
+	return os.path.join(outputLocalRFModelInfoDir, predictorCodebookName)
+
+#Function to read the local predictor codebook ({predictor: {string value: integer code}}, empty if it does not exist yet)
+def loadPredictorCodebook():
+	path = getPredictorCodebookPath()
+	if not os.path.exists(path):
+		return {}
+	with open(path) as f:
+		return json.load(f)
+
+#Function to add new string values of predictors to the local codebook and save it
+#values is {predictor: [string values]}. Values already in the codebook keep their codes and new values get the next codes (starting at 1).
+def updatePredictorCodebook(values):
+	codebook = loadPredictorCodebook()
+	for predictorName, predictorValues in values.items():
+		codes = codebook.setdefault(predictorName, {})
+		for value in sorted(predictorValues):
+			if value not in codes:
+				codes[value] = max(list(codes.values()) + [0]) + 1
+	path = getPredictorCodebookPath()
+	if not os.path.exists(os.path.dirname(path)):
+		os.makedirs(os.path.dirname(path))
+	o = open(path, 'w')
+	o.write(json.dumps(codebook, indent = 1, sort_keys = True))
+	o.close()
+	return codebook
+
+#Function to replace the string values of predictors in a collection with their codes
+def encodePredictors(collection, codebook):
+	for predictorName, codes in codebook.items():
+		names = list(codes.keys())
+		collection = collection.remap(names, [codes[n] for n in names], predictorName)
+	return collection
+
+#Function to add the string value of coded predictors in a collection as {predictor}_String
+def decodePredictors(collection, codebook):
+	for predictorName, codes in codebook.items():
+		values = ee.Dictionary(dict((str(code), value) for value, code in codes.items()))
+		def decode(f, predictorName = predictorName, values = values):
+			return f.set(predictorName + '_String', values.get(ee.Number(f.get(predictorName)).format('%d'), ''))
+		collection = collection.map(decode)
+	return collection
+
+#Function to get the buffered GDE footprint (1 within gdeFootprintBuffer of an apply GDE, 0 elsewhere)
+#The footprint is exported to gdeFootprintAsset the first time it is needed and read from there afterwards
+#Until that export finishes, the footprint is computed on the fly
+def getGDEFootprint():
+	if ee.data.getInfo(gdeFootprintAsset):
+		return ee.Image(gdeFootprintAsset)
+
+	footprint = ee.Image(0).byte().paint(getApplyGDEs(), 1)\
+		.focal_max(gdeFootprintBuffer, 'circle', 'meters')\
+		.rename(['footprint'])
+
+	exportName = os.path.basename(gdeFootprintAsset)
+	running = [t for t in ee.data.getTaskList() if t['state'] in ['READY', 'RUNNING'] and t['description'] == exportName]
+	if len(running) == 0:
+		t = ee.batch.Export.image.toAsset(**{\
+			'image': footprint.clip(studyArea),
+			'description': exportName,
+			'assetId': gdeFootprintAsset,
+			'pyramidingPolicy': {'.default': 'max'},
+			'region': studyArea,
+			'scale': scale,
+			'crs': crs,
+			'crsTransform': transform,
+			'maxPixels': 1e13})
+		print('Exporting:', exportName)
+		t.start()
+	return footprint
+
+#Function to mask an image to the GDE footprint if selected
+def maskToGDEFootprint(image, footprint = None):
+	if not useGDEFootprint:
+		return image
+	if footprint == None:
+		footprint = getGDEFootprint()
+	return ee.Image(image).updateMask(footprint)
+
+#Function to get the export tiles for a raster stage
+#When using the GDE footprint, only tiles that intersect an apply GDE are returned
+def getRasterExportTiles(tileSize = None):
+	if tileSize == None:
+		tileSize = gdeFootprintTileSize
+	if useGDEFootprint:
+		return getExportTiles(studyArea, tileSize, getApplyGDEs())
+	return getExportTiles(studyArea, tileSize)
+
+#Function to export an annual image collection as one asset per year and tile
+#exportNameFormat should contain {year} and {tile}
+#prepImage is an optional function to format each annual image (e.g. rescaling) before it is exported
+#Tiles whose asset id is in skipAssetIds (e.g. already exported in an incremental update) are not exported again
+def exportTiledCollection(collection, years, tiles, exportPathRoot, exportNameFormat, pyramidingPolicyObject = {'.default': 'mean'}, prepImage = None, skipAssetIds = set()):
+	for yr in years:
+		image = ee.Image(ee.ImageCollection(collection).filter(ee.Filter.calendarRange(yr, yr, 'year')).first())
+		if prepImage != None:
+			image = prepImage(image)
+		for tileName, tile in tiles:
+			exportName = exportNameFormat.format(year = yr, tile = tileName)
+			if exportPathRoot + '/' + exportName in skipAssetIds:
+				continue
+			exportImageToAsset(image.set({'year': yr, 'tile': tileName}), exportPathRoot + '/' + exportName, tile, pyramidingPolicyObject)
+
+#Function to export a single image (or tile of an image) to an asset on the crs and transform (or scale) above
+#Waits until there is room in the task queue (maxConcurrentExports)
+def exportImageToAsset(image, assetId, region, pyramidingPolicyObject = {'.default': 'mean'}):
+	exportName = os.path.basename(assetId)
+	limitTasks(maxConcurrentExports)
+	t = ee.batch.Export.image.toAsset(**{\
+		'image': ee.Image(image).clip(region),
+		'description': exportName,
+		'assetId': assetId,
+		'pyramidingPolicy': pyramidingPolicyObject,
+		'region': region,
+		'scale': scale,
+		'crs': crs,
+		'crsTransform': transform,
+		'maxPixels': 1e13})
+	print('Exporting:', exportName)
+	t.start()
+
+#Function to get the ids of the assets in an annual image collection by year (in a single request)
+def getCollectionYears(collectionPath):
+	c = ee.ImageCollection(collectionPath)
+	info = ee.Dictionary({'ids': c.aggregate_array('system:index'), 'times': c.aggregate_array('system:time_start')}).getInfo()
+	out = {}
+	for assetName, t in zip(info['ids'], info['times']):
+		out.setdefault(datetime.fromtimestamp(t / 1000., timezone.utc).year, []).append(collectionPath + '/' + assetName)
+	return out
+
+#Function to set up an incremental update of an annual collection
+#years are the export years and yearOffset converts them to the year of the exported images (e.g. 1 for Daymet water years)
+#Deletes the assets of any invalidated years and returns the years that are missing (or were invalidated)
+#along with the ids of the assets that are kept
+def prepIncrementalUpdate(collectionPath, years, yearOffset = 0):
+	years = list(years)
+	if not incrementalUpdate:
+		return {'years': years, 'existingAssetIds': set()}
+	existing = getCollectionYears(collectionPath)
+	for yr in invalidatedYears:
+		for assetId in existing.pop(yr, []):
+			print('Deleting invalidated asset:', assetId)
+			ee.data.deleteAsset(assetId)
+	missing = [yr for yr in years if yr + yearOffset not in existing]
+	print('Years already in {}: {}'.format(collectionPath, sorted(existing.keys())))
+	print('Years to export:', [yr + yearOffset for yr in missing])
+	return {'years': missing, 'existingAssetIds': set(i for ids in existing.values() for i in ids)}
+
+#Function to group years into runs of consecutive years, e.g. [1985, 1986, 1990] -> [[1985, 1986], [1990, 1990]]
+def getYearRuns(years):
+	runs = []
+	for yr in sorted(years):
+		if len(runs) > 0 and runs[-1][1] == yr - 1:
+			runs[-1][1] = yr
+		else:
+			runs.append([yr, yr])
+	return runs
+
+#Function to get the names of the Daymet bands selected by daymetExportBands
+def getDaymetBands():
+	allBands = ['dayl','prcp','srad','swe','tmax','tmin','vp']
+	return [b for b in allBands if any(re.match(p + '$', b) for p in daymetExportBands)]
+
+#Function to pack an annual collection into one image with a band for each band and year ({band}_{year})
+#Values are multiplied by multDict and stored as 16 bit integers
+def packAnnualStack(collection, years, bands):
+	images = []
+	for yr in years:
+		image = ee.Image(ee.ImageCollection(collection).filter(ee.Filter.calendarRange(yr, yr, 'year')).first()).select(bands)
+		images.append(image.multiply([multDict[b] for b in bands]).rename(['{}_{}'.format(b, yr) for b in bands]))
+	return ee.Image.cat(images).int16()
+
+#Function to read a stack made by packAnnualStack (as one image or its tiles) back as an annual image collection
+#Images are dated June 1 of each year
+def getAnnualStackCollection(collectionPath, startYear, endYear, bands):
+	stack = ee.ImageCollection(collectionPath).mosaic()
+	images = []
+	for yr in range(startYear, endYear + 1):
+		image = stack.select(['{}_{}'.format(b, yr) for b in bands], bands).float().divide([multDict[b] for b in bands])
+		images.append(image.set('system:time_start', ee.Date.fromYMD(yr, 6, 1).millis()))
+	return ee.ImageCollection(images)
+
+#Function to get the Daymet indices in landtrendrIndexList
+#If daymetPredictorSource is 'table' they are fit locally from the table of water-year means instead of with LandTrendr in GEE
+def getDaymetIndices():
+	return [b + '_mean' for b in getDaymetBands() if b + '_mean' in landtrendrIndexList]
+
+#Function to add the locally fitted Daymet outputs (daymetFitTablePath) of each GDE and year to a table with a year field
+#Only the outputs in ltBands are added. GDEs and years missing from the fitted table are left out of the result
+def addDaymetFits(table):
+	fits = ee.FeatureCollection(daymetFitTablePath)
+	fitNames = ['{}_LT_{}'.format(i, b.split('_')[-1]) for i in getDaymetIndices() for b in ltBands]
+	fits = fits.map(lambda f: ee.Feature(None, f.toDictionary([gdeIdName, 'year'] + fitNames)))
+	return joinFeatureCollectionsReverse(fits, table, [gdeIdName, 'year'])
+
+#Function to get an image collection of LandTrendr outputs for all bands to then summarize with iGDE zonal stats (means)
+#Each year is a single flat concatenation of the fits of every index (rather than a chain of joins),
+#so the expression grows linearly with the number of indices and does not grow with the number of years
+def getLT(ltCollection, ltBands):
+	from geeViz import changeDetectionLib
+
+	#Bring in LandTrendr collection
+	c = ee.ImageCollection(ltCollection)
+
+	#Get the IDs of LandTrendr bands/indices runs (a single listing)
+	ids = cachedGetInfo(c.aggregate_array('system:index'), [ltCollection])
+	if len(ids) == 0:
+		raise Exception('No LandTrendr stacks found in {}. Run 3_LandtrendrWrapper.py first.'.format(ltCollection))
+
+	#Convert each LandTrendr stack to a collection of annual fits
+	#Stacks of grouped indices (landtrendrGroupSize) have the index names joined with '-' in their ID
+	#and their bands prefixed with the index name
+	fits = []
+	startYears = []
+	endYears = []
+	for id in ids:
+		startYear = int(id.split('_')[-2])
+		endYear = int(id.split('_')[-1])
+		indexNames = id.split('_{}_'.format(startYear))[0].split('Stack_')[1].split('-')
+		startYears.append(startYear)
+		endYears.append(endYear)
+
+		groupStack = ee.Image(c.filter(ee.Filter.eq('system:index',id)).first())
+		for indexName in indexNames:
+			if len(indexNames) == 1:
+				ltStack = groupStack
+			else:
+				ltStack = groupStack.select(['{}_.*'.format(indexName)]).regexpRename('^{}_'.format(indexName), '')
+			fits.append(changeDetectionLib.simpleLTFit(ltStack, startYear, endYear, indexName).select(ltBands))
+
+	#Concatenate the fits of every index for each year (the years every stack covers)
+	#Pixels where any index is null are masked, as joinCollections (maskAnyNullValues) did
+	def getYear(yr):
+		yr = ee.Number(yr)
+		yearFilter = ee.Filter.calendarRange(yr, yr, 'year')
+		image = ee.Image.cat([ee.Image(fit.filter(yearFilter).first()) for fit in fits])
+		return image.updateMask(image.mask().reduce(ee.Reducer.min()))\
+			.set('system:time_start', ee.Date.fromYMD(yr, 6, 1).millis())
+
+	return ee.ImageCollection(ee.List.sequence(max(startYears), min(endYears)).map(getYear))
+
+#Function to convert an annual LandTrendr fit image to the 16 bit integers stored by 3b_LandtrendrFitExporter.py
+def packLTFit(image):
+	image = ee.Image(image)
+	if '.*_slope' in ltBands:
+		image = image.addBands(image.select(['.*_slope']).multiply(ltFitSlopeMult), None, True)
+	return ee.Image(image.round().int16().copyProperties(image, ['system:time_start']))
+
+#Function to read the annual LandTrendr fits stored by 3b_LandtrendrFitExporter.py (ltBands) back in the units of getLT
+def getLTFitCollection(startYear, endYear):
+	c = getAnnualCollection(ltFitCollection, startYear, endYear).select(ltBands)
+	if '.*_slope' in ltBands:
+		c = c.map(lambda img: img.float().addBands(img.select(['.*_slope']).divide(ltFitSlopeMult), None, True))
+	return c
+
+#Function to read an annual image collection, mosaicking any tiles that were exported separately for the same year
+#Collections exported without tiles are returned with one image per year, as before
+def getAnnualCollection(collectionPath, startYear, endYear):
+	c = ee.ImageCollection(collectionPath).filter(ee.Filter.calendarRange(startYear, endYear, 'year'))
+	def mosaicYear(img):
+		img = ee.Image(img)
+		tiles = c.filter(ee.Filter.eq('system:time_start', img.get('system:time_start')))
+		return tiles.mosaic().copyProperties(img).set('system:time_start', img.get('system:time_start'))
+	return ee.ImageCollection(c.distinct('system:time_start').map(mosaicYear)).sort('system:time_start')
+
+#Function to find the apply table assets (and all their shards) with any of the given names in applyTableDir
+#The folder is listed once per run unless refresh is True
+_applyTableAssetIds = None
+def findApplyTableIds(names, refresh = False):
+	global _applyTableAssetIds
+	if _applyTableAssetIds == None or refresh:
+		assets = ee.data.listAssets({'parent': applyTableDir}).get('assets', [])
+		_applyTableAssetIds = sorted([a.get('id', a.get('name')) for a in assets])
+	pattern = re.compile('^({})(_Shard_[0-9_]+)?$'.format('|'.join([re.escape(n) for n in names])))
+	return [i for i in _applyTableAssetIds if pattern.match(os.path.basename(i))]
+
+#Function to get the ids of the apply table assets exported by 4_ApplyTableExporter.py for a set of years
+#They are found with a single listing of applyTableDir and include every shard
+#(tables can be split into shards by 4_ApplyTableExporter.py even if applyTableShardSize is None, when they run out of memory)
+def getApplyTableIds(years):
+	if applyTableFormat == 'long':
+		names = [applyTableLongName]
+	else:
+		names = ['{}_{}'.format(applyTableName, yr) for yr in years]
+	ids = findApplyTableIds(names)
+	if len(ids) == 0:
+		raise Exception('No apply tables named {} found in {}. Run 4_ApplyTableExporter.py first.'.format(', '.join(names), applyTableDir))
+	return ids
+
+#Function to get the apply table (predictors for every apply GDE) for a year
+#Sharded tables are read as one collection, and long tables are filtered to the year
+#yr can also be a list of years, which returns a single long collection of every GDE and year (each feature has a 'year' field)
+def getApplyTable(yr):
+	years = yr if isinstance(yr, (list, range)) else [yr]
+	ids = getApplyTableIds(years)
+	if len(ids) == 1:
+		table = ee.FeatureCollection(ids[0])
+	else:
+		table = ee.FeatureCollection([ee.FeatureCollection(i) for i in ids]).flatten()
+	if applyTableFormat == 'long':
+		if len(years) == 1:
+			table = table.filter(ee.Filter.eq('year', years[0]))
+		else:
+			table = table.filter(ee.Filter.rangeContains('year', min(years), max(years)))
+	return table
+
 ####################################################################################################
 #					Set Up for All SAGE Scripts
 ####################################################################################################
+#---------------------Trace blocking GEE calls if selected-------------------------
+if profileEECalls or os.environ.get('SAGE_PROFILE') == '1':
+	SAGE_Profiler.enable(outputJSON = profileOutputJSON)
+
 #---------------------Reset study area if it is a state name-------------------------
 states = ee.FeatureCollection('TIGER/2016/States')
-if studyArea in states.aggregate_histogram('NAME').getInfo():
+if studyArea in cachedGetInfo(states.aggregate_histogram('NAME'), []):
 	studyArea = ee.Feature(states\
             .filter(ee.Filter.eq('NAME',studyArea))\
             .first())\
@@ -0,0 +1,415 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to fit LandTrendr-style temporal segmentation locally to tables of annual values (e.g. one row per GDE)
+#Works on arrays of polygon x year (x band) values with numpy, fitting thousands of polygons at once,
+#and produces the same {band}_LT_fitted, _mag, _diff, _dur, and _slope outputs as the LandTrendr stacks
+#summarized in 4_ApplyTableExporter.py
+#
+#Follows the steps of ee.Algorithms.TemporalSegmentation.LandTrendr using the landtrendr_run_params in SAGE_Initialize:
+#	1. Series with fewer than minObservationsNeeded observations are not fit
+#	2. Spikes are dampened (spikeThreshold)
+#	3. Vertices are added where the series deviates most from the current segments until there are
+#	   maxSegments + 1 + vertexCountOvershoot, then the vertices that deviate least from the line between their neighbors are removed
+#	4. Models with maxSegments down to 1 segment are fit by least squares (continuous segments through the vertices)
+#	5. Vertices that make a fitted segment recover faster than allowed (recoveryThreshold, preventOneYearRecovery) are removed
+#	   and the model is refit
+#	6. Models with a p-value above pvalThreshold are discarded, and the model with the most segments whose p-value
+#	   is within (2 - bestModelProportion) of the best p-value is chosen (the 1 segment model if none qualify)
+#The Levenberg-Marquardt refit LandTrendr uses when no model passes pvalThreshold is not done here
+####################################################################################################
+#Module imports
+import argparse, json
+import numpy as np
+
+####################################################################################################
+#Outputs of each fit, named {band}_LT_{output}
+outputNames = ['fitted', 'mag', 'diff', 'dur', 'slope']
+
+#Number of polygons to fit at a time (memory use grows with chunkSize x years x years)
+defaultChunkSize = 5000
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to find the previous and next vertex (inclusive) of each year
+#Positions with no previous vertex are -1 and with no next vertex are the number of years
+def _vertexNeighbors(vertices):
+	nYears = vertices.shape[1]
+	idx = np.arange(nYears)
+	prevV = np.maximum.accumulate(np.where(vertices, idx, -1), axis = 1)
+	nextV = np.minimum.accumulate(np.where(vertices, idx, nYears)[:, ::-1], axis = 1)[:, ::-1]
+	return prevV, nextV
+
+#Function to get, for each year, the vertices before and after it and its weight toward the next vertex
+#Years outside of the first and last vertex are flagged as not inside
+def _interpolationWeights(x, vertices):
+	nYears = vertices.shape[1]
+	prevV, nextV = _vertexNeighbors(vertices)
+	inside = (prevV >= 0) & (nextV < nYears)
+	prevC = np.clip(prevV, 0, nYears - 1)
+	nextC = np.clip(nextV, 0, nYears - 1)
+	span = x[nextC] - x[prevC]
+	weight = np.where(span > 0, (x[np.newaxis, :] - x[prevC]) / np.where(span > 0, span, 1), 0.)
+	return prevC, nextC, weight, inside
+
+#Function to connect the values at the vertices with straight lines
+def _pointToPoint(x, y, vertices):
+	prevC, nextC, weight, inside = _interpolationWeights(x, vertices)
+	yPrev = np.take_along_axis(y, prevC, 1)
+	yNext = np.take_along_axis(y, nextC, 1)
+	return np.where(inside, yPrev + (yNext - yPrev) * weight, np.nan)
+
+#Function to fill years without an observation by linear interpolation between observed years
+#Years before the first or after the last observation take the nearest observation
+def _fillMissing(x, y, valid):
+	nYears = y.shape[1]
+	prevV, nextV = _vertexNeighbors(valid)
+	prevV = np.where(prevV < 0, nextV, prevV)
+	nextV = np.where(nextV >= nYears, prevV, nextV)
+	prevC = np.clip(prevV, 0, nYears - 1)
+	nextC = np.clip(nextV, 0, nYears - 1)
+	span = x[nextC] - x[prevC]
+	weight = np.where(span > 0, (x[np.newaxis, :] - x[prevC]) / np.where(span > 0, span, 1), 0.)
+	yPrev = np.take_along_axis(y, prevC, 1)
+	yNext = np.take_along_axis(y, nextC, 1)
+	return np.where(valid, y, yPrev + (yNext - yPrev) * weight)
+
+#Function to dampen spikes
+#A point is a spike if the difference between its neighbors is less than (1 - spikeThreshold) of its largest
+#difference from either neighbor. The largest spike in each series is replaced by the mean of its neighbors until none remain
+def despike(y, spikeThreshold):
+	y = np.array(y, dtype = float)
+	if spikeThreshold >= 1 or y.shape[1] < 3:
+		return y
+	rows = np.arange(y.shape[0])
+	for i in range(y.shape[1]):
+		left, mid, right = y[:, :-2], y[:, 1:-1], y[:, 2:]
+		neighborMean = (left + right) / 2.
+		deviation = np.maximum(np.abs(mid - left), np.abs(mid - right))
+		isSpike = (np.abs(right - left) < (1 - spikeThreshold) * deviation) & (deviation > 0)
+		score = np.where(isSpike, np.abs(mid - neighborMean), -1)
+		worst = np.argmax(score, axis = 1)
+		fix = score[rows, worst] > 0
+		if not fix.any():
+			break
+		y[rows[fix], worst[fix] + 1] = neighborMean[rows[fix], worst[fix]]
+	return y
+
+#Function to remove the interior vertex that deviates least from the line between its neighboring vertices from each selected series
+def _removeWeakestVertex(x, y, vertices, remove):
+	nYears = vertices.shape[1]
+	prevV, nextV = _vertexNeighbors(vertices)
+	prevExcl = np.concatenate([np.full((vertices.shape[0], 1), -1), prevV[:, :-1]], axis = 1)
+	nextExcl = np.concatenate([nextV[:, 1:], np.full((vertices.shape[0], 1), nYears)], axis = 1)
+	interior = vertices & (prevExcl >= 0) & (nextExcl < nYears)
+	prevC = np.clip(prevExcl, 0, nYears - 1)
+	nextC = np.clip(nextExcl, 0, nYears - 1)
+	yPrev = np.take_along_axis(y, prevC, 1)
+	yNext = np.take_along_axis(y, nextC, 1)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		line = yPrev + (yNext - yPrev) * (x[np.newaxis, :] - x[prevC]) / (x[nextC] - x[prevC])
+	deviation = np.where(interior & np.isfinite(line), np.abs(y - line), np.inf)
+	weakest = np.argmin(deviation, axis = 1)
+	rows = np.nonzero(remove & np.isfinite(deviation.min(axis = 1)))[0]
+	vertices = vertices.copy()
+	vertices[rows, weakest[rows]] = False
+	return vertices
+
+#Function to fit continuous straight segments through the vertices by least squares
+#Returns the value at each vertex (zero elsewhere) and the fitted series
+def _fitSegments(x, y, valid, vertices):
+	n, nYears = y.shape
+	prevC, nextC, weight, inside = _interpolationWeights(x, vertices)
+	rows = np.repeat(np.arange(n), nYears)
+	years = np.tile(np.arange(nYears), n)
+	design = np.zeros((n, nYears, nYears))
+	design[rows, years, prevC.ravel()] = ((1 - weight) * inside).ravel()
+	design[rows, years, nextC.ravel()] += (weight * inside).ravel()
+	weighted = design * valid[:, :, np.newaxis]
+	xtx = np.einsum('ntp,ntq->npq', weighted, weighted)
+	#Years that are not vertices have no parameter
+	xtx[:, np.arange(nYears), np.arange(nYears)] += ~vertices
+	xty = np.einsum('ntp,nt->np', weighted, np.where(valid, y, 0.))
+	coefficients = np.linalg.solve(xtx, xty[:, :, np.newaxis])[:, :, 0]
+	fitted = np.where(inside, np.einsum('ntp,np->nt', design, coefficients), np.nan)
+	return coefficients, fitted
+
+#Function to get the p-value of the F test of each fitted model against the mean of the series
+def _modelPValues(y, valid, fitted, nVertices):
+	from scipy.special import fdtrc
+	nObs = valid.sum(axis = 1)
+	yValid = np.where(valid, y, 0.)
+	mean = yValid.sum(axis = 1) / np.maximum(nObs, 1)
+	sst = (np.where(valid, y - mean[:, np.newaxis], 0.) ** 2).sum(axis = 1)
+	sse = (np.where(valid, y - np.nan_to_num(fitted), 0.) ** 2).sum(axis = 1)
+	dfModel = nVertices - 1
+	dfError = nObs - nVertices
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		f = ((sst - sse) / np.maximum(dfModel, 1)) / (sse / np.maximum(dfError, 1))
+		pValue = fdtrc(np.maximum(dfModel, 1), np.maximum(dfError, 1), f)
+	pValue = np.where(sse <= 1e-12 * np.maximum(sst, 1e-12), 0., pValue)
+	return np.where((dfError > 0) & (sst > 0), pValue, 1.)
+
+#Function to find models whose segments recover faster than allowed
+#changeDir is the direction the index goes when vegetation vigor goes down (as in getImagesLib.changeDirDict), so
+#recoveries are segments that go the other way
+#Returns the vertices that end a segment recovering too fast
+def _recoveryViolations(x, coefficients, vertices, dataRange, changeDir, runParams):
+	nYears = vertices.shape[1]
+	prevV, nextV = _vertexNeighbors(vertices)
+	prevExcl = np.concatenate([np.full((vertices.shape[0], 1), -1), prevV[:, :-1]], axis = 1)
+	hasPrev = vertices & (prevExcl >= 0)
+	prevC = np.clip(prevExcl, 0, nYears - 1)
+	delta = (coefficients - np.take_along_axis(coefficients, prevC, 1)) * changeDir
+	duration = x[np.newaxis, :] - x[prevC]
+	recovery = hasPrev & (delta < 0)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		rate = (-delta / dataRange[:, np.newaxis]) / duration
+	bad = recovery & (rate > runParams.get('recoveryThreshold', 1.))
+	if runParams.get('preventOneYearRecovery', False):
+		bad = bad | (recovery & (duration <= 1))
+	return bad
+
+#Function to refit without the offending vertices until no fitted segment recovers faster than allowed
+#The vertex ending the first offending segment is removed (or the one starting it if it is the last vertex)
+#Series that are down to one segment are left as they are
+def _fitWithoutRecoveryViolations(x, y, valid, vertices, dataRange, changeDir, runParams):
+	nYears = vertices.shape[1]
+	rows = np.arange(vertices.shape[0])
+	vertices = vertices.copy()
+	for i in range(nYears):
+		coefficients, fitted = _fitSegments(x, y, valid, vertices)
+		bad = _recoveryViolations(x, coefficients, vertices, dataRange, changeDir, runParams) & (vertices.sum(axis = 1) > 2)[:, np.newaxis]
+		fix = bad.any(axis = 1)
+		if not fix.any():
+			break
+		first = np.argmax(bad, axis = 1)
+		prevV, nextV = _vertexNeighbors(vertices)
+		isLast = np.concatenate([nextV[:, 1:], np.full((vertices.shape[0], 1), nYears)], axis = 1)[rows, first] >= nYears
+		prevOfFirst = np.concatenate([np.full((vertices.shape[0], 1), -1), prevV[:, :-1]], axis = 1)[rows, first]
+		remove = np.where(isLast, prevOfFirst, first)
+		vertices[rows[fix], remove[fix]] = False
+	return vertices, coefficients, fitted
+
+#Function to get the annual outputs of a fitted model
+#Each year takes the segment that ends in it (the first year takes the first segment)
+def _annualOutputs(x, coefficients, vertices, validSeries):
+	n, nYears = vertices.shape
+	prevV, nextV = _vertexNeighbors(vertices)
+	prevExcl = np.concatenate([np.full((n, 1), -1), prevV[:, :-1]], axis = 1)
+	nextExcl = np.concatenate([nextV[:, 1:], np.full((n, 1), nYears)], axis = 1)
+	isFirst = vertices & (prevExcl < 0)
+	segStart = np.where(isFirst, np.arange(nYears)[np.newaxis, :], prevExcl)
+	segEnd = np.where(isFirst, nextExcl, nextV)
+	inside = (segStart >= 0) & (segEnd < nYears) & (prevV >= 0) & validSeries[:, np.newaxis]
+	startC = np.clip(segStart, 0, nYears - 1)
+	endC = np.clip(segEnd, 0, nYears - 1)
+
+	startFit = np.take_along_axis(coefficients, startC, 1)
+	endFit = np.take_along_axis(coefficients, endC, 1)
+	dur = x[endC] - x[startC]
+	mag = endFit - startFit
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		slope = np.where(dur > 0, mag / dur, 0.)
+	fitted = startFit + slope * (x[np.newaxis, :] - x[startC])
+	diff = np.concatenate([np.zeros((n, 1)), fitted[:, 1:] - fitted[:, :-1]], axis = 1)
+	diff = np.where(np.concatenate([np.zeros((n, 1), dtype = bool), inside[:, :-1]], axis = 1), diff, 0.)
+
+	out = {'fitted': fitted, 'mag': mag, 'diff': diff, 'dur': dur.astype(float), 'slope': slope}
+	return dict((k, np.where(inside, v, np.nan)) for k, v in out.items())
+
+#Function to fit a chunk of series of a single band
+def _fitChunk(x, values, runParams, changeDir):
+	values = np.asarray(values, dtype = float)
+	valid = np.isfinite(values)
+	nObs = valid.sum(axis = 1)
+	validSeries = nObs >= max(runParams.get('minObservationsNeeded', 6), 2)
+	valid = valid & validSeries[:, np.newaxis]
+
+	y = _fillMissing(x, np.where(valid, values, 0.), valid)
+	y = np.where(validSeries[:, np.newaxis], y, 0.)
+	y = despike(y, runParams.get('spikeThreshold', 0.9))
+
+	#Range of the values, for recovery rates
+	yMin = np.where(valid, y, np.inf).min(axis = 1)
+	yMax = np.where(valid, y, -np.inf).max(axis = 1)
+	dataRange = np.where(validSeries & (yMax > yMin), yMax - yMin, 1.)
+
+	#Start with the first and last observations as vertices
+	maxSegments = runParams.get('maxSegments', 6)
+	prevV, nextV = _vertexNeighbors(valid)
+	vertices = np.zeros(y.shape, dtype = bool)
+	rows = np.nonzero(validSeries)[0]
+	vertices[rows, nextV[rows, 0]] = True
+	vertices[rows, prevV[rows, -1]] = True
+
+	#Add vertices where the series deviates most from the current segments
+	for i in range(maxSegments - 1 + runParams.get('vertexCountOvershoot', 3)):
+		deviation = np.abs(y - _pointToPoint(x, y, vertices))
+		deviation = np.where(valid & ~vertices & np.isfinite(deviation), deviation, -1)
+		largest = np.argmax(deviation, axis = 1)
+		add = np.nonzero(deviation[np.arange(y.shape[0]), largest] > 0)[0]
+		if len(add) == 0:
+			break
+		vertices[add, largest[add]] = True
+
+	#Remove the weakest vertices until there are maxSegments + 1
+	while True:
+		remove = vertices.sum(axis = 1) > maxSegments + 1
+		if not remove.any():
+			break
+		vertices = _removeWeakestVertex(x, y, vertices, remove)
+
+	#Fit models from maxSegments down to 1 segment and keep the best
+	chosen = np.zeros(y.shape[0], dtype = bool)
+	bestCoefficients = np.zeros(y.shape)
+	bestVertices = vertices.copy()
+	models = []
+	for nSegments in range(maxSegments, 0, -1):
+		vertices, coefficients, fitted = _fitWithoutRecoveryViolations(x, y, valid, vertices, dataRange, changeDir, runParams)
+		nVertices = vertices.sum(axis = 1)
+		pValue = _modelPValues(y, valid, fitted, nVertices)
+		allowed = ~_recoveryViolations(x, coefficients, vertices, dataRange, changeDir, runParams).any(axis = 1) | (nVertices <= 2)
+		allowed = allowed & (pValue <= runParams.get('pvalThreshold', 0.05))
+		models.append([vertices, coefficients, np.where(allowed, pValue, np.inf)])
+		vertices = _removeWeakestVertex(x, y, vertices, vertices.sum(axis = 1) > nSegments)
+
+	bestP = np.min([m[2] for m in models], axis = 0)
+	cutoff = bestP * (2 - runParams.get('bestModelProportion', 0.75))
+	for modelVertices, coefficients, pValue in models:
+		pick = ~chosen & np.isfinite(pValue) & (pValue <= cutoff)
+		bestVertices[pick] = modelVertices[pick]
+		bestCoefficients[pick] = coefficients[pick]
+		chosen = chosen | pick
+
+	#Fall back on the simplest model if none qualify
+	simplest = ~chosen
+	bestVertices[simplest] = models[-1][0][simplest]
+	bestCoefficients[simplest] = models[-1][1][simplest]
+
+	return _annualOutputs(x, bestCoefficients, bestVertices, validSeries)
+
+#Function to fit LandTrendr-style segments to a polygon x year array of a single band
+#Missing values should be NaN. Returns a dictionary of polygon x year arrays for each of outputNames
+def fitArray(values, years, runParams, changeDir = 1, chunkSize = defaultChunkSize):
+	values = np.asarray(values, dtype = float)
+	x = np.asarray(years, dtype = float)
+	out = dict((name, np.full(values.shape, np.nan)) for name in outputNames)
+	for start in range(0, values.shape[0], chunkSize):
+		chunk = _fitChunk(x, values[start:start + chunkSize], runParams, changeDir)
+		for name in outputNames:
+			out[name][start:start + chunkSize] = chunk[name]
+	return out
+
+#Function to fit a polygon x year x band array
+#changeDirs: direction of each band (as in getImagesLib.changeDirDict). Bands that are not listed use 1
+#multipliers: number to multiply each band's fitted, magnitude, difference, and slope by, e.g. sage.multDict to match
+#the scaled LandTrendr stacks summarized in the apply tables. Bands that are not listed are not scaled.
+#Returns a dictionary of polygon x year arrays named {band}_LT_{output}
+def fitCube(cube, years, bands, runParams, changeDirs = {}, multipliers = {}, outputs = outputNames, chunkSize = defaultChunkSize):
+	out = {}
+	for b, band in enumerate(bands):
+		fits = fitArray(cube[:, :, b], years, runParams, changeDirs.get(band, 1), chunkSize)
+		for name in outputs:
+			scale = multipliers.get(band, 1) if name != 'dur' else 1
+			out['{}_LT_{}'.format(band, name)] = fits[name] * scale
+	return out
+
+#Function to convert a wide table (one row per polygon with a column for each band and year, e.g. the table from 2b_ClimateTableExporter.py)
+#to a polygon x year x band array
+#nameFormat gives the column name of a band and year
+def wideTableToCube(df, idField, bands, years, nameFormat = '{band}_{year}'):
+	cube = np.full((len(df), len(years), len(bands)), np.nan)
+	for b, band in enumerate(bands):
+		for y, yr in enumerate(years):
+			column = nameFormat.format(band = band, year = yr)
+			if column in df.columns:
+				cube[:, y, b] = df[column].astype(float).values
+	return df[idField].values, cube
+
+#Function to convert a long table (one row per polygon and year, e.g. the apply tables) to a polygon x year x band array
+def longTableToCube(df, idField, bands, years, yearField = 'year'):
+	ids = np.unique(df[idField].values)
+	cube = np.full((len(ids), len(years), len(bands)), np.nan)
+	rows = np.searchsorted(ids, df[idField].values)
+	yearIndex = dict((yr, y) for y, yr in enumerate(years))
+	cols = np.array([yearIndex.get(yr, -1) for yr in df[yearField].values])
+	keep = cols >= 0
+	for b, band in enumerate(bands):
+		cube[rows[keep], cols[keep], b] = df[band].astype(float).values[keep]
+	return ids, cube
+
+#Function to convert fitted arrays to a long table with one row per polygon and year
+def fitsToLongTable(ids, years, fits, idField, yearField = 'year'):
+	import pandas as pd
+	out = pd.DataFrame({idField: np.repeat(ids, len(years)), yearField: np.tile(years, len(ids))})
+	for name, values in fits.items():
+		out[name] = values.ravel()
+	return out
+
+#Function to fit every band of a wide or long table and return a long table of the fitted outputs
+def fitTable(df, idField, bands, years, runParams, wide = True, nameFormat = '{band}_{year}', yearField = 'year',
+	changeDirs = {}, multipliers = {}, outputs = outputNames, chunkSize = defaultChunkSize):
+	years = list(years)
+	if wide:
+		ids, cube = wideTableToCube(df, idField, bands, years, nameFormat)
+	else:
+		ids, cube = longTableToCube(df, idField, bands, years, yearField)
+	fits = fitCube(cube, years, bands, runParams, changeDirs, multipliers, outputs, chunkSize)
+	return fitsToLongTable(ids, years, fits, idField, yearField)
+
+####################################################################################################
+#Fit a table from the command line, e.g.
+#python SAGE_LocalLandTrendr.py Daymet-Table.csv Daymet-Fits.csv --bands prcp_mean tmin_mean --years 1985 2021 --changeDir prcp_mean=-1
+if __name__ == '__main__':
+	import pandas as pd
+	from SAGE_LocalTables import readSettings
+	parser = argparse.ArgumentParser(description = 'Fit LandTrendr-style segments to the annual values in a table')
+	parser.add_argument('input', help = 'Input csv or parquet table')
+	parser.add_argument('output', help = 'Output csv or parquet table (one row per polygon and year)')
+	parser.add_argument('--bands', nargs = '+', required = True, help = 'Bands (indices) to fit')
+	parser.add_argument('--years', nargs = 2, type = int, required = True, help = 'First and last year')
+	parser.add_argument('--id', default = 'POLYGON_ID', help = 'Polygon id field')
+	parser.add_argument('--long', action = 'store_true', help = 'Input has one row per polygon and year (with a year field) instead of a column per band and year')
+	parser.add_argument('--nameFormat', default = '{band}_{year}', help = 'Column names of a wide input table')
+	parser.add_argument('--changeDir', nargs = '*', default = [], help = 'band=direction pairs (default 1)')
+	parser.add_argument('--params', help = 'Json file of LandTrendr run parameters (default: landtrendr_run_params in SAGE_Initialize)')
+	parser.add_argument('--scale', action = 'store_true', help = 'Multiply outputs by multDict in SAGE_Initialize to match the exported LandTrendr stacks')
+	args = parser.parse_args()
+
+	settings = readSettings(['landtrendr_run_params', 'multDict'])
+	runParams = json.load(open(args.params)) if args.params else settings['landtrendr_run_params']
+	multipliers = settings['multDict'] if args.scale else {}
+	changeDirs = dict((i.split('=')[0], float(i.split('=')[1])) for i in args.changeDir)
+
+	df = pd.read_parquet(args.input) if args.input.endswith('.parquet') else pd.read_csv(args.input)
+	out = fitTable(df, args.id, args.bands, range(args.years[0], args.years[1] + 1), runParams, not args.long, args.nameFormat,
+		changeDirs = changeDirs, multipliers = multipliers)
+	if args.output.endswith('.parquet'):
+		out.to_parquet(args.output, index = False)
+	else:
+		out.to_csv(args.output, index = False)
+	print('Wrote {} rows to {}'.format(len(out), args.output))
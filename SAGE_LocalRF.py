@@ -0,0 +1,176 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to fit and apply the random forest model of 6_ModelFitApply.py locally on all cores with scikit-learn
+#Trains a regression forest on the training table with the randomForestParameters in SAGE_Initialize,
+#predicts every GDE and year of the apply tables in one batched pass, and writes one prediction table per year
+#with the fields 8_TrendSummaries.py reads (apply table fields, matchesN, matchesReduced, and modeled_DGW)
+#
+#The training and apply tables are csv or parquet downloads (e.g. the output of SAGE_LocalTables.py and
+#the apply tables from 4_ApplyTableExporter.py). smileRandomForest settings are mapped to scikit-learn as:
+#	numberOfTrees -> n_estimators
+#	variablesPerSplit -> max_features (square root of the number of predictors if None)
+#	minLeafPopulation -> min_samples_leaf
+#	bagFraction -> max_samples (scikit-learn bags with replacement, smile without)
+#	maxNodes -> max_leaf_nodes
+#	seed -> random_state
+#Forests are not identical to the GEE ones, so predictions differ slightly from a 6_ModelFitApply.py run
+####################################################################################################
+#Module imports
+import argparse, json, os
+import numpy as np
+import pandas as pd
+from SAGE_LocalTables import readTables, writeTable, readSettings
+
+####################################################################################################
+#Field of the response in the training table and of the predictions in the output
+responseField = 'dgw'
+predictionField = 'modeled_DGW'
+
+#Value of matchesReduced for GDEs and years with no training observations (as in innerOuterJoin in SAGE_Initialize)
+noMatchValue = -9999
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to find the predictor fields of a table from a list of selectors (field names or regular expressions, as in ee select)
+def selectPredictors(columns, selectors):
+	import re
+	out = []
+	for selector in selectors:
+		out.extend([c for c in columns if re.fullmatch(selector, c) and c not in out and c != 'system:index'])
+	return out
+
+#Function to convert smileRandomForest parameters to scikit-learn RandomForestRegressor arguments
+def getForestParameters(rfParams, nPredictors, nJobs = -1):
+	variablesPerSplit = rfParams.get('variablesPerSplit')
+	bagFraction = rfParams.get('bagFraction', 0.5)
+	return {\
+		'n_estimators': rfParams.get('numberOfTrees', 100),
+		'max_features': variablesPerSplit if variablesPerSplit != None else max(1, int(np.sqrt(nPredictors))),
+		'min_samples_leaf': rfParams.get('minLeafPopulation', 1),
+		'max_samples': bagFraction if bagFraction < 1 else None,
+		'max_leaf_nodes': rfParams.get('maxNodes'),
+		'random_state': rfParams.get('seed', 0),
+		'bootstrap': True,
+		'oob_score': True,
+		'n_jobs': nJobs}
+
+#Function to fit a regression forest to the rows of the training table with all predictors
+def fitForest(trainingTable, predictorFields, rfParams, nJobs = -1):
+	from sklearn.ensemble import RandomForestRegressor
+	trainingTable = trainingTable.dropna(subset = predictorFields + [responseField])
+	model = RandomForestRegressor(**getForestParameters(rfParams, len(predictorFields), nJobs))
+	y = trainingTable[responseField].values
+	model.fit(trainingTable[predictorFields].values.astype(np.float32), y)
+	model.predictorFields = list(predictorFields)
+	model.outOfBagErrorEstimate = float(np.sqrt(np.mean((model.oob_prediction_ - y)**2)))
+	return model
+
+#Function to get information about a fitted forest in the same form as rfModel.explain() in 6_ModelFitApply.py
+#Importance is scikit-learn's (normalized to sum to 1) and the out of bag error is the RMSE of the out of bag predictions
+def getModelInfo(model):
+	return {\
+		'numberOfTrees': len(model.estimators_),
+		'outOfBagErrorEstimate': model.outOfBagErrorEstimate,
+		'importance': dict(zip(model.predictorFields, [float(i) for i in model.feature_importances_]))}
+
+#Function to save model info to json and plot the variable importance next to it (as in 6_ModelFitApply.py)
+def saveModelInfo(modelInfo, outputInfo):
+	o = open(outputInfo, 'w')
+	o.write(json.dumps(modelInfo))
+	o.close()
+
+	from SAGE_ModelRegistry import saveImportancePlot
+	saveImportancePlot(modelInfo, os.path.splitext(outputInfo)[0] + '_importance.png')
+
+#Function to add the number and mean of the training observations of each GDE and year (matchesN and matchesReduced)
+def addMatches(applyTable, trainingTable, gdeIdName):
+	keys = [gdeIdName, 'year']
+	matches = trainingTable.groupby(keys)[responseField].agg(['count', 'mean']).rename(columns = {'count': 'matchesN', 'mean': 'matchesReduced'})
+	out = applyTable.drop(columns = [c for c in ['matchesN', 'matchesReduced'] if c in applyTable.columns]).merge(matches, left_on = keys, right_index = True, how = 'left')
+	out['matchesN'] = out['matchesN'].fillna(0).astype(int)
+	out['matchesReduced'] = out['matchesReduced'].fillna(noMatchValue)
+	return out
+
+#Function to predict DGW for every GDE and year of the apply tables in one pass
+#Rows with a missing predictor are dropped, as in 6_ModelFitApply.py
+def applyForest(model, applyTable, trainingTable, gdeIdName):
+	out = addMatches(applyTable, trainingTable, gdeIdName).dropna(subset = model.predictorFields)
+	out[predictionField] = model.predict(out[model.predictorFields].values.astype(np.float32))
+	return out
+
+#Function to write one prediction table per year, named like the tables 6_ModelFitApply.py exports (e.g. Pred_Table_sage-test_1985.csv)
+def writePredictionTables(predictions, outputDir, predTableNameStart, runName, fileFormat = 'csv'):
+	if not os.path.exists(outputDir):
+		os.makedirs(outputDir)
+	paths = []
+	for yr, table in predictions.groupby('year'):
+		path = os.path.join(outputDir, '{}_{}_{}.{}'.format(predTableNameStart, runName, yr, fileFormat))
+		writeTable(table, path)
+		paths.append(path)
+	return paths
+
+#Function to fit, describe, and apply a model for one run
+def runModel(trainingTable, applyTable, runName, selectors, rfParams, gdeIdName, outputDir, modelInfoDir, predTableNameStart,
+	years = None, nJobs = -1, fileFormat = 'csv'):
+	predictorFields = selectPredictors(trainingTable.columns, selectors)
+	print('Fitting {} trees for {} with {} predictors'.format(rfParams.get('numberOfTrees'), runName, len(predictorFields)))
+	model = fitForest(trainingTable, predictorFields, rfParams, nJobs)
+
+	modelInfo = getModelInfo(model)
+	if modelInfoDir != None:
+		saveModelInfo(modelInfo, os.path.join(modelInfoDir, 'dgwRFModelInfo-{}-local.json'.format(runName)))
+	print('Model info:', modelInfo)
+
+	if years != None:
+		applyTable = applyTable[applyTable['year'].isin(list(years))]
+	predictions = applyForest(model, applyTable, trainingTable, gdeIdName)
+	paths = writePredictionTables(predictions, outputDir, predTableNameStart, runName, fileFormat)
+	print('Wrote {} predictions to {} tables in {}'.format(len(predictions), len(paths), outputDir))
+	return model, modelInfo, predictions
+
+####################################################################################################
+#Fit and apply the model runs in SAGE_Initialize from the command line, e.g.
+#python SAGE_LocalRF.py Training_Table.csv "Apply_Table_*.csv"
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Fit and apply the random forest model locally with scikit-learn')
+	parser.add_argument('trainingTable', help = 'Training table csv or parquet (e.g. from SAGE_LocalTables.py)')
+	parser.add_argument('applyTables', nargs = '+', help = 'Apply table csv or parquet files (glob patterns are expanded)')
+	parser.add_argument('--outputDir', help = 'Folder for the prediction tables (default: table_dir in SAGE_Initialize, which 8_TrendSummaries.py reads)')
+	parser.add_argument('--runs', nargs = '*', help = 'Names of the modelRuns in SAGE_Initialize to run (default: all)')
+	parser.add_argument('--jobs', type = int, default = -1, help = 'Number of cores to use (default: all)')
+	parser.add_argument('--parquet', action = 'store_true', help = 'Write parquet instead of csv prediction tables')
+	args = parser.parse_args()
+
+	sage = readSettings()
+	trainingTable = readTables(args.trainingTable)
+	applyTable = readTables(args.applyTables)
+	for runName, selectors in sage['modelRuns']:
+		if args.runs and runName not in args.runs:
+			continue
+		runModel(trainingTable, applyTable, runName, selectors, sage['randomForestParameters'], sage['gdeIdName'],
+			args.outputDir or sage['table_dir'], sage['outputLocalRFModelInfoDir'], sage['predTableNameStart'],
+			range(sage['startApplyYear'], sage['endApplyYear'] + 1), args.jobs, 'parquet' if args.parquet else 'csv')
@@ -0,0 +1,164 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to build the training table locally from downloaded tables (csv or parquet) instead of through GEE assets
+#Does the same filters, unpivot (melt) of the annual DGW fields, and join on GDE ID and year as 5_TrainingTableExporter.py
+#with pandas, so the output has the same rows and fields as the exported training table
+#
+#Inputs:
+#	Training GDEs: one row per GDE / well with the annual DGW fields ({annualDGWField}{year}, e.g. Depth1985)
+#	Apply tables: the tables from 4_ApplyTableExporter.py (annual, long, or shards of either), which all have a year field
+####################################################################################################
+#Module imports
+import argparse, ast, glob, json, os
+import numpy as np
+import pandas as pd
+
+####################################################################################################
+#Settings from SAGE_Initialize used to build the training table
+settingNames = ['startTrainingYear', 'endTrainingYear', 'annualDGWField', 'gdeIdName', 'wellIdName',
+	'dgwNullValue', 'minDGW', 'maxDGW', 'minGDESize', 'gdeSizeAttribute', 'filterWellTypeByAttributeOrValue',
+	'wellDepthAttribute', 'wellDepthFilterName', 'wellDepthMin', 'wellDepthMax']
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Functions that settings in SAGE_Initialize.py may use when they are read with readSettings
+settingFunctions = {'min': min, 'max': max, 'range': range, 'len': len, 'int': int, 'float': float, 'str': str, 'round': round, 'list': list, 'dict': dict}
+
+#Function to read settings from SAGE_Initialize.py without importing it (importing it initializes Earth Engine and checks assets)
+#Top level assignments (and those in top level if statements) are evaluated in order with only the settings read before them
+#(e.g. modelRuns uses runname and predictors), so settings that need other modules (e.g. ee or os) are left out
+#Returns all settings that could be read if names is None
+def readSettings(names = None, path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SAGE_Initialize.py')):
+	settings = {}
+	def evaluate(node):
+		return eval(compile(ast.Expression(node), path, 'eval'), {'__builtins__': settingFunctions}, dict(settings))
+	def readStatements(statements):
+		for node in statements:
+			if isinstance(node, ast.If):
+				try:
+					readStatements(node.body if evaluate(node.test) else node.orelse)
+				except Exception:
+					pass
+			elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) for t in node.targets):
+				names = [t.id for t in node.targets]
+				try:
+					value = evaluate(node.value)
+				except Exception:
+					for name in names:
+						settings.pop(name, None)
+					continue
+				for name in names:
+					settings[name] = value
+	readStatements(ast.parse(open(path).read()).body)
+	if names == None:
+		return settings
+	return dict((n, settings[n]) for n in names if n in settings)
+
+#Function to get the training table settings from SAGE_Initialize
+def getSettings():
+	return readSettings(settingNames)
+
+#Function to read one or more csv or parquet tables (paths can be glob patterns) into one table
+def readTables(paths):
+	if isinstance(paths, str):
+		paths = [paths]
+	files = []
+	for path in paths:
+		files.extend(sorted(glob.glob(path)) or [path])
+	tables = [pd.read_parquet(f) if f.endswith('.parquet') else pd.read_csv(f) for f in files]
+	return tables[0] if len(tables) == 1 else pd.concat(tables, ignore_index = True)
+
+#Function to write a table to csv or parquet
+def writeTable(df, path):
+	if path.endswith('.parquet'):
+		df.to_parquet(path, index = False)
+	else:
+		df.to_csv(path, index = False)
+
+#Function to filter the training GDEs by size and well type
+def filterTrainingGDEs(trainingGDEs, settings):
+	s = settings
+	keep = trainingGDEs[s['gdeSizeAttribute']] >= s['minGDESize']
+	if s['filterWellTypeByAttributeOrValue'] == 'attribute':
+		keep &= trainingGDEs[s['wellDepthAttribute']].astype(str).str.contains(s['wellDepthFilterName'], regex = False)
+	elif s['filterWellTypeByAttributeOrValue'] == 'value':
+		depth = trainingGDEs[s['wellDepthAttribute']]
+		keep &= (depth > s['wellDepthMin']) & (depth < s['wellDepthMax'])
+	return trainingGDEs[keep.fillna(False).values]
+
+#Function to unpivot the annual DGW fields into one row per GDE / well and year (gde, well, year, dgw)
+#and drop null, too shallow, and too deep values
+def unpivotDGW(trainingGDEs, settings, years = None):
+	s = settings
+	if years == None:
+		years = range(s['startTrainingYear'], s['endTrainingYear'] + 1)
+	fields = dict(('{}{}'.format(s['annualDGWField'], yr), yr) for yr in years)
+	fields = dict((k, v) for k, v in fields.items() if k in trainingGDEs.columns)
+	rows = trainingGDEs[[s['gdeIdName'], s['wellIdName']] + list(fields.keys())].melt(\
+		id_vars = [s['gdeIdName'], s['wellIdName']], var_name = 'year', value_name = 'dgw')
+	rows['year'] = rows['year'].map(fields).astype(int)
+	rows = rows[rows['dgw'].notnull()]
+
+	#DGW is cast to float (32 bit) before it is filtered, as in 5_TrainingTableExporter.py
+	rows['dgw'] = rows['dgw'].astype(np.float32)
+	rows = rows[(rows['dgw'] != s['dgwNullValue']) & (rows['dgw'] <= s['maxDGW']) & (rows['dgw'] >= s['minDGW'])]
+	return rows.reset_index(drop = True)
+
+#Function to join the training rows to the apply tables on GDE ID and year
+#Like joinFeatureCollectionsReverse, each row gets all fields (and geometry) of the matching apply table row,
+#with the training fields taking precedence
+def joinApplyTable(rows, applyTable, settings):
+	keys = [settings['gdeIdName'], 'year']
+	applyTable = applyTable.drop(columns = [c for c in rows.columns if c in applyTable.columns and c not in keys])
+	out = rows.merge(applyTable, on = keys, how = 'inner')
+	return out[list(applyTable.columns) + [c for c in rows.columns if c not in keys]]
+
+#Function to build the training table from the training GDE and apply tables
+def buildTrainingTable(trainingGDEs, applyTable, settings = None, years = None):
+	if settings == None:
+		settings = getSettings()
+	rows = unpivotDGW(filterTrainingGDEs(trainingGDEs, settings), settings, years)
+	years = sorted(rows['year'].unique())
+	applyTable = applyTable[applyTable['year'].isin(years)]
+	out = joinApplyTable(rows, applyTable, settings)
+	return out.sort_values(['year', settings['gdeIdName'], settings['wellIdName']]).reset_index(drop = True)
+
+####################################################################################################
+#Build a training table from the command line, e.g.
+#python SAGE_LocalTables.py Training_GDEs.csv "Apply_Table_*.csv" Training_Table.csv
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Build the training table locally from the training GDEs and apply tables')
+	parser.add_argument('trainingGDEs', help = 'Training GDE csv or parquet table (with the annual DGW fields)')
+	parser.add_argument('applyTables', nargs = '+', help = 'Apply table csv or parquet files (glob patterns are expanded)')
+	parser.add_argument('output', help = 'Output csv or parquet training table')
+	parser.add_argument('--settings', help = 'Json file of settings (default: read from SAGE_Initialize.py). Names: ' + ', '.join(settingNames))
+	args = parser.parse_args()
+
+	settings = json.load(open(args.settings)) if args.settings else getSettings()
+	out = buildTrainingTable(readTables(args.trainingGDEs), readTables(args.applyTables), settings)
+	writeTable(out, args.output)
+	print('Wrote {} training rows ({} GDEs, {} wells) to {}'.format(len(out), out[settings['gdeIdName']].nunique(), out[settings['wellIdName']].nunique(), args.output))
@@ -0,0 +1,125 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to keep trained random forest models on disk so unchanged model runs are not trained again
+#Each model is keyed by a fingerprint of what it was trained from: the version of the training table asset,
+#the predictor fields, the random forest parameters, and the response field
+#Each entry is a folder with the explain() output of the model (including its trees), the settings it was trained with,
+#and its variable importance plot. A model is rebuilt from its trees with ee.Classifier.decisionTreeEnsemble.
+####################################################################################################
+#Module imports
+import hashlib, json, os, shutil, time
+import ee
+import SAGE_Cache
+
+####################################################################################################
+#Files in each registry entry
+modelInfoName = 'modelInfo.json'
+settingsName = 'settings.json'
+importancePlotName = 'importance.png'
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to get the settings a model is trained from
+#The training table version is the update time of the asset, so re-exporting the training table gives new keys
+def getModelSettings(trainingTablePath, predictorFields, rfParams, responseField = 'dgw', outputMode = 'REGRESSION'):
+	return {\
+		'trainingTable': trainingTablePath,
+		'trainingTableVersion': SAGE_Cache.getAssetVersion(trainingTablePath),
+		'predictorFields': list(predictorFields),
+		'randomForestParameters': rfParams,
+		'responseField': responseField,
+		'outputMode': outputMode}
+
+#Function to get the key of a model from its settings (None if the training table version is unknown, so it is never reused)
+def getModelKey(settings):
+	if settings.get('trainingTableVersion') in [None, '']:
+		return None
+	return hashlib.sha256(json.dumps(settings, sort_keys = True).encode('utf-8')).hexdigest()[:16]
+
+#Function to read the explain() output of a registered model (None if it is not registered)
+def loadModelInfo(registryDir, key):
+	if key == None:
+		return None
+	path = os.path.join(registryDir, key, modelInfoName)
+	try:
+		return json.load(open(path))
+	except (IOError, OSError, ValueError):
+		return None
+
+#Function to plot the variable importance of a model
+def saveImportancePlot(modelInfo, outputPNG):
+	import matplotlib.pyplot as plt
+	importance = {k: v for k, v in sorted(modelInfo['importance'].items(), key = lambda item: item[1])}
+	fig = plt.figure()
+	plt.bar(importance.keys(), importance.values())
+	plt.xticks(rotation = 60, fontsize = 10, ha = 'right')
+	plt.title('Variable Importance | OOB Error: {}'.format(round(modelInfo['outOfBagErrorEstimate'], 2)))
+	fig.savefig(outputPNG)
+	plt.close()
+
+#Function to register a model from its explain() output and settings
+#Files are written to a temp folder first so an interrupted run never leaves a partial entry
+def saveModel(registryDir, key, modelInfo, settings):
+	if key == None:
+		return None
+	entryDir = os.path.join(registryDir, key)
+	tempDir = entryDir + '.tmp'
+	if os.path.exists(tempDir):
+		shutil.rmtree(tempDir)
+	os.makedirs(tempDir)
+	for name, obj in [[modelInfoName, modelInfo], [settingsName, dict(settings, created = time.time())]]:
+		o = open(os.path.join(tempDir, name), 'w')
+		o.write(json.dumps(obj))
+		o.close()
+	saveImportancePlot(modelInfo, os.path.join(tempDir, importancePlotName))
+	if os.path.exists(entryDir):
+		shutil.rmtree(entryDir)
+	os.replace(tempDir, entryDir)
+	return entryDir
+
+#Function to rebuild a trained classifier from the trees of its explain() output
+def getClassifier(modelInfo, outputMode = 'REGRESSION'):
+	return ee.Classifier.decisionTreeEnsemble(modelInfo['trees']).setOutputMode(outputMode)
+
+#Function to copy the explain() output and importance plot of a registered model to other files (e.g. the per run model info in outputLocalRFModelInfoDir)
+def exportModelInfo(registryDir, key, outputInfo):
+	entryDir = os.path.join(registryDir, key)
+	shutil.copyfile(os.path.join(entryDir, modelInfoName), outputInfo)
+	shutil.copyfile(os.path.join(entryDir, importancePlotName), os.path.splitext(outputInfo)[0] + '_importance.png')
+
+#Function to list registered models with their settings, newest first
+def listModels(registryDir):
+	out = []
+	if not os.path.exists(registryDir):
+		return out
+	for key in os.listdir(registryDir):
+		try:
+			settings = json.load(open(os.path.join(registryDir, key, settingsName)))
+		except (IOError, OSError, ValueError):
+			continue
+		out.append(dict(settings, key = key))
+	return sorted(out, key = lambda s: s.get('created', 0), reverse = True)
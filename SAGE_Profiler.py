@@ -0,0 +1,162 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to trace blocking (synchronous) GEE round trips made by the SAGE scripts
+#Wraps the ee.data calls that every .getInfo(), asset listing, and task listing goes through,
+#records the call site, request/response payload size, and latency of each call,
+#and prints a ranked hotspot report when the script exits
+####################################################################################################
+#Module imports
+import atexit, json, os, sys, threading, time, traceback
+import ee
+
+####################################################################################################
+#Blocking ee.data calls to trace
+#ee.ComputedObject.getInfo() goes through ee.data.computeValue
+tracedCalls = ['computeValue', 'getInfo', 'getList', 'listAssets', 'getAsset', 'getTaskList', 'getTaskStatus']
+
+#Files whose frames should not be reported as call sites
+#(ee may be the installed package or a single-file stand-in such as SAGE_FakeEE)
+_skipDirs = [os.path.abspath(p) for p in getattr(ee, '__path__', [])] + [os.path.dirname(os.path.abspath(threading.__file__))]
+_skipFiles = [os.path.abspath(__file__), os.path.abspath(ee.__file__)]
+
+records = []
+_originals = {}
+_state = threading.local()
+_lock = threading.Lock()
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to find the first frame outside of the ee package and this module
+def getCallSite():
+	for frame in reversed(traceback.extract_stack()):
+		fileName = os.path.abspath(frame.filename)
+		if fileName in _skipFiles or any(fileName.startswith(d) for d in _skipDirs):
+			continue
+		return '{}:{} ({})'.format(os.path.basename(frame.filename), frame.lineno, frame.name)
+	return 'unknown'
+
+#Function to get the serialized size (bytes) of a request or response payload
+def payloadSize(obj):
+	try:
+		if isinstance(obj, ee.ComputedObject):
+			return len(ee.serializer.toJSON(obj))
+		return len(json.dumps(obj, default = str))
+	except Exception:
+		return 0
+
+#Function to wrap a single ee.data call
+def _wrap(name, func):
+	def wrapper(*args, **kwargs):
+		#Nested traced calls (e.g. getInfo inside getList) are attributed to the outer call
+		if getattr(_state, 'active', False):
+			return func(*args, **kwargs)
+		_state.active = True
+		callSite = getCallSite()
+		start = time.time()
+		error = None
+		result = None
+		try:
+			result = func(*args, **kwargs)
+			return result
+		except Exception as e:
+			error = str(e)
+			raise
+		finally:
+			elapsed = time.time() - start
+			_state.active = False
+			with _lock:
+				records.append({\
+					'call': name,
+					'callSite': callSite,
+					'seconds': elapsed,
+					'requestBytes': payloadSize(args[0]) if len(args) > 0 else 0,
+					'responseBytes': payloadSize(result),
+					'error': error})
+	wrapper.__wrapped__ = func
+	return wrapper
+
+#Function to start tracing blocking ee calls
+#If report is True, a hotspot report is printed when the Python session exits
+def enable(report = True, outputJSON = None):
+	if len(_originals) > 0:
+		return
+	for name in tracedCalls:
+		if hasattr(ee.data, name):
+			_originals[name] = getattr(ee.data, name)
+			setattr(ee.data, name, _wrap(name, _originals[name]))
+	if report:
+		atexit.register(printReport)
+	if outputJSON != None:
+		atexit.register(writeRecords, outputJSON)
+	print('Profiling blocking GEE calls:', ', '.join(_originals.keys()))
+
+#Function to stop tracing and restore the original ee.data calls
+def disable():
+	for name, func in _originals.items():
+		setattr(ee.data, name, func)
+	_originals.clear()
+
+#Function to summarize records by call site, ranked by total time spent waiting
+def summarize():
+	summary = {}
+	for r in records:
+		key = (r['callSite'], r['call'])
+		s = summary.setdefault(key, {'callSite': r['callSite'], 'call': r['call'], 'count': 0, 'errors': 0,
+			'totalSeconds': 0.0, 'maxSeconds': 0.0, 'requestBytes': 0, 'responseBytes': 0})
+		s['count'] += 1
+		s['errors'] += int(r['error'] != None)
+		s['totalSeconds'] += r['seconds']
+		s['maxSeconds'] = max(s['maxSeconds'], r['seconds'])
+		s['requestBytes'] += r['requestBytes']
+		s['responseBytes'] += r['responseBytes']
+	return sorted(summary.values(), key = lambda s: s['totalSeconds'], reverse = True)
+
+#Function to print the ranked hotspot report
+def printReport(top = 25):
+	if len(records) == 0:
+		return
+	summary = summarize()
+	total = sum(r['seconds'] for r in records)
+	print()
+	print('#'*100)
+	print('Blocking GEE round trips: {} calls, {} s total'.format(len(records), round(total, 2)))
+	print('#'*100)
+	print('{:>4} {:>8} {:>6} {:>9} {:>9} {:>10} {:>10}  {}'.format('rank','total_s','calls','mean_s','max_s','req_bytes','resp_bytes','call site'))
+	for i, s in enumerate(summary[:top]):
+		print('{:>4} {:>8.2f} {:>6} {:>9.3f} {:>9.3f} {:>10} {:>10}  {} [{}]{}'.format(\
+			i+1, s['totalSeconds'], s['count'], s['totalSeconds']/s['count'], s['maxSeconds'],
+			s['requestBytes'], s['responseBytes'], s['callSite'], s['call'],
+			' ({} failed)'.format(s['errors']) if s['errors'] > 0 else ''))
+	print()
+	sys.stdout.flush()
+
+#Function to write raw records to a json file for later comparison
+def writeRecords(outputJSON):
+	o = open(outputJSON, 'w')
+	o.write(json.dumps({'records': records, 'summary': summarize()}, indent = 1))
+	o.close()
+	print('Wrote GEE call profile to:', outputJSON)
@@ -0,0 +1,158 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to simplify GDE polygons locally with a tolerance derived from the 30 m grid of the SAGE outputs
+#(the local counterpart of simplifyGDEs in SAGE_Initialize, e.g. to simplify GDE files before uploading them)
+#Polygons are simplified with shapely without changing their topology (no self-intersections or collapsed rings),
+#If the simplified polygon of a GDE is not valid or its area changes by more than maxAreaChange, the tolerance is halved for that GDE
+#(a few times, after which it keeps its original polygon)
+#Reports the vertex count and GeoJSON size before and after
+#
+#Requires shapely. GeoJSON files are read and written with shapely alone. Other formats (e.g. shapefiles, GeoPackages)
+#and reprojection (--crs) need geopandas.
+#Coordinates must be in a projected crs in meters (e.g. EPSG:5070, the crs of the SAGE outputs) for the tolerance to apply
+####################################################################################################
+#Module imports
+import argparse, json
+
+####################################################################################################
+#Pixel size of the SAGE outputs (meters) and the fraction of a pixel to use as the tolerance (gdeSimplifyPixels in SAGE_Initialize)
+defaultPixelSize = 30
+defaultPixels = 0.5
+
+#Largest fraction a GDE's area may change by (gdeSimplifyMaxAreaChange in SAGE_Initialize)
+defaultMaxAreaChange = 0.01
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to get the simplification tolerance (meters) from a transform ([xScale, xShear, x0, yShear, yScale, y0]) or pixel size
+def getTolerance(transform = None, pixelSize = defaultPixelSize, pixels = defaultPixels):
+	if transform != None:
+		pixelSize = abs(transform[0])
+	return pixelSize * pixels
+
+#Function to count the vertices of a (multi)polygon
+def countVertices(geometry):
+	if geometry == None or geometry.is_empty:
+		return 0
+	polygons = geometry.geoms if hasattr(geometry, 'geoms') else [geometry]
+	total = 0
+	for polygon in polygons:
+		if hasattr(polygon, 'exterior'):
+			total += len(polygon.exterior.coords) + sum(len(ring.coords) for ring in polygon.interiors)
+		else:
+			total += countVertices(polygon)
+	return total
+
+#Function to get the size (bytes) of a geometry as GeoJSON
+def payloadSize(geometry):
+	from shapely.geometry import mapping
+	if geometry == None:
+		return 0
+	return len(json.dumps(mapping(geometry)))
+
+#Function to simplify a single polygon
+#If the simplified polygon is empty, not valid, or changes the area too much, the tolerance is halved (up to halvings times)
+#Returns the simplified polygon (or the original one if no tolerance worked) and whether it was simplified
+def simplifyGeometry(geometry, tolerance, maxAreaChange = defaultMaxAreaChange, halvings = 3):
+	if geometry == None or geometry.is_empty:
+		return geometry, False
+	for i in range(halvings + 1):
+		simplified = geometry.simplify(tolerance / 2.0 ** i, preserve_topology = True)
+		if simplified.is_empty or not simplified.is_valid:
+			continue
+		if geometry.area > 0 and abs(simplified.area / geometry.area - 1) > maxAreaChange:
+			continue
+		return simplified, True
+	return geometry, False
+
+#Function to simplify a list of polygons and report the reduction
+def simplifyGeometries(geometries, tolerance, maxAreaChange = defaultMaxAreaChange):
+	out = []
+	report = {'gdes': 0, 'simplified': 0, 'verticesBefore': 0, 'verticesAfter': 0, 'bytesBefore': 0, 'bytesAfter': 0,
+		'areaBefore': 0.0, 'areaAfter': 0.0, 'maxAreaChange': 0.0, 'tolerance': tolerance}
+	for geometry in geometries:
+		simplified, changed = simplifyGeometry(geometry, tolerance, maxAreaChange)
+		out.append(simplified)
+		report['gdes'] += 1
+		report['simplified'] += int(changed)
+		report['verticesBefore'] += countVertices(geometry)
+		report['verticesAfter'] += countVertices(simplified)
+		report['bytesBefore'] += payloadSize(geometry)
+		report['bytesAfter'] += payloadSize(simplified)
+		if geometry != None and not geometry.is_empty:
+			report['areaBefore'] += geometry.area
+			report['areaAfter'] += simplified.area
+			if geometry.area > 0:
+				report['maxAreaChange'] = max(report['maxAreaChange'], abs(simplified.area / geometry.area - 1))
+	return out, report
+
+#Function to print a simplification report
+def printReport(report):
+	print('Simplified {} of {} GDEs with a tolerance of {} m'.format(report['simplified'], report['gdes'], report['tolerance']))
+	print('Vertices: {} -> {} ({:.1%} fewer)'.format(report['verticesBefore'], report['verticesAfter'],
+		1 - report['verticesAfter'] / float(max(report['verticesBefore'], 1))))
+	print('GeoJSON size: {:.2f} -> {:.2f} MB ({:.1%} smaller)'.format(report['bytesBefore'] / 1e6, report['bytesAfter'] / 1e6,
+		1 - report['bytesAfter'] / float(max(report['bytesBefore'], 1))))
+	print('Area change: {:.4%} in total, {:.4%} at most for a GDE'.format(report['areaAfter'] / max(report['areaBefore'], 1e-9) - 1, report['maxAreaChange']))
+
+#Function to simplify the polygons of a file and write them to a new file
+#crs (e.g. 'EPSG:5070') reprojects the polygons before simplifying (requires geopandas)
+def simplifyFile(inputPath, outputPath, tolerance, maxAreaChange = defaultMaxAreaChange, crs = None):
+	isGeoJSON = [p.lower().endswith(('.geojson', '.json')) for p in [inputPath, outputPath]]
+	if all(isGeoJSON) and crs == None:
+		from shapely.geometry import shape, mapping
+		collection = json.load(open(inputPath))
+		geometries = [shape(f['geometry']) if f.get('geometry') else None for f in collection['features']]
+		simplified, report = simplifyGeometries(geometries, tolerance, maxAreaChange)
+		for f, geometry in zip(collection['features'], simplified):
+			f['geometry'] = mapping(geometry) if geometry != None else None
+		o = open(outputPath, 'w')
+		o.write(json.dumps(collection))
+		o.close()
+	else:
+		import geopandas as gpd
+		gdf = gpd.read_file(inputPath)
+		if crs != None:
+			gdf = gdf.to_crs(crs)
+		simplified, report = simplifyGeometries(list(gdf.geometry), tolerance, maxAreaChange)
+		gdf = gdf.set_geometry(gpd.GeoSeries(simplified, index = gdf.index, crs = gdf.crs))
+		gdf.to_file(outputPath)
+	printReport(report)
+	return report
+
+####################################################################################################
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Simplify GDE polygons with a tolerance derived from the SAGE 30 m grid')
+	parser.add_argument('input', help = 'Input polygons (GeoJSON, or any format geopandas reads)')
+	parser.add_argument('output', help = 'Output polygons (GeoJSON, or any format geopandas writes)')
+	parser.add_argument('--pixelSize', type = float, default = defaultPixelSize, help = 'Pixel size in meters (default: {})'.format(defaultPixelSize))
+	parser.add_argument('--pixels', type = float, default = defaultPixels, help = 'Tolerance as a fraction of a pixel (default: {})'.format(defaultPixels))
+	parser.add_argument('--maxAreaChange', type = float, default = defaultMaxAreaChange, help = 'Largest fraction a GDE area may change by (default: {})'.format(defaultMaxAreaChange))
+	parser.add_argument('--crs', help = 'Reproject to this crs before simplifying, e.g. EPSG:5070 (requires geopandas)')
+	args = parser.parse_args()
+
+	simplifyFile(args.input, args.output, getTolerance(pixelSize = args.pixelSize, pixels = args.pixels), args.maxAreaChange, args.crs)
@@ -0,0 +1,121 @@
+"""
+MIT License
+
+Copyright (c) 2022 Ian Housman and Leah Campbell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+####################################################################################################
+#Library to compare random forest configurations (predictor sets x parameters) and pick the best one
+#Configurations are evaluated together, either in GEE (every model is trained in one table export
+#that holds their out of bag errors) or on local cores with scikit-learn (one thread per configuration),
+#and ranked by their out of bag or cross-validated (SAGE_CrossValidation.py) error
+####################################################################################################
+#Module imports
+import itertools, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+import ee
+
+####################################################################################################
+#							Functions
+####################################################################################################
+#Function to list every combination of predictor sets ([name, selectors] as in modelRuns) and parameter values
+#paramGrid is {parameter: [values]}. Parameters not in it are taken from baseParams.
+def getSweepConfigs(predictorSets, paramGrid, baseParams):
+	names = sorted(paramGrid.keys())
+	configs = []
+	for setName, selectors in predictorSets:
+		for values in itertools.product(*[paramGrid[n] for n in names]):
+			rfParams = dict(baseParams, **dict(zip(names, values)))
+			name = '_'.join([setName] + ['{}-{}'.format(n, v) for n, v in zip(names, values)])
+			configs.append({'name': name, 'predictorSet': setName, 'selectors': selectors, 'rfParams': rfParams})
+	return configs
+
+#Function to evaluate one configuration locally
+#A configuration that cannot be fit (e.g. no predictors match its selectors) gets no error, as in evaluateServer
+def _evaluateLocal(trainingTable, config, metric, folds):
+	import SAGE_LocalRF, SAGE_CrossValidation
+	try:
+		predictorFields = SAGE_LocalRF.selectPredictors(trainingTable.columns, config['selectors'])
+		if metric == 'cv':
+			predictions = SAGE_CrossValidation.crossValidate(trainingTable, predictorFields, config['rfParams'], folds, 1)
+			return SAGE_CrossValidation.getMetrics(predictions[SAGE_CrossValidation.responseField], predictions['cv_predicted'])['rmse']
+		return SAGE_LocalRF.fitForest(trainingTable, predictorFields, config['rfParams'], 1).outOfBagErrorEstimate
+	except Exception as e:
+		print('Could not evaluate {}: {}'.format(config['name'], e))
+		return None
+
+#Function to evaluate configurations on local cores
+#folds gives the cross-validation fold of each row of the training table (from SAGE_CrossValidation.getFolds) if metric is 'cv'
+#Each configuration is fit on a single core in its own thread
+#(scikit-learn releases the GIL while building trees, and threads do not re-run the calling script as spawned processes would)
+def evaluateLocal(trainingTable, configs, metric = 'oob', folds = None, workers = None):
+	with ThreadPoolExecutor(max_workers = workers or os.cpu_count()) as pool:
+		return list(pool.map(lambda config: _evaluateLocal(trainingTable, config, metric, folds), configs))
+
+#Function to evaluate configurations in GEE
+#Every configuration is trained in the same export, which writes a feature with the out of bag error of each to outputTablePath
+#The export is waited on (checking every pollSeconds) and its errors are read back in one request
+def evaluateServer(trainingTable, configs, outputTablePath, responseField = 'dgw', pollSeconds = 60):
+	def getError(i, config):
+		predictorFields = ee.Feature(trainingTable.select(config['selectors']).first()).propertyNames().remove('system:index')
+		rf = ee.Classifier.smileRandomForest(**config['rfParams']).setOutputMode('REGRESSION')
+		trained = rf.train(trainingTable.filter(ee.Filter.notNull(predictorFields)), responseField, predictorFields)
+		return ee.Feature(None, {'configIndex': i, 'name': config['name'], 'error': ee.Dictionary(trained.explain()).get('outOfBagErrorEstimate')})
+	errors = ee.FeatureCollection([getError(i, config) for i, config in enumerate(configs)])
+
+	if ee.data.getInfo(outputTablePath):
+		ee.data.deleteAsset(outputTablePath)
+	t = ee.batch.Export.table.toAsset(**{\
+		'collection': errors,
+		'description': os.path.basename(outputTablePath),
+		'assetId': outputTablePath})
+	print('Exporting:', os.path.basename(outputTablePath))
+	t.start()
+	while True:
+		status = t.status()
+		if status['state'] == 'COMPLETED':
+			break
+		if status['state'] not in ['UNSUBMITTED', 'READY', 'RUNNING']:
+			raise Exception('Model sweep failed: {}'.format(status.get('error_message', status['state'])))
+		print('Waiting for model sweep', time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
+		time.sleep(pollSeconds)
+
+	rows = ee.FeatureCollection(outputTablePath).reduceColumns(ee.Reducer.toList(2), ['configIndex', 'error']).get('list').getInfo()
+	out = [None] * len(configs)
+	for i, error in rows:
+		out[int(i)] = error
+	return out
+
+#Function to rank configurations by their error (lowest first)
+def rankConfigs(configs, errors):
+	ranked = [dict(config, error = error) for config, error in zip(configs, errors)]
+	return sorted(ranked, key = lambda c: c['error'] if c['error'] != None else float('inf'))
+
+#Function to print and save the ranked configurations
+def reportRanking(ranked, metric, outputJSON = None):
+	print('{:>4} {:>10}  {}'.format('rank', metric + '_error', 'configuration'))
+	for i, c in enumerate(ranked):
+		print('{:>4} {:>10}  {}'.format(i + 1, round(c['error'], 4) if c['error'] != None else 'failed', c['name']))
+	if outputJSON != None:
+		o = open(outputJSON, 'w')
+		o.write(json.dumps({'metric': metric, 'ranking': ranked}, indent = 1))
+		o.close()
+		print('Wrote model sweep ranking to:', outputJSON)